@@ -1,9 +1,124 @@
+import uuid
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import Job
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ArchivedJob, Batch, ContentAnalysis, Job, Metric, WebhookDelivery, WorkerNode
 
 
 @admin.register(Job)
 class JobAdmin(admin.ModelAdmin):
-    list_display = ("id", "status", "preset", "progress", "created_at", "updated_at")
+    list_display = ("id", "status", "preset", "progress", "worker_name", "created_at", "updated_at")
+    list_filter = ("status", "preset", "speculative")
+    search_fields = ("id", "input_key", "output_key")
+
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        # Links to a job keep working after app.job_archive has moved it to the cold table.
+        if not Job.objects.filter(pk=object_id).exists() and ArchivedJob.objects.filter(pk=object_id).exists():
+            return redirect(reverse("admin:app_archivedjob_change", args=[object_id]))
+        return super().change_view(request, object_id, form_url, extra_context)
+
+    def changelist_view(self, request, extra_context=None):
+        # A search for an id that has been archived lands on the archived row.
+        q = (request.GET.get("q") or "").strip()
+        if _is_uuid(q) and not Job.objects.filter(pk=q).exists() and ArchivedJob.objects.filter(pk=q).exists():
+            return redirect(reverse("admin:app_archivedjob_change", args=[q]))
+        return super().changelist_view(request, extra_context)
+
+
+@admin.register(ArchivedJob)
+class ArchivedJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "preset", "worker_name", "created_at", "archived_at")
     list_filter = ("status", "preset")
     search_fields = ("id", "input_key", "output_key")
+    readonly_fields = [f.name for f in ArchivedJob._meta.fields]
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except ValueError:
+        return False
+
+
+@admin.register(Batch)
+class BatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "created_at")
+    search_fields = ("id",)
+
+
+@admin.register(Metric)
+class MetricAdmin(admin.ModelAdmin):
+    list_display = ("name", "value", "updated_at")
+    search_fields = ("name",)
+    readonly_fields = ("name", "value", "updated_at")
+
+
+@admin.register(WorkerNode)
+class WorkerNodeAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "alive",
+        "cores",
+        "ram_gb",
+        "free_disk_gb",
+        "load",
+        "current_job",
+        "jobs_done",
+        "jobs_failed",
+        "jobs_per_hour",
+        "output_mb_per_busy_sec",
+        "heartbeat_at",
+    )
+    list_filter = ("hostname", "has_browser")
+    search_fields = ("name", "hostname")
+    readonly_fields = [f.name for f in WorkerNode._meta.fields]
+
+    @admin.display(boolean=True)
+    def alive(self, obj):
+        from .worker_registry import heartbeat_seconds
+
+        return obj.heartbeat_at >= timezone.now() - timedelta(seconds=heartbeat_seconds() * 3)
+
+    @admin.display(description="RAM GB")
+    def ram_gb(self, obj):
+        return round(obj.ram_bytes / 1024**3, 1)
+
+    @admin.display(description="Free disk GB")
+    def free_disk_gb(self, obj):
+        return round(obj.free_disk_bytes / 1024**3, 1)
+
+    @admin.display(description="Jobs/h (busy)")
+    def jobs_per_hour(self, obj):
+        if obj.busy_seconds <= 0:
+            return 0
+        return round((obj.jobs_done + obj.jobs_failed) / obj.busy_seconds * 3600, 1)
+
+    @admin.display(description="Output MB/s (busy)")
+    def output_mb_per_busy_sec(self, obj):
+        if obj.busy_seconds <= 0:
+            return 0
+        return round(obj.output_bytes / 1024**2 / obj.busy_seconds, 2)
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("id", "event", "job_id", "status", "attempts", "last_status_code", "next_attempt_at", "created_at")
+    list_filter = ("status", "event")
+    search_fields = ("job_id", "url")
+    readonly_fields = [f.name for f in WebhookDelivery._meta.fields if f.name not in ("status", "next_attempt_at")]
+
+
+@admin.register(ContentAnalysis)
+class ContentAnalysisAdmin(admin.ModelAdmin):
+    list_display = ("key", "version", "analysis_seconds", "created_at")
+    search_fields = ("key",)
+    readonly_fields = [f.name for f in ContentAnalysis._meta.fields]
@@ -0,0 +1,53 @@
+import json
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib import admin
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+
+from . import profiling
+from .disk_storage import sign_profile
+
+
+def profile_list(request):
+    """Stored web/worker profiles, slowest first (staff only: wrapped in admin_view in urls)."""
+    kind = request.GET.get("kind") if request.GET.get("kind") in ("web", "worker") else None
+    try:
+        limit = max(1, min(500, int(request.GET.get("limit", "50"))))
+    except ValueError:
+        limit = 50
+    rows = profiling.list_profiles(kind)[:limit]
+    for r in rows:
+        r["started"] = datetime.fromtimestamp(r["started_at"], tz=dt_timezone.utc)
+    top = profiling.load(rows[0]["id"]) if rows else None
+    context = {
+        **admin.site.each_context(request),
+        "title": "Profiles",
+        "rows": rows,
+        "kind": kind or "",
+        "sample_rate": profiling.sample_rate(),
+        "interval_ms": profiling.interval_seconds() * 1000,
+        "max_files": profiling.max_files(),
+        # Valid for 10 minutes: lets staff profile one specific request from curl.
+        "header_token": sign_profile(int(time.time()) + 600),
+        "slowest": top,
+        "slowest_frames": profiling.top_frames(top) if top else [],
+    }
+    return render(request, "admin/profiles.html", context)
+
+
+def profile_download(request, profile_id: str, fmt: str):
+    doc = profiling.load(profile_id)
+    if doc is None:
+        raise Http404("profile not found")
+    if fmt == "folded":
+        resp = HttpResponse(profiling.to_collapsed(doc), content_type="text/plain; charset=utf-8")
+        name = f"{profile_id}.folded"
+    elif fmt == "speedscope":
+        resp = HttpResponse(json.dumps(profiling.to_speedscope(doc)), content_type="application/json")
+        name = f"{profile_id}.speedscope.json"
+    else:
+        raise Http404("unknown format")
+    resp["Content-Disposition"] = f'attachment; filename="{name}"'
+    return resp
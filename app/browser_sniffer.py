@@ -1,5 +1,5 @@
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -8,6 +8,8 @@ class SniffResult:
     media_url: str | None = None
     kind: str | None = None  # mp4|m3u8|mpd
     reason: str = ""
+    # Every media request seen, best guess first; app.media_candidates validates and ranks them.
+    candidates: list[dict] = field(default_factory=list)
 
 
 _MP4 = re.compile(r"\.mp4(\?|$)", re.IGNORECASE)
@@ -85,4 +87,10 @@ def sniff_media_url(page_url: str, *, timeout_ms: int = 20000) -> SniffResult:
 
     hits2 = sorted(list(dict.fromkeys(hits)), key=score, reverse=True)
     best = hits2[0]
-    return SniffResult(ok=True, media_url=best, kind=_kind(best), reason="sniffed_from_network")
+    return SniffResult(
+        ok=True,
+        media_url=best,
+        kind=_kind(best),
+        reason="sniffed_from_network",
+        candidates=[{"kind": _kind(u), "media_url": u, "reason": "sniffed_from_network"} for u in hits2],
+    )
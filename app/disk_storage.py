@@ -23,6 +23,11 @@ def output_path(key: str) -> str:
     return str(p)
 
 
+def stream_key_prefix(job_id: str) -> str:
+    # Segmented (HLS/DASH) outputs live in a per-job directory; URLs are signed for the whole prefix.
+    return f"outputs/{job_id}/"
+
+
 def sign_download(job_id: str, output_key: str, exp: int) -> str:
     msg = f"{job_id}|{output_key}|{exp}".encode("utf-8")
     secret = settings.SECRET_KEY.encode("utf-8")
@@ -37,3 +42,35 @@ def verify_download(job_id: str, output_key: str, exp: int, sig: str) -> bool:
         return False
     want = sign_download(job_id, output_key, int(exp))
     return hmac.compare_digest(want, str(sig or ""))
+
+
+def sign_webhook(body: bytes, ts: int) -> str:
+    # Same secret as download links; the timestamp is signed so receivers can reject replays.
+    secret = settings.SECRET_KEY.encode("utf-8")
+    return hmac.new(secret, str(int(ts)).encode("utf-8") + b"." + body, hashlib.sha256).hexdigest()
+
+
+def verify_webhook(body: bytes, ts, sig: str, max_age: int = 300) -> bool:
+    try:
+        if abs(int(time.time()) - int(ts)) > max_age:
+            return False
+    except Exception:
+        return False
+    return hmac.compare_digest(sign_webhook(body, int(ts)), str(sig or "").removeprefix("sha256="))
+
+
+def sign_profile(exp: int) -> str:
+    # X-Profile header value ("<exp>.<sig>") that makes the web tier profile one request.
+    secret = settings.SECRET_KEY.encode("utf-8")
+    sig = hmac.new(secret, f"profile|{int(exp)}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{int(exp)}.{sig}"
+
+
+def verify_profile(token: str) -> bool:
+    exp, _, _ = str(token or "").partition(".")
+    try:
+        if int(exp) < int(time.time()):
+            return False
+    except Exception:
+        return False
+    return hmac.compare_digest(sign_profile(int(exp)), str(token))
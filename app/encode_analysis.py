@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import os
+import re
+import subprocess
+import time
+
+from django.db import IntegrityError
+
+from . import metrics
+from .models import ContentAnalysis, Job
+
+
+logger = logging.getLogger("app.encode_analysis")
+
+# Bump when the measurements change meaning; older cache rows are then re-measured.
+VERSION = 1
+
+# What every video job used before: also the fallback whenever analysis is off or fails.
+DEFAULT_SETTINGS = {"crf": 20, "preset": "veryfast", "tune": ""}
+
+# How far CRF may move per preset. The low end is the old fixed CRF, so a job never gets more
+# bits than before; smaller outputs tolerate less, so their range is narrower.
+CRF_BOUNDS = {
+    Job.PRESET_ORIGINAL: (20, 24),
+    Job.PRESET_1080: (20, 26),
+    Job.PRESET_720: (20, 27),
+    Job.PRESET_480: (20, 28),
+}
+
+# Probe encode: x264 at a fixed CRF on a 320px-wide copy. Its frame sizes and skip ratio are
+# the complexity signal (per-title encoding's "CRF probe"). Thresholds are for these settings;
+# re-check them with `manage.py bench_encode_settings` when changing either.
+PROBE_WIDTH = 320
+PROBE_CRF = 23
+STILL_SKIP_PCT = 90.0
+LOW_SKIP_PCT = 60.0
+LOW_P_BPP = 0.02
+HIGH_P_BPP = 0.5
+
+_FRAME_RE = re.compile(r"\bframe ([IPB]):\s*(\d+)\s+Avg QP:\s*[\d.]+\s+size:\s*(\d+)")
+_SKIP_RE = re.compile(r"\bmb P\b.*\bskip:\s*([\d.]+)%")
+
+
+def enabled() -> bool:
+    # Off by default: the probe encodes add seconds to every uncached video job.
+    return os.environ.get("ENCODE_ANALYSIS", "0") == "1"
+
+
+def windows() -> int:
+    try:
+        return max(1, int(os.environ.get("ENCODE_ANALYSIS_WINDOWS", "3")))
+    except Exception:
+        return 3
+
+
+def window_seconds() -> float:
+    try:
+        return max(0.5, float(os.environ.get("ENCODE_ANALYSIS_WINDOW_SECONDS", "2")))
+    except Exception:
+        return 2.0
+
+
+def timeout_seconds() -> float:
+    try:
+        return max(1.0, float(os.environ.get("ENCODE_ANALYSIS_TIMEOUT_SECONDS", "30")))
+    except Exception:
+        return 30.0
+
+
+# --- input hash ----------------------------------------------------------------------------
+
+def _sidecar(path: str) -> str:
+    return path + ".sha256"
+
+
+def remember_hash(path: str, sha256: str):
+    """Keep the hash computed during upload next to the input, so the worker needn't re-read it."""
+    try:
+        with open(_sidecar(path), "w") as f:
+            f.write(sha256)
+    except OSError:
+        logger.warning("could not write input hash path=%s", path)
+
+
+def input_hash(path: str) -> str:
+    """sha256 of the input file."""
+    try:
+        with open(_sidecar(path)) as f:
+            known = f.read().strip()
+        if len(known) == 64:
+            return known
+    except OSError:
+        pass
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    remember_hash(path, h.hexdigest())
+    return h.hexdigest()
+
+
+# --- measurement ---------------------------------------------------------------------------
+
+def sample_starts(start: float, end: float) -> list[float]:
+    """Window start times spread evenly over [start, end); one window from `start` if end is unknown."""
+    span = end - start
+    w = window_seconds()
+    if span <= w:
+        return [start]
+    n = min(windows(), int(span // w))
+    return [round(start + (i + 0.5) * span / n - w / 2, 3) for i in range(n)]
+
+
+def measure(src: str, *, ffmpeg: str, start: float = 0.0, end: float = 0.0, width: int = 0, height: int = 0) -> dict:
+    """Probe-encode a few short low-resolution windows and summarize how hard the content is."""
+    probe_h = max(2, round(PROBE_WIDTH * height / width / 2) * 2) if width and height else PROBE_WIDTH * 9 // 16
+    pixels = PROBE_WIDTH * probe_h
+    deadline = time.monotonic() + timeout_seconds()
+    totals = {"I": [0, 0], "P": [0, 0], "B": [0, 0]}
+    skip_weighted = 0.0
+    cuts = 0
+    seconds = 0.0
+    for at in sample_starts(start, end):
+        left = deadline - time.monotonic()
+        if left <= 0:
+            break
+        cmd = [
+            ffmpeg, "-hide_banner", "-nostats", "-ss", f"{at:.3f}", "-t", f"{window_seconds():.3f}", "-i", src,
+            "-an", "-sn", "-dn", "-vf", f"scale={PROBE_WIDTH}:{probe_h}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", str(PROBE_CRF),
+            # One GOP per window: every further I-frame is a scene cut x264 detected.
+            "-g", "100000", "-x264-params", "scenecut=40", "-f", "null", "-",
+        ]
+        r = subprocess.run(cmd, capture_output=True, text=True, timeout=left)
+        if r.returncode != 0:
+            raise RuntimeError(f"probe encode failed: {r.stderr.strip()[-300:]}")
+        window = {}
+        for kind, n, size in _FRAME_RE.findall(r.stderr):
+            window[kind] = (int(n), int(size))
+            totals[kind][0] += int(n)
+            totals[kind][1] += int(n) * int(size)
+        m = _SKIP_RE.search(r.stderr)
+        if m and "P" in window:
+            skip_weighted += float(m.group(1)) * window["P"][0]
+        cuts += max(0, window.get("I", (0, 0))[0] - 1)
+        seconds += window_seconds()
+
+    frames = sum(n for n, _ in totals.values())
+    if not frames:
+        raise RuntimeError("probe encode produced no frames")
+    inter_n = totals["P"][0] + totals["B"][0]
+    inter_bytes = totals["P"][1] + totals["B"][1]
+    return {
+        "frames": frames,
+        "seconds": round(seconds, 3),
+        # Bits per pixel at PROBE_CRF: intra = spatial detail, inter = motion/noise.
+        "i_bpp": round(totals["I"][1] * 8 / max(1, totals["I"][0]) / pixels, 4),
+        "p_bpp": round(inter_bytes * 8 / max(1, inter_n) / pixels, 4),
+        "skip_pct": round(skip_weighted / totals["P"][0], 1) if totals["P"][0] else 0.0,
+        "cuts_per_min": round(cuts / seconds * 60, 1) if seconds else 0.0,
+    }
+
+
+def decide(preset: str, m: dict) -> dict:
+    """CRF / x264 preset / tune for a video preset from measure()'s output."""
+    lo, hi = CRF_BOUNDS.get(preset, (DEFAULT_SETTINGS["crf"], DEFAULT_SETTINGS["crf"]))
+    skip = m.get("skip_pct", 0.0)
+    p_bpp = m.get("p_bpp", 0.0)
+    if skip >= STILL_SKIP_PCT:
+        # Slides, static screen recordings: almost nothing changes; spend effort, not bits.
+        out = {"class": "still", "crf": hi, "preset": "faster", "tune": "stillimage"}
+    elif skip >= LOW_SKIP_PCT or p_bpp < LOW_P_BPP:
+        # Talking heads, screencasts: cheap to encode, so a slower preset costs little time.
+        out = {"class": "low", "crf": lo + 4, "preset": "faster", "tune": ""}
+    elif p_bpp >= HIGH_P_BPP:
+        # Grain and heavy motion: slowest to encode, and noise masks a slightly higher CRF.
+        out = {"class": "high", "crf": lo + 1, "preset": "superfast", "tune": ""}
+    else:
+        out = dict(DEFAULT_SETTINGS, **{"class": "moderate"})
+    out["crf"] = min(hi, max(lo, out["crf"]))
+    out["crf_bounds"] = [lo, hi]
+    return out
+
+
+def settings_for(job: Job, src: str, info: dict, *, ffmpeg: str, in_path: str = "", url: str = "") -> dict:
+    """Encode settings for a video job: cached measurements by input hash, else a fresh analysis.
+
+    Always returns usable settings; "source" says where they came from. Pointer (URL/HLS)
+    inputs always get the defaults.
+    """
+    # Pointer inputs: the probe windows would be fetched over the network on top of the
+    # encode's own reads, and there's no file to hash for a cache key.
+    if not enabled() or url or job.preset not in CRF_BOUNDS or not info.get("has_video"):
+        return dict(DEFAULT_SETTINGS, source="default")
+    start = float(job.clip_start or 0)
+    end = float(job.clip_end) if job.clip_end is not None else float(info.get("duration") or 0)
+    try:
+        key = input_hash(in_path)
+        if job.clip_start or job.clip_end is not None:
+            key = f"{key}:{start:g}-{end:g}"
+        row = ContentAnalysis.objects.filter(key=key, version=VERSION).first()
+        if row:
+            metrics.incr("encode_analysis_cached")
+            return dict(decide(job.preset, row.measurements), source="cache", measurements=row.measurements)
+
+        t0 = time.monotonic()
+        m = measure(src, ffmpeg=ffmpeg, start=start, end=end, width=info.get("width") or 0, height=info.get("height") or 0)
+        took = round(time.monotonic() - t0, 3)
+        try:
+            ContentAnalysis.objects.update_or_create(
+                key=key, defaults={"version": VERSION, "measurements": m, "analysis_seconds": took}
+            )
+        except IntegrityError:
+            pass  # another worker analysed the same input at the same time
+        metrics.incr("encode_analysis_run")
+        metrics.incr("encode_analysis_seconds", took)
+        return dict(decide(job.preset, m), source="analysis", analysis_seconds=took, measurements=m)
+    except Exception as e:
+        logger.warning("encode analysis failed job=%s err=%s", job.id, e)
+        metrics.incr("encode_analysis_failed")
+        return dict(DEFAULT_SETTINGS, source="default", error=str(e)[:200])
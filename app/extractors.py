@@ -35,39 +35,33 @@ def extract_src_from_embed(markup: str) -> str | None:
     return None
 
 
-def extract_best_effort(html: str, base_url: str) -> dict:
-    """Best-effort extraction of a direct media URL from an HTML page.
+_REL_RE = re.compile(r"src\s*=\s*['\"]([^'\"]+\.(mp4|m3u8)[^'\"]*)['\"]", re.IGNORECASE)
 
-    Not guaranteed. Returns:
-      { ok: bool, kind: 'mp4'|'m3u8'|None, media_url: str|None, reason: str }
+
+def extract_candidates(html: str, base_url: str) -> list[dict]:
+    """Every direct media URL found in an HTML page, in page order, without duplicates.
+
+    Each item is { kind: 'mp4'|'m3u8', media_url: str, reason: str }. Nothing is fetched here;
+    app.media_candidates checks and ranks them.
 
     We intentionally keep this conservative:
-      - only return explicit absolute URLs found in HTML
+      - only explicit URLs found in HTML (absolute, or relative src="...")
       - do not run JS
       - no site-specific scraping in this generic extractor
     """
-
     text = html or ""
+    found = []
+    for pos, kind, url, reason in sorted(
+        [(m.start(), "mp4", m.group(0), "found_mp4_in_html") for m in _MP4_RE.finditer(text)]
+        + [(m.start(), "m3u8", m.group(0), "found_m3u8_in_html") for m in _M3U8_RE.finditer(text)]
+        + [
+            (m.start(), m.group(2).lower(), urljoin(base_url, m.group(1)), f"found_rel_{m.group(2).lower()}")
+            for m in _REL_RE.finditer(text)
+            if not m.group(1).lower().startswith(("http://", "https://"))
+        ]
+    ):
+        url = url.replace("&amp;", "&")
+        if url not in (c["media_url"] for c in found):
+            found.append({"kind": kind, "media_url": url, "reason": reason})
+    return found
 
-    # Absolute MP4 links
-    m = _MP4_RE.search(text)
-    if m:
-        return {"ok": True, "kind": "mp4", "media_url": m.group(0), "reason": "found_mp4_in_html"}
-
-    # Absolute HLS master/playlist links
-    m = _M3U8_RE.search(text)
-    if m:
-        return {"ok": True, "kind": "m3u8", "media_url": m.group(0), "reason": "found_m3u8_in_html"}
-
-    # Relative src="...mp4" patterns
-    rel_mp4 = re.search(r"src\s*=\s*['\"]([^'\"]+\.mp4[^'\"]*)['\"]", text, re.IGNORECASE)
-    if rel_mp4:
-        u = urljoin(base_url, rel_mp4.group(1))
-        return {"ok": True, "kind": "mp4", "media_url": u, "reason": "found_rel_mp4"}
-
-    rel_m3u8 = re.search(r"src\s*=\s*['\"]([^'\"]+\.m3u8[^'\"]*)['\"]", text, re.IGNORECASE)
-    if rel_m3u8:
-        u = urljoin(base_url, rel_m3u8.group(1))
-        return {"ok": True, "kind": "m3u8", "media_url": u, "reason": "found_rel_m3u8"}
-
-    return {"ok": False, "kind": None, "media_url": None, "reason": "no_media_url_found_in_html"}
@@ -0,0 +1,203 @@
+import os
+import time
+import signal
+import selectors
+import subprocess
+from collections import deque
+from dataclasses import dataclass
+
+
+def stall_seconds() -> float:
+    try:
+        return float(os.environ.get("WORKER_STALL_SECONDS", "120"))
+    except Exception:
+        return 120.0
+
+
+def stderr_tail_bytes() -> int:
+    try:
+        return int(os.environ.get("WORKER_STDERR_TAIL_BYTES", str(64 * 1024)))
+    except Exception:
+        return 64 * 1024
+
+
+class RingBuffer:
+    """Keeps only the last `cap` bytes written."""
+
+    def __init__(self, cap: int):
+        self.cap = max(1, cap)
+        self._chunks = deque()
+        self._size = 0
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        if len(data) >= self.cap:
+            self._chunks.clear()
+            data = data[-self.cap :]
+            self._size = 0
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size > self.cap:
+            head = self._chunks[0]
+            extra = self._size - self.cap
+            if len(head) <= extra:
+                self._chunks.popleft()
+                self._size -= len(head)
+            else:
+                self._chunks[0] = head[extra:]
+                self._size -= extra
+
+    def text(self) -> str:
+        return b"".join(self._chunks).decode("utf-8", errors="replace")
+
+
+@dataclass
+class SupervisorResult:
+    rc: int
+    stalled: bool = False
+    stopped: bool = False
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+    stderr_tail: str = ""
+
+    def stats(self) -> dict:
+        return {
+            "rc": self.rc,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "stalled": self.stalled,
+            "stopped": self.stopped,
+        }
+
+
+class FfmpegSupervisor:
+    """Run ffmpeg with `-progress pipe:1`, reading progress (stdout) and logs (stderr) separately.
+
+    No busy-waiting: both pipes are multiplexed with selectors and the loop wakes at least
+    every `tick` seconds to check for stalls. A run whose out_time hasn't advanced for
+    `stall` seconds is killed. Resource usage comes from wait4().
+    """
+
+    def __init__(self, cmd: list[str], *, stdin_pipe: bool = False, stall: float | None = None,
+                 tail_bytes: int | None = None, tick: float = 0.5, on_spawn=None):
+        self.cmd = cmd
+        self.stdin_pipe = stdin_pipe
+        # Called with the child's pid right after spawn (e.g. EncodeIsolation.apply).
+        self.on_spawn = on_spawn
+        self.stall = stall_seconds() if stall is None else stall
+        self.tick = tick
+        self.stderr = RingBuffer(stderr_tail_bytes() if tail_bytes is None else tail_bytes)
+        self.proc: subprocess.Popen | None = None
+        self._t0 = 0.0
+
+    def start(self) -> subprocess.Popen:
+        self._t0 = time.monotonic()
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE if self.stdin_pipe else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if self.on_spawn:
+            self.on_spawn(self.proc.pid)
+        return self.proc
+
+    def kill(self, grace: float = 2.0):
+        """SIGTERM (lets ffmpeg finalize), then SIGKILL after `grace` seconds."""
+        p = self.proc
+        if not p or p.returncode is not None:
+            return
+        try:
+            p.send_signal(signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline:
+            try:
+                # WNOWAIT: leave the zombie for wait4() so rusage isn't lost.
+                if os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None:
+                    return
+            except ChildProcessError:
+                return
+            time.sleep(0.05)
+        try:
+            p.kill()
+        except ProcessLookupError:
+            pass
+
+    def wait(self, on_progress=None, should_stop=None) -> SupervisorResult:
+        """Supervise until exit.
+
+        on_progress(fields) gets each complete `-progress` block (dict of key -> value).
+        should_stop() is polled every tick; a truthy return kills ffmpeg right away.
+        """
+        p = self.proc
+        sel = selectors.DefaultSelector()
+        for stream, name in ((p.stdout, "progress"), (p.stderr, "stderr")):
+            os.set_blocking(stream.fileno(), False)
+            sel.register(stream, selectors.EVENT_READ, name)
+
+        block = {}
+        partial = b""
+        last_out_time = None
+        last_advance = time.monotonic()
+        stalled = False
+        stopped = False
+
+        while sel.get_map():
+            for key, _ in sel.select(timeout=self.tick):
+                try:
+                    data = os.read(key.fileobj.fileno(), 65536)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    sel.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                if key.data == "stderr":
+                    self.stderr.write(data)
+                    continue
+
+                partial += data
+                *lines, partial = partial.split(b"\n")
+                for raw in lines:
+                    k, sep, v = raw.decode("utf-8", errors="ignore").strip().partition("=")
+                    if not sep:
+                        continue
+                    block[k] = v
+                    if k == "progress":
+                        out_time = block.get("out_time_us") or block.get("out_time_ms")
+                        if out_time and out_time != last_out_time:
+                            last_out_time = out_time
+                            last_advance = time.monotonic()
+                        if on_progress:
+                            on_progress(block)
+                        block = {}
+
+            if stalled or stopped:
+                continue
+            if should_stop and should_stop():
+                stopped = True
+                self.kill(grace=0.5)
+            elif self.stall > 0 and time.monotonic() - last_advance > self.stall:
+                stalled = True
+                self.stderr.write(f"\n[supervisor] no progress for {self.stall:.0f}s, killing ffmpeg\n".encode())
+                self.kill()
+
+        sel.close()
+        _, status, ru = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(status)
+
+        return SupervisorResult(
+            rc=p.returncode,
+            stalled=stalled,
+            stopped=stopped,
+            wall_seconds=time.monotonic() - self._t0,
+            cpu_seconds=ru.ru_utime + ru.ru_stime,
+            # Linux reports ru_maxrss in KiB.
+            peak_rss_bytes=int(ru.ru_maxrss) * 1024,
+            stderr_tail=self.stderr.text(),
+        )
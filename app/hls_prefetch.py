@@ -0,0 +1,263 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from . import http_pool
+
+
+logger = logging.getLogger("app.hls_prefetch")
+
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+
+def prefetch_enabled() -> bool:
+    return os.environ.get("HLS_PREFETCH", "1") == "1"
+
+
+def prefetch_workers() -> int:
+    try:
+        return max(1, int(os.environ.get("HLS_PREFETCH_WORKERS", "6")))
+    except Exception:
+        return 6
+
+
+def prefetch_retries() -> int:
+    try:
+        return max(0, int(os.environ.get("HLS_PREFETCH_RETRIES", "3")))
+    except Exception:
+        return 3
+
+
+def _attrs(line: str) -> dict:
+    _, _, rest = line.partition(":")
+    return {k: v.strip('"') for k, v in _ATTR_RE.findall(rest)}
+
+
+def parse_master(text: str, base_url: str) -> list[dict]:
+    """Variant streams of a master playlist: [{uri, bandwidth, width, height, audio_group}]."""
+    variants = []
+    audio_uris = {}
+    pending = None
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if line.startswith("#EXT-X-MEDIA:"):
+            a = _attrs(line)
+            if a.get("TYPE") == "AUDIO" and a.get("URI"):
+                audio_uris[a.get("GROUP-ID", "")] = urljoin(base_url, a["URI"])
+        elif line.startswith("#EXT-X-STREAM-INF:"):
+            pending = _attrs(line)
+        elif line and not line.startswith("#") and pending is not None:
+            w, _, h = (pending.get("RESOLUTION") or "0x0").partition("x")
+            try:
+                bandwidth = int(pending.get("BANDWIDTH") or 0)
+            except ValueError:
+                bandwidth = 0
+            variants.append(
+                {
+                    "uri": urljoin(base_url, line),
+                    "bandwidth": bandwidth,
+                    "width": int(w) if w.isdigit() else 0,
+                    "height": int(h) if h.isdigit() else 0,
+                    "audio_group": pending.get("AUDIO") or "",
+                }
+            )
+            pending = None
+
+    for v in variants:
+        v["separate_audio"] = bool(v["audio_group"] and v["audio_group"] in audio_uris)
+    return variants
+
+
+def select_variant(variants: list[dict]) -> dict | None:
+    # Highest resolution first, bandwidth breaks ties.
+    if not variants:
+        return None
+    return max(variants, key=lambda v: (v["width"] * v["height"], v["bandwidth"]))
+
+
+def parse_media(text: str, base_url: str) -> dict:
+    """Media playlist -> {segments, init, endlist, unsupported}.
+
+    unsupported names the first feature we can't replay as a plain byte stream
+    (encryption, byte ranges, discontinuities); ffmpeg handles those itself.
+    """
+    segments = []
+    init = None
+    endlist = False
+    unsupported = ""
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-KEY:"):
+            if _attrs(line).get("METHOD", "NONE") != "NONE":
+                unsupported = unsupported or "encrypted"
+        elif line.startswith("#EXT-X-MAP:"):
+            a = _attrs(line)
+            if "BYTERANGE" in a:
+                unsupported = unsupported or "byterange"
+            elif init is None:
+                init = urljoin(base_url, a.get("URI", ""))
+            else:
+                unsupported = unsupported or "multiple_init"
+        elif line.startswith("#EXT-X-BYTERANGE"):
+            unsupported = unsupported or "byterange"
+        elif line.startswith("#EXT-X-DISCONTINUITY") and not line.startswith("#EXT-X-DISCONTINUITY-SEQUENCE"):
+            unsupported = unsupported or "discontinuity"
+        elif line.startswith("#EXT-X-ENDLIST"):
+            endlist = True
+        elif not line.startswith("#"):
+            segments.append(urljoin(base_url, line))
+    return {"segments": segments, "init": init, "endlist": endlist, "unsupported": unsupported}
+
+
+class HlsPrefetcher:
+    """Fetch HLS segments concurrently and replay them in order as one byte stream.
+
+    Usage: plan() once; if it returns True, run ffmpeg with `-i pipe:0` and call feed(stdin)
+    from a thread. After ffmpeg exits, check `error` - a failed segment truncates the stream.
+    """
+
+    def __init__(self, url: str, *, workers: int | None = None, retries: int | None = None):
+        self.url = url
+        self.workers = workers or prefetch_workers()
+        self.retries = prefetch_retries() if retries is None else retries
+        self.segments: list[str] = []
+        self.init: str | None = None
+        self.variant: dict | None = None
+        self.reason = ""
+        self.error = ""
+
+        self.bytes = 0
+        self.fetched = 0
+        self.retried = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def plan(self) -> bool:
+        """Load the playlist (master -> best variant -> media). False means: let ffmpeg read the URL."""
+        try:
+            _, _, body, final_url = http_pool.request(self.url, timeout=20)
+            text = body.decode("utf-8", errors="ignore")
+            if "#EXT-X-STREAM-INF" in text:
+                self.variant = select_variant(parse_master(text, final_url))
+                if not self.variant:
+                    self.reason = "no_variants"
+                    return False
+                if self.variant["separate_audio"]:
+                    self.reason = "separate_audio_rendition"
+                    return False
+                _, _, body, final_url = http_pool.request(self.variant["uri"], timeout=20)
+                text = body.decode("utf-8", errors="ignore")
+            media = parse_media(text, final_url)
+        except Exception as e:
+            self.reason = f"playlist_fetch_failed:{type(e).__name__}"
+            return False
+        finally:
+            http_pool.close_all()
+
+        if media["unsupported"]:
+            self.reason = media["unsupported"]
+            return False
+        if not media["endlist"]:
+            self.reason = "live_playlist"
+            return False
+        if not media["segments"]:
+            self.reason = "no_segments"
+            return False
+
+        self.segments = media["segments"]
+        self.init = media["init"]
+        self.reason = "planned"
+        return True
+
+    def _fetch(self, uri: str) -> bytes:
+        attempt = 0
+        while True:
+            try:
+                _, _, data, _ = http_pool.request(uri, timeout=30)
+                return data
+            except Exception:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                with self._lock:
+                    self.retried += 1
+                time.sleep(min(5.0, 0.5 * (2 ** (attempt - 1))))
+
+    def _fetch_pooled(self, uri: str) -> bytes:
+        data = self._fetch(uri)
+        with self._lock:
+            self.fetched += 1
+            self.bytes += len(data)
+        return data
+
+    def iter_segments(self):
+        """Yield init + segment bodies in playlist order; at most 2*workers are in flight or buffered."""
+        uris = ([self.init] if self.init else []) + self.segments
+        window = self.workers * 2
+        t0 = time.monotonic()
+
+        # Each fetch thread keeps its keep-alive connections across segments; they are closed
+        # here once the pool has shut down.
+        pools = []
+        ex = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="hls-fetch",
+            initializer=lambda: pools.append(http_pool.thread_conns()),
+        )
+        pending = deque()
+        try:
+            it = iter(uris)
+            for uri in it:
+                pending.append(ex.submit(self._fetch_pooled, uri))
+                if len(pending) >= window:
+                    break
+            while pending:
+                data = pending.popleft().result()
+                nxt = next(it, None)
+                if nxt is not None:
+                    pending.append(ex.submit(self._fetch_pooled, nxt))
+                yield data
+        finally:
+            for f in pending:
+                f.cancel()
+            ex.shutdown(wait=True, cancel_futures=True)
+            for conns in pools:
+                http_pool.close_conns(conns)
+            self.seconds = time.monotonic() - t0
+
+    def feed(self, stdin):
+        """Write the stream into ffmpeg's stdin, then close it. Never raises."""
+        try:
+            for data in self.iter_segments():
+                stdin.write(data)
+        except BrokenPipeError:
+            # ffmpeg exited (failed or was killed); its return code tells the story.
+            pass
+        except Exception as e:
+            self.error = f"{type(e).__name__}:{e}"
+            logger.warning("hls prefetch failed url=%s err=%s", self.url, self.error)
+        finally:
+            try:
+                stdin.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        secs = max(self.seconds, 1e-6)
+        return {
+            "segments": self.fetched,
+            "bytes": self.bytes,
+            "retries": self.retried,
+            "seconds": round(self.seconds, 3),
+            "mbps": round(self.bytes * 8 / secs / 1e6, 2),
+            "segments_per_sec": round(self.fetched / secs, 2),
+            "workers": self.workers,
+            "variant": {k: self.variant[k] for k in ("width", "height", "bandwidth")} if self.variant else None,
+        }
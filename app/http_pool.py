@@ -0,0 +1,148 @@
+import http.client
+import ssl
+import threading
+from urllib.parse import urljoin, urlparse
+
+
+USER_AGENT = "ConvertGod/1.0"
+
+_local = threading.local()
+_ssl_ctx = None
+_ssl_lock = threading.Lock()
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, url: str):
+        super().__init__(f"http_{status}")
+        self.status = status
+        self.url = url
+
+
+def _conns() -> dict:
+    # One keep-alive connection per (scheme, host, port) per thread.
+    d = getattr(_local, "conns", None)
+    if d is None:
+        d = {}
+        _local.conns = d
+    return d
+
+
+def _ssl_context() -> ssl.SSLContext:
+    # Built on first HTTPS use: loading the CA bundle is the slowest part of importing this module.
+    global _ssl_ctx
+    with _ssl_lock:
+        if _ssl_ctx is None:
+            _ssl_ctx = ssl.create_default_context()
+        return _ssl_ctx
+
+
+def _conn_for(scheme: str, netloc: str, timeout: float):
+    """(connection, reused). The caller's timeout applies to reused connections too."""
+    key = (scheme, netloc)
+    conns = _conns()
+    conn = conns.get(key)
+    if conn is None:
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(netloc, timeout=timeout, context=_ssl_context())
+        else:
+            conn = http.client.HTTPConnection(netloc, timeout=timeout)
+        conns[key] = conn
+        return conn, False
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn, True
+
+
+def _drop(scheme: str, netloc: str):
+    conn = _conns().pop((scheme, netloc), None)
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def close_all():
+    """Close this thread's pooled connections."""
+    for scheme, netloc in list(_conns().keys()):
+        _drop(scheme, netloc)
+
+
+def thread_conns() -> dict:
+    """This thread's pool, so the owner of a worker pool can close it once the threads are done."""
+    return _conns()
+
+
+def close_conns(conns: dict):
+    """Close a pool obtained from thread_conns(); only once its thread has stopped using it."""
+    for key in list(conns.keys()):
+        conn = conns.pop(key, None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def request(url: str, *, method: str = "GET", headers: dict | None = None, body: bytes | None = None,
+            timeout: float = 30, max_redirects: int = 5, max_bytes: int | None = None):
+    """Request over a pooled keep-alive connection. Returns (status, headers, body, final_url).
+
+    Follows redirects. Raises HttpError for >= 400; network errors propagate after the
+    connection has been dropped from the pool (the next call reconnects). A GET/HEAD on a
+    reused connection the server had already closed is retried once on a fresh one.
+    """
+    hdrs = {"User-Agent": USER_AGENT, "Connection": "keep-alive"}
+    hdrs.update(headers or {})
+
+    for _ in range(max_redirects + 1):
+        p = urlparse(url)
+        if p.scheme not in ("http", "https") or not p.netloc:
+            raise ValueError(f"unsupported_url:{url}")
+        path = (p.path or "/") + (f"?{p.query}" if p.query else "")
+
+        for attempt in range(2):
+            conn, reused = _conn_for(p.scheme, p.netloc, timeout)
+            try:
+                conn.request(method, path, body=body, headers=hdrs)
+                resp = conn.getresponse()
+                break
+            except ConnectionError:
+                # Idle keep-alive closed by the server: fails before any response byte arrives.
+                _drop(p.scheme, p.netloc)
+                if not (reused and attempt == 0 and method in ("GET", "HEAD")):
+                    raise
+            except Exception:
+                _drop(p.scheme, p.netloc)
+                raise
+        try:
+            if method == "HEAD":
+                data = b""
+                resp.read()
+            elif max_bytes is not None:
+                data = resp.read(max_bytes)
+                # Partial read: the connection is not reusable.
+                if not resp.isclosed():
+                    _drop(p.scheme, p.netloc)
+            else:
+                data = resp.read()
+        except Exception:
+            _drop(p.scheme, p.netloc)
+            raise
+
+        if resp.will_close:
+            _drop(p.scheme, p.netloc)
+
+        if resp.status in (301, 302, 303, 307, 308) and resp.getheader("Location"):
+            url = urljoin(url, resp.getheader("Location"))
+            if resp.status == 303:
+                method, body = "GET", None
+            continue
+
+        if resp.status >= 400:
+            raise HttpError(resp.status, url)
+
+        return resp.status, {k.lower(): v for k, v in resp.getheaders()}, data, url
+
+    # Still redirecting after max_redirects hops.
+    raise HttpError(resp.status, url)
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import ctypes
+import logging
+import platform
+import resource
+import threading
+from collections import deque
+from pathlib import Path
+
+
+logger = logging.getLogger("app.isolation")
+
+# ioprio_set(2): no libc wrapper, call the syscall directly.
+_SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30}.get(platform.machine())
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+
+def _env_int(name: str, default: int = 0) -> int:
+    try:
+        return int(os.environ.get(name, str(default)) or default)
+    except Exception:
+        return default
+
+
+def parse_cpu_list(value: str) -> set[int]:
+    """'0-3,6' -> {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in (value or "").replace(" ", "").split(","):
+        if not part:
+            continue
+        a, sep, b = part.partition("-")
+        if sep:
+            cpus.update(range(int(a), int(b) + 1))
+        else:
+            cpus.add(int(a))
+    return cpus
+
+
+def _threads(pid: int) -> list[int]:
+    try:
+        return [int(t) for t in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return [pid]
+
+
+class EncodeIsolation:
+    """Limits applied to one ffmpeg child so encodes don't starve a co-located web process.
+
+    Configured from env (all optional, unset = no limit):
+      WORKER_CPU_AFFINITY      cpu list, e.g. "1-3"
+      WORKER_NICE              niceness increment, e.g. 10
+      WORKER_IONICE_CLASS      idle | best-effort | realtime (WORKER_IONICE_LEVEL 0-7)
+      WORKER_RLIMIT_AS_MB      address-space cap
+      WORKER_RLIMIT_FSIZE_MB   largest file the encode may write
+      WORKER_CGROUP_PARENT     cgroup v2 dir we may create children in, e.g. /sys/fs/cgroup/convert-god
+      WORKER_CGROUP_CPU_MAX    cpu.max value, e.g. "200000 100000" (2 cores)
+      WORKER_CGROUP_MEMORY_MAX memory.max value, e.g. "2G"
+    """
+
+    def __init__(self, job_id):
+        self.job_id = str(job_id)
+        try:
+            self.cpus = parse_cpu_list(os.environ.get("WORKER_CPU_AFFINITY", ""))
+        except ValueError:
+            logger.warning("ignoring invalid WORKER_CPU_AFFINITY=%r", os.environ.get("WORKER_CPU_AFFINITY"))
+            self.cpus = set()
+        self.nice = _env_int("WORKER_NICE")
+        self.ionice_class = _IOPRIO_CLASSES.get((os.environ.get("WORKER_IONICE_CLASS") or "").strip().lower())
+        self.ionice_level = min(7, max(0, _env_int("WORKER_IONICE_LEVEL", 7)))
+        self.rlimit_as = _env_int("WORKER_RLIMIT_AS_MB") * 1024**2
+        self.rlimit_fsize = _env_int("WORKER_RLIMIT_FSIZE_MB") * 1024**2
+        self.cgroup_dir = self._make_cgroup()
+        self._libc = ctypes.CDLL(None, use_errno=True) if self.ionice_class and _SYS_IOPRIO_SET else None
+
+    def _make_cgroup(self) -> str:
+        parent = (os.environ.get("WORKER_CGROUP_PARENT") or "").strip()
+        if not parent:
+            return ""
+        cpu_max = (os.environ.get("WORKER_CGROUP_CPU_MAX") or "").strip()
+        mem_max = (os.environ.get("WORKER_CGROUP_MEMORY_MAX") or "").strip()
+        try:
+            if not os.path.exists(os.path.join(parent, "cgroup.controllers")):
+                return ""
+            # Best effort: the parent may already delegate these, or we may not be allowed to.
+            try:
+                with open(os.path.join(parent, "cgroup.subtree_control"), "w") as f:
+                    f.write("+cpu +memory")
+            except OSError:
+                pass
+            d = os.path.join(parent, f"job-{self.job_id}")
+            os.makedirs(d, exist_ok=True)
+            if cpu_max:
+                Path(d, "cpu.max").write_text(cpu_max)
+            if mem_max:
+                Path(d, "memory.max").write_text(mem_max)
+            return d
+        except OSError as e:
+            logger.warning("cgroup setup failed job=%s err=%s; running without cgroup", self.job_id, e)
+            return ""
+
+    def apply(self, pid: int):
+        """Apply the limits to a just-spawned child, from the parent.
+
+        Nothing runs in the child between fork and exec (a preexec_fn there can deadlock on
+        locks inherited from this process's other threads). The cost is a few milliseconds in
+        which ffmpeg runs unconstrained, before it has started its own threads. Per-thread
+        attributes (affinity, niceness, io priority) still go to every thread already present.
+        """
+        if self.cgroup_dir:
+            try:
+                with open(os.path.join(self.cgroup_dir, "cgroup.procs"), "w") as f:
+                    f.write(str(pid))
+            except OSError as e:
+                logger.warning("cgroup attach failed job=%s pid=%s err=%s", self.job_id, pid, e)
+        try:
+            if self.rlimit_as:
+                resource.prlimit(pid, resource.RLIMIT_AS, (self.rlimit_as, self.rlimit_as))
+            if self.rlimit_fsize:
+                resource.prlimit(pid, resource.RLIMIT_FSIZE, (self.rlimit_fsize, self.rlimit_fsize))
+            for tid in _threads(pid):
+                if self.cpus:
+                    os.sched_setaffinity(tid, self.cpus)
+                if self.nice:
+                    os.setpriority(os.PRIO_PROCESS, tid, min(19, os.getpriority(os.PRIO_PROCESS, tid) + self.nice))
+                if self._libc is not None:
+                    prio = (self.ionice_class << _IOPRIO_CLASS_SHIFT) | (0 if self.ionice_class == 3 else self.ionice_level)
+                    self._libc.syscall(_SYS_IOPRIO_SET, _IOPRIO_WHO_PROCESS, tid, prio)
+        except ProcessLookupError:
+            pass  # exited already; its return code tells the story
+        except OSError as e:
+            logger.warning("isolation failed job=%s pid=%s err=%s", self.job_id, pid, e)
+
+    def active(self) -> bool:
+        return bool(
+            self.cgroup_dir or self.cpus or self.nice or self.ionice_class or self.rlimit_as or self.rlimit_fsize
+        )
+
+    def cleanup(self):
+        if not self.cgroup_dir:
+            return
+        try:
+            os.rmdir(self.cgroup_dir)
+        except OSError as e:
+            logger.warning("cgroup cleanup failed dir=%s err=%s", self.cgroup_dir, e)
+
+    def describe(self) -> dict:
+        return {
+            "cpus": sorted(self.cpus),
+            "nice": self.nice,
+            "ionice_class": self.ionice_class,
+            "rlimit_as": self.rlimit_as,
+            "rlimit_fsize": self.rlimit_fsize,
+            "cgroup": self.cgroup_dir,
+        }
+
+
+# --- load shedding -------------------------------------------------------------------------
+
+def latency_dir() -> str:
+    return os.environ.get("WEB_LATENCY_DIR", "/tmp/convert-god-latency")
+
+
+def shed_latency_ms() -> float:
+    try:
+        return float(os.environ.get("WORKER_SHED_LATENCY_MS", "0"))
+    except Exception:
+        return 0.0
+
+
+class LatencyRecorder:
+    """Rolling request latency for one web process, published as a small JSON file.
+
+    The worker reads every process's file (see web_latency_p95_ms) before claiming a job.
+    """
+
+    def __init__(self, window: int = 200, publish_every: float = 2.0):
+        self.samples = deque(maxlen=window)
+        self.publish_every = publish_every
+        self._last_publish = 0.0
+        # gthread workers observe from many threads.
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        with self._lock:
+            self.samples.append(ms)
+            now = time.time()
+            if now - self._last_publish < self.publish_every:
+                return
+            self._last_publish = now
+            p95 = self.p95()
+            n = len(self.samples)
+        self.publish(now, p95, n)
+
+    def p95(self) -> float:
+        data = sorted(self.samples)
+        if not data:
+            return 0.0
+        return data[min(len(data) - 1, int(len(data) * 0.95))]
+
+    def publish(self, now: float, p95: float, n: int):
+        d = latency_dir()
+        try:
+            os.makedirs(d, exist_ok=True)
+            path = os.path.join(d, f"web-{os.getpid()}.json")
+            tmp = path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"p95_ms": round(p95, 1), "n": n, "ts": now}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+def web_latency_p95_ms(max_age: float = 30.0) -> float:
+    """Worst recent p95 across web processes on this box (0 if none reported lately)."""
+    worst = 0.0
+    now = time.time()
+    try:
+        entries = list(os.scandir(latency_dir()))
+    except OSError:
+        return 0.0
+    for e in entries:
+        if not e.name.endswith(".json"):
+            continue
+        try:
+            with open(e.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        age = now - float(data.get("ts") or 0)
+        if age > max_age:
+            if age > max_age * 20:
+                # Left behind by a web process that is gone.
+                try:
+                    os.remove(e.path)
+                except OSError:
+                    pass
+            continue
+        worst = max(worst, float(data.get("p95_ms") or 0))
+    return worst
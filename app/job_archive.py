@@ -0,0 +1,112 @@
+import logging
+import os
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.utils import timezone
+
+from . import metrics
+from .models import ArchivedJob, Job
+
+
+logger = logging.getLogger("app.job_archive")
+
+TERMINAL_STATUSES = (Job.STATUS_DONE, Job.STATUS_FAILED, Job.STATUS_CANCELED)
+
+# Every concrete column of the hot table; the cold table has the same ones plus archived_at.
+_COPY_FIELDS = [f.attname for f in Job._meta.concrete_fields]
+
+
+def archive_after_minutes() -> float:
+    try:
+        return float(os.environ.get("JOB_ARCHIVE_AFTER_MINUTES", "60"))
+    except Exception:
+        return 60.0
+
+
+def archive_batch_size() -> int:
+    try:
+        return max(1, int(os.environ.get("JOB_ARCHIVE_BATCH_SIZE", "500")))
+    except Exception:
+        return 500
+
+
+def archive_finished(*, older_than_minutes: float | None = None, batch_size: int | None = None,
+                     max_batches: int | None = None) -> int:
+    """Move finished jobs not touched for a while from Job to ArchivedJob, in bulk.
+
+    Each batch is one transaction: copy the rows, then delete them from the hot table with
+    the terminal-status guard repeated, so a row can't be lost or duplicated if several
+    movers run at once. Returns the number of rows moved.
+    """
+    minutes = archive_after_minutes() if older_than_minutes is None else older_than_minutes
+    if minutes <= 0 and older_than_minutes is None:
+        return 0
+    size = batch_size or archive_batch_size()
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        batches += 1
+        with transaction.atomic():
+            rows = list(
+                Job.objects.select_for_update(skip_locked=True)
+                .filter(status__in=TERMINAL_STATUSES, updated_at__lt=cutoff)
+                # Unadopted speculative output is removed by the worker's TTL reaper first.
+                .exclude(speculative=True, status=Job.STATUS_DONE)
+                .order_by("updated_at")
+                .values(*_COPY_FIELDS)[:size]
+            )
+            if not rows:
+                break
+            now = timezone.now()
+            ArchivedJob.objects.bulk_create(
+                [ArchivedJob(archived_at=now, **row) for row in rows], batch_size=size, ignore_conflicts=True
+            )
+            n, _ = Job.objects.filter(id__in=[r["id"] for r in rows], status__in=TERMINAL_STATUSES).delete()
+        moved += n
+        if len(rows) < size:
+            break
+
+    if moved:
+        metrics.incr("jobs_archived", moved)
+        logger.info("archived %s finished jobs", moved)
+    return moved
+
+
+def find_job(job_id):
+    """The job from the hot table, else the archive; None if neither has it."""
+    return Job.objects.filter(id=job_id).first() or ArchivedJob.objects.filter(id=job_id).first()
+
+
+def batch_querysets(batch):
+    return Job.objects.filter(batch=batch), ArchivedJob.objects.filter(batch=batch)
+
+
+def batch_summary(batch) -> tuple[dict, float]:
+    """(counts by status, average progress) across both tables."""
+    counts = {}
+    total = 0
+    progress = 0
+    for qs in batch_querysets(batch):
+        for row in qs.values("status").annotate(n=Count("id"), p=Sum("progress")):
+            counts[row["status"]] = counts.get(row["status"], 0) + row["n"]
+            total += row["n"]
+            progress += row["p"] or 0
+    return counts, (progress / total if total else 0)
+
+
+def batch_page(batch, offset: int, limit: int) -> list:
+    """One page of a batch's jobs in creation order, whichever table each lives in."""
+    hot, cold = batch_querysets(batch)
+    refs = list(
+        hot.annotate(cold=Value(False))
+        .values_list("id", "created_at", "cold")
+        .union(cold.annotate(cold=Value(True)).values_list("id", "created_at", "cold"), all=True)
+        .order_by("created_at", "id")[offset : offset + limit]
+    )
+    found = {j.id: j for j in Job.objects.filter(id__in=[r[0] for r in refs if not r[2]])}
+    found.update({j.id: j for j in ArchivedJob.objects.filter(id__in=[r[0] for r in refs if r[2]])})
+    return [found[r[0]] for r in refs if r[0] in found]
@@ -0,0 +1,316 @@
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import worker_registry
+from .models import Job
+
+
+logger = logging.getLogger("app.job_queue")
+
+
+def queue_backend() -> str:
+    return (os.environ.get("JOB_QUEUE_BACKEND") or "db").strip().lower()
+
+
+def redis_url() -> str:
+    return os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+def queue_prefix() -> str:
+    return os.environ.get("JOB_QUEUE_PREFIX", "convert-god")
+
+
+def reclaim_idle_seconds() -> float:
+    try:
+        return float(os.environ.get("JOB_QUEUE_RECLAIM_SECONDS", "300"))
+    except Exception:
+        return 300.0
+
+
+def mark_processing(job_id, node) -> Job | None:
+    """queued -> processing for `node`; None if another worker (or a cancel) got there first."""
+    n = Job.objects.filter(id=job_id, status=Job.STATUS_QUEUED).update(
+        status=Job.STATUS_PROCESSING,
+        progress=0,
+        error="",
+        worker_name=node.name,
+        updated_at=timezone.now(),
+    )
+    return Job.objects.filter(id=job_id).first() if n else None
+
+
+class DbQueue:
+    """The Job table is the queue: poll for the oldest routable queued row."""
+
+    name = "db"
+
+    def enqueue(self, jobs):
+        pass
+
+    def claim(self, node, presets: list[str], wait: float) -> Job | None:
+        with transaction.atomic():
+            qs = Job.objects.select_for_update(skip_locked=True).filter(status=Job.STATUS_QUEUED)
+            job = worker_registry.routed_queue(qs, node, presets).first()
+            # Conditional on still being queued: the row lock is a no-op on SQLite and the
+            # job may have been canceled in between.
+            job = mark_processing(job.id, node) if job else None
+        if not job:
+            time.sleep(wait)
+        return job
+
+    def ack(self, job: Job):
+        pass
+
+    def maintain(self, node):
+        pass
+
+
+class RedisStreamsQueue:
+    """Job ids in Redis Streams, read by a consumer group; `Job` stays the system of record.
+
+    One stream per (preset, lane), lane being "heavy" or "light" by worker_registry.is_heavy,
+    so a worker only reads streams for presets it can encode and small nodes can leave heavy
+    work to bigger ones. Reads block instead of polling.
+
+    Delivery is at-least-once. Every claim still goes through the conditional
+    queued -> processing update, so duplicates and canceled jobs are simply acked away.
+    maintain() reclaims entries left pending by dead consumers (XAUTOCLAIM) and re-adds
+    queued jobs whose enqueue never reached Redis.
+    """
+
+    name = "redis"
+    group = "workers"
+
+    def __init__(self, client=None, *, url: str | None = None, prefix: str | None = None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("JOB_QUEUE_BACKEND=redis needs the 'redis' package") from e
+            client = redis.Redis.from_url(url or redis_url())
+        self.r = client
+        self.prefix = prefix or queue_prefix()
+        self._groups = set()
+        self._inflight = {}
+
+    # --- keys ----------------------------------------------------------------------------
+
+    def stream_key(self, preset: str, heavy: bool) -> str:
+        return f"{self.prefix}:jobs:{preset}:{'heavy' if heavy else 'light'}"
+
+    def speculative_key(self, preset: str) -> str:
+        # Read after every real lane, so speculative work only runs on otherwise idle workers.
+        return f"{self.prefix}:jobs:{preset}:speculative"
+
+    def _marker_key(self, job_id) -> str:
+        return f"{self.prefix}:enqueued:{job_id}"
+
+    def _ensure_group(self, key: str):
+        if key in self._groups:
+            return
+        try:
+            # From id 0 so entries added before the first worker started are delivered too.
+            self.r.xgroup_create(key, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._groups.add(key)
+
+    # --- producer ------------------------------------------------------------------------
+
+    def enqueue(self, jobs):
+        pipe = self.r.pipeline(transaction=False)
+        for j in jobs:
+            if j.speculative:
+                key = self.speculative_key(j.preset)
+            else:
+                key = self.stream_key(j.preset, worker_registry.is_heavy(j.preset, j.input_size_bytes))
+            pipe.xadd(key, {"job_id": str(j.id)})
+            pipe.set(self._marker_key(j.id), "1", ex=7 * 86400)
+        pipe.execute()
+
+    # --- consumer ------------------------------------------------------------------------
+
+    def _streams_for(self, node, presets: list[str]) -> list[str]:
+        light = [self.stream_key(p, False) for p in presets]
+        heavy = [self.stream_key(p, True) for p in presets]
+        spec = [self.speculative_key(p) for p in presets]
+        for key in light + heavy + spec:
+            self._ensure_group(key)
+
+        biggest = max((n.cores for n in worker_registry.live_nodes().exclude(pk=node.pk)), default=0)
+        if biggest <= node.cores:
+            return heavy + light + spec
+        # A bigger node is alive: only take heavy work that has waited past the grace period.
+        grace_ms = worker_registry.route_grace_seconds() * 1000
+        now_ms = time.time() * 1000
+        starving = [k for k in heavy if (self._oldest_undelivered_ms(k) or now_ms) < now_ms - grace_ms]
+        return light + starving + spec
+
+    def _oldest_undelivered_ms(self, key: str) -> float | None:
+        # Stream ids start with their insertion time in ms.
+        try:
+            info = next(g for g in self.r.xinfo_groups(key) if _s(g.get("name")) == self.group)
+            after = _s(info.get("last-delivered-id") or "0-0")
+            entries = self.r.xrange(key, min=f"({after}", max="+", count=1)
+        except Exception:
+            return None
+        if not entries:
+            return None
+        return float(_s(entries[0][0]).split("-")[0])
+
+    def _read(self, streams: list[str], consumer: str, block_ms: int | None):
+        if not streams:
+            return []
+        resp = self.r.xreadgroup(self.group, consumer, {k: ">" for k in streams}, count=1, block=block_ms)
+        out = []
+        for key, entries in resp or []:
+            for entry_id, data in entries:
+                out.append((_s(key), _s(entry_id), _s(data.get(b"job_id") or data.get("job_id") or "")))
+        return out
+
+    def claim(self, node, presets: list[str], wait: float) -> Job | None:
+        streams = self._streams_for(node, presets)
+        if not streams:
+            time.sleep(wait)
+            return None
+        # Stream tails before the priority pass: anything added after this wakes the wait below.
+        pipe = self.r.pipeline(transaction=False)
+        for key in streams:
+            pipe.xrevrange(key, count=1)
+        tails = {key: _s(last[0][0]) if last else "0-0" for key, last in zip(streams, pipe.execute())}
+
+        job = self._claim_first(streams, node)
+        if job:
+            return job
+        # Block without claiming, then claim in priority order: a grouped read across every stream
+        # could hand this consumer one entry per stream, left pending through the next encode.
+        self.r.xread(tails, count=1, block=max(1, int(wait * 1000)))
+        return self._claim_first(streams, node)
+
+    def _claim_first(self, streams: list[str], node) -> Job | None:
+        """One entry at a time, streams in priority order, until a job is claimed."""
+        for key in streams:
+            while True:
+                got = self._read([key], node.name, None)
+                if not got:
+                    break
+                key, entry_id, job_id = got[0]
+                job = mark_processing(job_id, node) if job_id else None
+                if job:
+                    self._inflight[str(job.id)] = (key, entry_id)
+                    return job
+                # Canceled, duplicate or gone: nothing to do for this entry.
+                self._drop(key, entry_id, job_id)
+        return None
+
+    def ack(self, job: Job):
+        ref = self._inflight.pop(str(job.id), None)
+        if ref:
+            self._drop(ref[0], ref[1], job.id)
+
+    def _drop(self, key: str, entry_id: str, job_id):
+        pipe = self.r.pipeline(transaction=False)
+        pipe.xack(key, self.group, entry_id)
+        pipe.xdel(key, entry_id)
+        if job_id:
+            pipe.delete(self._marker_key(job_id))
+        pipe.execute()
+
+    # --- housekeeping --------------------------------------------------------------------
+
+    def maintain(self, node):
+        self.reclaim(node)
+        self.resync()
+
+    def reclaim(self, node) -> int:
+        """Take over entries a consumer has held longer than JOB_QUEUE_RECLAIM_SECONDS.
+
+        Long encodes hold their entry the whole time, so the DB decides: entries whose job is
+        queued, or processing on a worker that stopped heartbeating, are re-added; entries of
+        jobs that are live elsewhere are left alone; the rest are acked away.
+        """
+        idle_ms = int(reclaim_idle_seconds() * 1000)
+        requeued = 0
+        for key in list(self._groups):
+            try:
+                resp = self.r.xautoclaim(key, self.group, node.name, min_idle_time=idle_ms, start_id="0-0", count=100)
+            except Exception:
+                logger.exception("xautoclaim failed stream=%s", key)
+                continue
+            for entry_id, data in resp[1] if len(resp) > 1 else []:
+                if data is None:
+                    continue
+                entry_id = _s(entry_id)
+                job_id = _s(data.get(b"job_id") or data.get("job_id") or "")
+                job = Job.objects.filter(id=job_id).only("id", "status", "worker_name", "preset", "input_size_bytes", "speculative").first() if job_id else None
+                # Asked per entry, not from a set taken before the xautoclaim round.
+                if job and job.status == Job.STATUS_PROCESSING and not worker_registry.is_dead(job.worker_name):
+                    continue
+                if job and job.status == Job.STATUS_PROCESSING:
+                    # Its worker died mid-encode: back to the queue.
+                    n = Job.objects.filter(id=job.id, status=Job.STATUS_PROCESSING, worker_name=job.worker_name).update(
+                        status=Job.STATUS_QUEUED, progress=0, updated_at=timezone.now()
+                    )
+                    if n:
+                        logger.warning("requeued job=%s from dead worker=%s", job.id, job.worker_name)
+                        job.status = Job.STATUS_QUEUED
+                self._drop(key, entry_id, None)
+                if job and job.status == Job.STATUS_QUEUED:
+                    self.enqueue([job])
+                    requeued += 1
+        return requeued
+
+    def resync(self, older_than: float = 60.0, limit: int = 1000) -> int:
+        """Re-add queued jobs that have no enqueue marker (Redis was down or flushed at create time)."""
+        cutoff = timezone.now() - timedelta(seconds=older_than)
+        jobs = list(
+            Job.objects.filter(status=Job.STATUS_QUEUED, created_at__lt=cutoff)
+            .only("id", "preset", "input_size_bytes", "speculative")
+            .order_by("created_at")[:limit]
+        )
+        if not jobs:
+            return 0
+        pipe = self.r.pipeline(transaction=False)
+        for j in jobs:
+            pipe.exists(self._marker_key(j.id))
+        missing = [j for j, present in zip(jobs, pipe.execute()) if not present]
+        if missing:
+            logger.warning("re-enqueueing %d queued jobs missing from redis", len(missing))
+            self.enqueue(missing)
+        return len(missing)
+
+
+def _s(v) -> str:
+    return v.decode() if isinstance(v, bytes) else str(v)
+
+
+_queue = None
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        _queue = RedisStreamsQueue() if queue_backend() == "redis" else DbQueue()
+    return _queue
+
+
+def enqueue_on_commit(jobs):
+    """Publish jobs once their rows are committed, so a worker never reads an id it can't see.
+
+    Failure to publish is logged, not raised: the job row exists and resync() picks it up.
+    """
+    jobs = list(jobs)
+
+    def publish():
+        try:
+            get_queue().enqueue(jobs)
+        except Exception:
+            logger.exception("enqueue failed for %d jobs", len(jobs))
+
+    transaction.on_commit(publish)
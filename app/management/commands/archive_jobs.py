@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from app import job_archive
+
+
+class Command(BaseCommand):
+    help = "Move finished jobs from the hot Job table to ArchivedJob (the worker also does this every minute)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-minutes",
+            type=float,
+            default=None,
+            help="Only jobs finished at least this long ago (default JOB_ARCHIVE_AFTER_MINUTES)",
+        )
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per transaction")
+
+    def handle(self, *args, **opts):
+        minutes = opts["older_than_minutes"]
+        if minutes is None:
+            minutes = job_archive.archive_after_minutes()
+        n = job_archive.archive_finished(older_than_minutes=minutes, batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {n} jobs"))
@@ -0,0 +1,112 @@
+import hashlib
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from app import ranged_download
+
+
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+def _make_handler(payload: bytes, per_conn_bps: float, fail_rate: float, ranges: bool):
+    etag = '"' + hashlib.sha256(payload).hexdigest()[:16] + '"'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end, status = 0, len(payload) - 1, 200
+            m = _RANGE_RE.match(self.headers.get("Range") or "")
+            if ranges and m:
+                if_range = self.headers.get("If-Range")
+                if not if_range or if_range == etag:
+                    start = int(m.group(1))
+                    end = min(end, int(m.group(2))) if m.group(2) else end
+                    status = 206
+            self.send_response(status)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("ETag", etag)
+            if ranges:
+                self.send_header("Accept-Ranges", "bytes")
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+            self.end_headers()
+
+            # Throttle each connection like a CDN edge would; optionally drop mid-body.
+            drop_at = start + random.randint(0, end - start) if random.random() < fail_rate else None
+            pos = start
+            t0 = time.monotonic()
+            while pos <= end:
+                n = min(256 * 1024, end - pos + 1)
+                if drop_at is not None and pos + n > drop_at:
+                    self.close_connection = True
+                    return
+                try:
+                    self.wfile.write(payload[pos : pos + n])
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                pos += n
+                if per_conn_bps:
+                    ahead = (pos - start) / per_conn_bps - (time.monotonic() - t0)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = "Benchmark single-stream vs ranged URL downloads against a local throttled HTTP server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=64)
+        parser.add_argument("--connections", default="1,2,4,8", help="Comma-separated connection counts")
+        parser.add_argument("--per-conn-mbps", type=float, default=200.0, help="Per-connection throttle (0 = none)")
+        parser.add_argument("--fail-rate", type=float, default=0.0, help="Chance a response is cut off mid-body")
+        parser.add_argument("--no-ranges", action="store_true", help="Server ignores Range (tests the fallback)")
+
+    def handle(self, *args, **opts):
+        payload = os.urandom(opts["size_mb"] * 1024**2)
+        want = hashlib.sha256(payload).hexdigest()
+        handler = _make_handler(payload, opts["per_conn_mbps"] * 1e6 / 8, opts["fail_rate"], not opts["no_ranges"])
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/bench.mp4"
+
+        self.stdout.write(
+            f"{opts['size_mb']} MiB, {opts['per_conn_mbps']:g} Mbit/s per connection, fail rate {opts['fail_rate']:g}"
+        )
+        self.stdout.write(f"{'conns':>5} {'mode':>7} {'parts':>5} {'retries':>7} {'seconds':>8} {'Mbit/s':>8}  ok")
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                dst = os.path.join(tmp, "out.bin")
+                for conns in [int(x) for x in opts["connections"].split(",") if x.strip()]:
+                    t0 = time.monotonic()
+                    try:
+                        resp = urllib.request.urlopen(url, timeout=30)
+                        res = ranged_download.download(resp, dst, len(payload) * 2, connections=conns)
+                    except Exception as e:
+                        self.stdout.write(f"{conns:>5} failed: {type(e).__name__}: {e}")
+                        continue
+                    secs = time.monotonic() - t0
+                    with open(dst, "rb") as f:
+                        ok = hashlib.sha256(f.read()).hexdigest() == want
+                    mode = "ranged" if res.ranged else "single"
+                    self.stdout.write(
+                        f"{conns:>5} {mode:>7} {res.parts:>5} {res.retries:>7} {secs:>8.2f} "
+                        f"{len(payload) * 8 / secs / 1e6:>8.1f}  {'yes' if ok else 'NO'}"
+                    )
+        finally:
+            server.shutdown()
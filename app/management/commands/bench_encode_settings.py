@@ -0,0 +1,92 @@
+import os
+import re
+import subprocess
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import encode_analysis
+from app.management.commands.worker import ffmpeg_bin, preset_args
+from app.media_probe import probe_input
+
+
+_SSIM_RE = re.compile(r"SSIM .*All:([\d.]+)")
+
+
+class Command(BaseCommand):
+    help = "Encode inputs with the fixed x264 settings and with per-title analysis; compare time and size."
+
+    def add_arguments(self, parser):
+        parser.add_argument("inputs", nargs="+", help="Local media files")
+        parser.add_argument("--presets", default="720p", help="Comma-separated video presets")
+        parser.add_argument("--ssim", action="store_true", help="Also report SSIM of the tuned output against the fixed one")
+
+    def handle(self, *args, **opts):
+        presets = [p.strip() for p in opts["presets"].split(",") if p.strip()]
+        unknown = [p for p in presets if p not in encode_analysis.CRF_BOUNDS]
+        if unknown:
+            raise CommandError(f"not a video preset: {', '.join(unknown)}")
+
+        self.stdout.write(
+            f"{'input':<24} {'preset':>6} {'class':>8} {'settings':>24} {'analyze s':>9} "
+            f"{'fixed s':>8} {'tuned s':>8} {'fixed MB':>9} {'tuned MB':>9} {'bytes':>7}"
+            + (f" {'ssim':>7}" if opts["ssim"] else "")
+        )
+        totals = {"fixed_s": 0.0, "tuned_s": 0.0, "analyze_s": 0.0, "fixed_b": 0, "tuned_b": 0}
+        with tempfile.TemporaryDirectory() as tmp:
+            for src in opts["inputs"]:
+                if not os.path.isfile(src):
+                    raise CommandError(f"no such file: {src}")
+                info = probe_input(src)
+                t0 = time.monotonic()
+                m = encode_analysis.measure(
+                    src, ffmpeg=ffmpeg_bin(), end=float(info.get("duration") or 0),
+                    width=info.get("width") or 0, height=info.get("height") or 0,
+                )
+                analyze_s = time.monotonic() - t0
+                totals["analyze_s"] += analyze_s
+                for preset in presets:
+                    tuning = encode_analysis.decide(preset, m)
+                    fixed = os.path.join(tmp, "fixed.mp4")
+                    tuned = os.path.join(tmp, "tuned.mp4")
+                    fixed_s = self.encode(src, fixed, preset_args(preset))
+                    tuned_s = self.encode(src, tuned, preset_args(preset, tuning=tuning))
+                    fixed_b, tuned_b = os.path.getsize(fixed), os.path.getsize(tuned)
+                    totals["fixed_s"] += fixed_s
+                    totals["tuned_s"] += tuned_s
+                    totals["fixed_b"] += fixed_b
+                    totals["tuned_b"] += tuned_b
+                    label = f"crf {tuning['crf']} {tuning['preset']}" + (f" {tuning['tune']}" if tuning["tune"] else "")
+                    line = (
+                        f"{os.path.basename(src)[:24]:<24} {preset:>6} {tuning['class']:>8} {label:>24} {analyze_s:>9.2f} "
+                        f"{fixed_s:>8.2f} {tuned_s:>8.2f} {fixed_b / 1e6:>9.2f} {tuned_b / 1e6:>9.2f} "
+                        f"{(tuned_b - fixed_b) / max(1, fixed_b) * 100:>+6.1f}%"
+                    )
+                    if opts["ssim"]:
+                        line += f" {self.ssim(tuned, fixed):>7.4f}"
+                    self.stdout.write(line)
+
+        if totals["fixed_b"]:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"total: encode {totals['fixed_s']:.1f}s -> {totals['tuned_s']:.1f}s "
+                    f"(+{totals['analyze_s']:.1f}s analysis), output {totals['fixed_b'] / 1e6:.1f}MB -> "
+                    f"{totals['tuned_b'] / 1e6:.1f}MB ({(totals['tuned_b'] - totals['fixed_b']) / totals['fixed_b'] * 100:+.1f}%)"
+                )
+            )
+
+    def encode(self, src: str, dst: str, args: list[str]) -> float:
+        t0 = time.monotonic()
+        r = subprocess.run([ffmpeg_bin(), "-hide_banner", "-nostats", "-y", "-i", src] + args + [dst], capture_output=True, text=True)
+        if r.returncode != 0:
+            raise CommandError(f"encode failed: {r.stderr.strip()[-500:]}")
+        return time.monotonic() - t0
+
+    def ssim(self, a: str, b: str) -> float:
+        r = subprocess.run(
+            [ffmpeg_bin(), "-hide_banner", "-nostats", "-i", a, "-i", b, "-lavfi", "ssim", "-f", "null", "-"],
+            capture_output=True, text=True,
+        )
+        m = _SSIM_RE.search(r.stderr)
+        return float(m.group(1)) if m else 0.0
@@ -1,10 +1,11 @@
 import os
+import time
 from datetime import timedelta
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
-from app.models import Job
+from app.models import ArchivedJob, ContentAnalysis, Job, RateBucket, RateSlot
 from app.storage import s3_client, bucket_name
 
 
@@ -21,10 +22,10 @@ class Command(BaseCommand):
         b = bucket_name()
         c = s3_client() if b else None
 
-        qs = Job.objects.filter(created_at__lt=cutoff)
-        n = qs.count()
+        querysets = [Job.objects.filter(created_at__lt=cutoff), ArchivedJob.objects.filter(created_at__lt=cutoff)]
+        n = sum(qs.count() for qs in querysets)
 
-        for j in qs.iterator():
+        for j in (j for qs in querysets for j in qs.iterator()):
             if c and b:
                 # Best effort deletes
                 try:
@@ -37,6 +38,18 @@ class Command(BaseCommand):
                         c.delete_object(Bucket=b, Key=j.output_key)
                 except Exception:
                     pass
+                for meta in (j.side_outputs or {}).values():
+                    try:
+                        if meta.get("key"):
+                            c.delete_object(Bucket=b, Key=meta["key"])
+                    except Exception:
+                        pass
             j.delete()
 
+        # Cached encode analyses go with the inputs they describe.
+        ContentAnalysis.objects.filter(created_at__lt=cutoff).delete()
+        # Idle rate-limit buckets (full again long ago) and slots of crashed requests.
+        RateBucket.objects.filter(updated_at__lt=time.time() - 86400).delete()
+        RateSlot.objects.filter(expires_at__lt=timezone.now()).delete()
+
         self.stdout.write(self.style.SUCCESS(f"Deleted {n} jobs older than {days} days"))
@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import tracing
+from app.job_archive import find_job
+
+
+class Command(BaseCommand):
+    help = "Print one job's lifecycle (upload -> queue -> encode -> download) from the recorded spans."
+
+    def add_arguments(self, parser):
+        parser.add_argument("job_id")
+        parser.add_argument("--path", default=None, help="Span file (default TRACE_JSONL_PATH)")
+        parser.add_argument("--json", action="store_true", help="Dump the matching spans as JSON lines")
+
+    def handle(self, *args, **opts):
+        job = find_job(opts["job_id"]) if _looks_like_uuid(opts["job_id"]) else None
+        if job is None:
+            raise CommandError(f"No job {opts['job_id']}")
+
+        job_id = str(job.id)
+        # Spans recorded before the job existed are tied to it through the input key / batch.
+        trace_ids = {tracing.trace_id_for(job.id), tracing.trace_id_for(job.input_key)}
+        if job.batch_id:
+            trace_ids.add(tracing.trace_id_for(job.batch_id))
+        spans = sorted(
+            (
+                s
+                for s in tracing.read_jsonl(opts["path"])
+                if s.get("trace_id") in trace_ids or (s.get("attrs") or {}).get("job_id") == job_id
+            ),
+            key=lambda s: s["start_ns"],
+        )
+        if opts["json"]:
+            for s in spans:
+                self.stdout.write(json.dumps(s))
+            return
+        if not spans:
+            self.stdout.write(f"No spans for job {job_id} (TRACE_EXPORTER={tracing.trace_exporter()})")
+            return
+
+        by_id = {s["span_id"]: s for s in spans}
+        t0 = spans[0]["start_ns"]
+        wall = max(s["end_ns"] for s in spans) - t0
+        self.stdout.write(f"job {job_id}  status={job.status}  preset={job.preset}  wall={wall / 1e9:.3f}s")
+        self.stdout.write(f"{'offset':>10}  {'duration':>10}  {'%wall':>6}  stage")
+        for s in spans:
+            depth = 0
+            parent = by_id.get(s["parent_id"])
+            while parent:
+                depth += 1
+                parent = by_id.get(parent["parent_id"])
+            dur = s["end_ns"] - s["start_ns"]
+            pct = dur / wall * 100 if wall else 0
+            flag = "  !" if s.get("status") == "error" else ""
+            self.stdout.write(
+                f"{(s['start_ns'] - t0) / 1e9:>9.3f}s  {dur / 1e9:>9.3f}s  {pct:>5.1f}%  {'  ' * depth}{s['name']}{flag}"
+            )
+
+        # The bottleneck is the largest leaf stage: a parent's time is its children's.
+        leaves = [s for s in spans if not any(c["parent_id"] == s["span_id"] for c in spans)]
+        top = max(leaves, key=lambda s: s["end_ns"] - s["start_ns"])
+        share = (top["end_ns"] - top["start_ns"]) / wall * 100 if wall else 0
+        self.stdout.write(self.style.WARNING(f"bottleneck: {top['name']} ({share:.1f}% of wall time)"))
+
+
+def _looks_like_uuid(value: str) -> bool:
+    return len(value.replace("-", "")) == 32
@@ -0,0 +1,119 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter so nothing this process already imported skews the numbers.
+# Phase marks are wall-clock times; the parent turns them into offsets from spawn.
+_CHILD = r"""
+import json, sys, time
+marks = [("start", time.time())]
+import django
+django.setup()
+marks.append(("django.setup", time.time()))
+from django.core.wsgi import get_wsgi_application
+app = get_wsgi_application()
+marks.append(("wsgi app", time.time()))
+host = sys.argv[1]
+status = []
+def hit():
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": "/healthz", "QUERY_STRING": "", "SERVER_NAME": host,
+        "SERVER_PORT": "443", "HTTP_HOST": host, "HTTP_X_FORWARDED_PROTO": "https", "wsgi.url_scheme": "https",
+        "wsgi.input": sys.stdin.buffer, "wsgi.errors": sys.stderr, "SERVER_PROTOCOL": "HTTP/1.1",
+    }
+    body = b"".join(app(environ, lambda s, h, *a: status.append(s)))
+hit()
+marks.append(("first request", time.time()))
+hit()
+marks.append(("second request", time.time()))
+print(json.dumps({"marks": marks, "status": status}))
+"""
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) from `python -X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((name.strip(), int(self_us), int(cum_us), (len(name) - len(name.lstrip()) - 1) // 2))
+        except ValueError:
+            continue  # header line
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Profile a cold start: import time per module and time to the first served request."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="How many modules to list")
+        parser.add_argument("--json", action="store_true", help="Machine-readable output")
+        parser.add_argument("--skip-migration-check", action="store_true",
+                            help="Don't time `migrate_if_needed --check` (it needs the database)")
+
+    def handle(self, *args, **opts):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "convert_god.settings"))
+        hosts = [h for h in settings.ALLOWED_HOSTS if h not in ("*",) and not h.startswith(".")]
+        host = hosts[0] if hosts else "localhost"
+
+        t0 = time.time()
+        p = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _CHILD, host],
+            cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+        )
+        if p.returncode != 0:
+            raise CommandError(f"startup probe failed rc={p.returncode}\n{p.stderr[-4000:]}")
+        result = json.loads(p.stdout.strip().splitlines()[-1])
+
+        phases = []
+        prev = t0
+        for name, ts in result["marks"]:
+            phases.append({"phase": "interpreter" if name == "start" else name, "seconds": round(ts - prev, 4)})
+            prev = ts
+        imports = parse_importtime(p.stderr)
+        report = {
+            "time_to_first_request": round(result["marks"][3][1] - t0, 4),
+            "first_request_status": result["status"][0] if result["status"] else "",
+            "phases": phases,
+            "top_level_imports": [
+                {"module": m, "cumulative_ms": round(c / 1000, 2)}
+                for m, s, c, d in sorted((r for r in imports if r[3] == 0), key=lambda r: -r[2])[: opts["top"]]
+            ],
+            "heaviest_modules": [
+                {"module": m, "self_ms": round(s / 1000, 2), "cumulative_ms": round(c / 1000, 2)}
+                for m, s, c, d in sorted(imports, key=lambda r: -r[1])[: opts["top"]]
+            ],
+        }
+        if not opts["skip_migration_check"]:
+            t = time.time()
+            m = subprocess.run([sys.executable, "manage.py", "migrate_if_needed", "--check"], cwd=str(settings.BASE_DIR),
+                               env=env, capture_output=True, text=True)
+            report["migration_check"] = {"seconds": round(time.time() - t, 4), "up_to_date": m.returncode == 0}
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        w = self.stdout.write
+        w(f"time to first request: {report['time_to_first_request']:.3f}s ({report['first_request_status']})")
+        for ph in phases:
+            w(f"  {ph['phase']:<16} {ph['seconds']:>8.3f}s")
+        if "migration_check" in report:
+            mc = report["migration_check"]
+            w(f"boot migration check: {mc['seconds']:.3f}s ({'up to date' if mc['up_to_date'] else 'pending'})")
+        w("")
+        w("slowest top-level imports (cumulative):")
+        for row in report["top_level_imports"]:
+            w(f"  {row['cumulative_ms']:>9.1f}ms  {row['module']}")
+        w("")
+        w("heaviest modules (self time):")
+        for row in report["heaviest_modules"]:
+            w(f"  {row['self_ms']:>9.1f}ms  {row['cumulative_ms']:>9.1f}ms cum  {row['module']}")
@@ -0,0 +1,49 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from app import tracing
+
+
+class Command(BaseCommand):
+    help = "Minimal OTLP/HTTP JSON receiver that appends spans to the JSONL trace file (for TRACE_EXPORTER=otlp without a real collector)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=4318)
+        parser.add_argument("--path", default=None, help="Span file (default TRACE_JSONL_PATH)")
+
+    def handle(self, *args, **opts):
+        path = opts["path"]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/traces":
+                    self.send_error(404)
+                    return
+                try:
+                    n = int(self.headers.get("Content-Length") or 0)
+                    spans = tracing.from_otlp(json.loads(self.rfile.read(n) or b"{}"))
+                except (ValueError, KeyError, TypeError):
+                    self.send_error(400)
+                    return
+                if spans:
+                    tracing.write_jsonl(spans, path)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, fmt, *args):
+                pass
+
+        server = ThreadingHTTPServer((opts["bind"], opts["port"]), Handler)
+        self.stdout.write(f"collecting OTLP spans on http://{opts['bind']}:{opts['port']}/v1/traces")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,56 @@
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from app import webhooks
+
+
+logger = logging.getLogger("app.webhooks")
+
+
+class Command(BaseCommand):
+    help = "Deliver queued job webhooks from the outbox (retries with backoff)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Deliver what is due now, then exit")
+        parser.add_argument("--poll", type=float, default=2.0, help="Seconds between outbox scans when idle")
+
+    def handle(self, *args, **opts):
+        workers = webhooks.webhook_workers()
+        self.stdout.write(self.style.SUCCESS(f"Webhook dispatcher started (workers={workers})"))
+        # Bounded pool; each task is one host's events, sent in order over one connection. A freed
+        # thread gets new work right away, so one slow host doesn't hold up the others.
+        inflight = {}  # future -> host
+        sent = total = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook") as ex:
+            while True:
+                free = workers - len(inflight)
+                if free > 0:
+                    due = webhooks.claim_due(limit=free * 25)
+                    busy = set(inflight.values())
+                    for host, group in webhooks.group_by_host(due).items():
+                        # One batch per host at a time keeps its events in order; anything that
+                        # can't start now goes back rather than sit out its lease in a queue.
+                        if host in busy or len(inflight) >= workers:
+                            webhooks.release(group)
+                            continue
+                        inflight[ex.submit(webhooks.deliver_host_batch, group)] = host
+                        busy.add(host)
+                        total += len(group)
+                if not inflight:
+                    if total:
+                        logger.info("webhooks: %s/%s delivered", sent, total)
+                        sent = total = 0
+                    if opts["once"]:
+                        return
+                    time.sleep(opts["poll"])
+                    continue
+                done, _ = wait(inflight, timeout=opts["poll"], return_when=FIRST_COMPLETED)
+                for f in done:
+                    del inflight[f]
+                    if f.exception():
+                        logger.error("webhook batch crashed: %s", f.exception())
+                    else:
+                        sent += f.result()
@@ -1,16 +1,25 @@
 import os
 import time
-import json
 import shutil
-import subprocess
+import logging
+import threading
+from datetime import timedelta
 from pathlib import Path
+from urllib.parse import urlparse
 
 from django.core.management.base import BaseCommand
-from django.db import transaction
 from django.utils import timezone
 
+from app import encode_analysis, job_archive, job_queue, metrics, profiling, scratch, speculative, tracing, webhooks, worker_registry
 from app.models import Job
-from app.disk_storage import ensure_dirs, input_path, output_path
+from app.disk_storage import ensure_dirs, input_path, output_path, stream_key_prefix
+from app.hls_prefetch import HlsPrefetcher, prefetch_enabled
+from app.ffmpeg_supervisor import FfmpegSupervisor
+from app.isolation import EncodeIsolation, shed_latency_ms, web_latency_p95_ms
+from app.media_probe import probe_input
+
+
+logger = logging.getLogger("app.worker")
 
 
 def ffmpeg_bin() -> str:
@@ -24,23 +33,46 @@ def poll_seconds() -> float:
         return 2.0
 
 
-def preset_args(preset: str):
-    # Always produce MP4 H.264 + AAC with faststart.
+def segment_seconds() -> int:
+    try:
+        return max(1, int(os.environ.get("STREAM_SEGMENT_SECONDS", "6")))
+    except Exception:
+        return 6
+
+
+def preset_args(preset: str, packaging: str = Job.PACKAGING_MP4, tuning: dict | None = None):
+    """`tuning` ({crf, preset, tune}, see app.encode_analysis) overrides the x264 defaults."""
+    tuning = tuning or encode_analysis.DEFAULT_SETTINGS
+    # Audio-only: drop video entirely so nothing is decoded/encoded beyond the audio track.
+    if preset == Job.PRESET_AUDIO_M4A:
+        return ["-vn", "-c:a", "aac", "-b:a", "192k", "-movflags", "+faststart"]
+    if preset == Job.PRESET_AUDIO_MP3:
+        return ["-vn", "-c:a", "libmp3lame", "-b:a", "192k"]
+    if preset == Job.PRESET_AUDIO_OPUS:
+        return ["-vn", "-c:a", "libopus", "-b:a", "128k"]
+
+    # Video: always produce H.264 + AAC; faststart MP4 or fMP4 segments depending on packaging.
     base = [
         "-c:v",
         "libx264",
         "-preset",
-        "veryfast",
+        tuning["preset"],
         "-crf",
-        "20",
+        str(tuning["crf"]),
+    ] + (["-tune", tuning["tune"]] if tuning.get("tune") else []) + [
         "-c:a",
         "aac",
         "-b:a",
         "160k",
-        "-movflags",
-        "+faststart",
     ]
 
+    if packaging == Job.PACKAGING_MP4:
+        base += ["-movflags", "+faststart"]
+    else:
+        # Keyframes on segment boundaries so every segment starts independently.
+        seg = segment_seconds()
+        base += ["-force_key_frames", f"expr:gte(t,n_forced*{seg})", "-sc_threshold", "0"]
+
     if preset == Job.PRESET_ORIGINAL:
         return base
 
@@ -55,17 +87,311 @@ def preset_args(preset: str):
     return ["-vf", scale] + base
 
 
-def parse_progress_line(line: str):
-    # ffmpeg -progress pipe:1 emits key=value lines
-    if "=" not in line:
-        return None, None
-    k, v = line.strip().split("=", 1)
-    return k.strip(), v.strip()
+def packaging_args(packaging: str, job_id):
+    """Muxer args for segmented output. Returns (args, manifest_key).
+
+    Segments and playlists are written progressively under outputs/<id>/, so playback can
+    start before the encode finishes and no faststart rewrite is needed.
+    """
+    prefix = stream_key_prefix(str(job_id))
+    out_dir = output_path(prefix)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    seg = str(segment_seconds())
+
+    if packaging == Job.PACKAGING_HLS:
+        manifest_key = prefix + "index.m3u8"
+        return [
+            "-f",
+            "hls",
+            "-hls_time",
+            seg,
+            "-hls_playlist_type",
+            "event",
+            "-hls_segment_type",
+            "fmp4",
+            "-hls_fmp4_init_filename",
+            "init.mp4",
+            "-hls_segment_filename",
+            os.path.join(out_dir, "seg_%05d.m4s"),
+            "-hls_flags",
+            "independent_segments+temp_file",
+            output_path(manifest_key),
+        ], manifest_key
+
+    # DASH: one set of CMAF segments referenced by both manifest.mpd and master.m3u8.
+    manifest_key = prefix + "manifest.mpd"
+    return [
+        "-f",
+        "dash",
+        "-seg_duration",
+        seg,
+        "-use_template",
+        "1",
+        "-use_timeline",
+        "1",
+        "-hls_playlist",
+        "1",
+        "-init_seg_name",
+        "init_$RepresentationID$.m4s",
+        "-media_seg_name",
+        "chunk_$RepresentationID$_$Number%05d$.m4s",
+        output_path(manifest_key),
+    ], manifest_key
+
+
+def side_outputs_enabled() -> bool:
+    return os.environ.get("WORKER_SIDE_OUTPUTS", "1") == "1"
+
+
+def preview_seconds() -> float:
+    try:
+        return float(os.environ.get("WORKER_PREVIEW_SECONDS", "10"))
+    except Exception:
+        return 10.0
+
+
+SPRITE_COLS = 10
+SPRITE_ROWS = 10
+SPRITE_TILE_WIDTH = 160
+
+
+def side_output_args(job_id, duration: float, path_for=output_path):
+    """Extra ffmpeg outputs (poster, sprite sheet, preview clip) fed by the main decode.
+
+    Returns (args, side_outputs) where side_outputs maps kind -> metadata incl. storage key.
+    `path_for` maps a key to where ffmpeg writes it (a scratch workspace or MEDIA_ROOT).
+    """
+    poster_key = f"outputs/{job_id}.poster.jpg"
+    sprite_key = f"outputs/{job_id}.sprite.jpg"
+    preview_key = f"outputs/{job_id}.preview.mp4"
+
+    # Skip intros/black frames when we know the duration.
+    poster_at = min(10.0, duration * 0.1) if duration > 0 else 0.0
+    # Spread the sprite grid evenly over the whole input; unknown duration -> one tile per 10s.
+    interval = max(1.0, duration / (SPRITE_COLS * SPRITE_ROWS)) if duration > 0 else 10.0
+
+    args = [
+        "-map",
+        "0:v:0",
+        "-vf",
+        f"trim=start={poster_at:.3f},thumbnail=50,scale='min(1280,iw)':-2",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "3",
+        "-update",
+        "1",
+        path_for(poster_key),
+        "-map",
+        "0:v:0",
+        "-vf",
+        f"fps=1/{interval:.3f},scale={SPRITE_TILE_WIDTH}:-2,tile={SPRITE_COLS}x{SPRITE_ROWS}",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "5",
+        "-update",
+        "1",
+        path_for(sprite_key),
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-t",
+        f"{preview_seconds():.3f}",
+        "-vf",
+        "scale=-2:'min(240,ih)'",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-b:v",
+        "250k",
+        "-maxrate",
+        "300k",
+        "-bufsize",
+        "600k",
+        "-c:a",
+        "aac",
+        "-b:a",
+        "64k",
+        "-movflags",
+        "+faststart",
+        path_for(preview_key),
+    ]
+
+    side_outputs = {
+        "poster": {"key": poster_key, "content_type": "image/jpeg"},
+        "sprite": {
+            "key": sprite_key,
+            "content_type": "image/jpeg",
+            "cols": SPRITE_COLS,
+            "rows": SPRITE_ROWS,
+            "tile_width": SPRITE_TILE_WIDTH,
+            "interval": round(interval, 3),
+        },
+        "preview": {"key": preview_key, "content_type": "video/mp4"},
+    }
+    return args, side_outputs
+
+
+def read_url_pointer(path: str) -> dict:
+    """Parse a .url pointer file written by input_from_url (URL:/KIND:/SRC: lines). {} if not a pointer."""
+    try:
+        if not os.path.isfile(path) or os.path.getsize(path) >= 4096:
+            return {}
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            lines = f.read().splitlines()
+    except Exception:
+        return {}
+    if not lines or not lines[0].startswith("URL:"):
+        return {}
+    out = {}
+    for line in lines:
+        k, sep, v = line.partition(":")
+        if sep:
+            out[k.strip().lower()] = v.strip()
+    return out
+
+
+def is_hls_pointer(pointer: dict) -> bool:
+    url = pointer.get("url") or ""
+    return pointer.get("kind") == "m3u8" or urlparse(url).path.lower().endswith(".m3u8")
+
+
+def required_encoders(preset: str) -> list[str]:
+    if preset == Job.PRESET_AUDIO_M4A:
+        return ["aac"]
+    if preset == Job.PRESET_AUDIO_MP3:
+        return ["libmp3lame"]
+    if preset == Job.PRESET_AUDIO_OPUS:
+        return ["libopus"]
+    return ["libx264", "aac"]
+
+
+def clip_args(start: float | None, end: float | None) -> list[str]:
+    """Input-side trim.
+
+    -ss before -i seeks the demuxer to the keyframe before `start`; since we always re-encode,
+    ffmpeg then decodes and drops frames up to `start` exactly (accurate_seek), so the cut is
+    frame-accurate without decoding the whole head of the file. -t as an input option stops
+    reading at the end of the window, which also bounds every side output.
+    """
+    args = []
+    if start:
+        args += ["-ss", f"{start:.3f}"]
+    if end is not None:
+        args += ["-t", f"{max(0.0, end - (start or 0)):.3f}"]
+    return args
+
+
+def supported_presets(encoders: list[str]) -> list[str]:
+    # Empty list = detection failed; claim everything rather than strand jobs.
+    presets = [p for p, _ in Job.PRESET_CHOICES]
+    if not encoders:
+        return presets
+    have = set(encoders)
+    return [p for p in presets if set(required_encoders(p)) <= have]
+
+
+def stderr_excerpt(tail: str, limit: int = 4000) -> str:
+    # Job.error gets the end of the ring buffer: ffmpeg prints the actual cause last.
+    tail = (tail or "").strip()
+    return tail[-limit:]
+
+
+def cancel_check_seconds() -> float:
+    try:
+        return float(os.environ.get("WORKER_CANCEL_CHECK_SECONDS", "0.5"))
+    except Exception:
+        return 0.5
+
+
+def abandon_minutes() -> float:
+    try:
+        return float(os.environ.get("JOB_ABANDON_MINUTES", "0"))
+    except Exception:
+        return 0.0
+
+
+def reap_abandoned() -> int:
+    """Cancel queued jobs nobody has polled for JOB_ABANDON_MINUTES (0 = never).
+
+    Jobs with a callback_url are never abandoned: their clients wait for the webhook instead of polling.
+    """
+    minutes = abandon_minutes()
+    if minutes <= 0:
+        return 0
+    now = timezone.now()
+    cutoff = now - timedelta(minutes=minutes)
+    n = (
+        Job.objects.filter(status=Job.STATUS_QUEUED, speculative=False, last_polled_at__lt=cutoff, callback_url="")
+        .update(status=Job.STATUS_CANCELED, error="abandoned", updated_at=now)
+    )
+    if n:
+        metrics.incr("jobs_abandoned", n)
+        logger.info("canceled %s abandoned queued jobs (no poll for %.0f min)", n, minutes)
+    return n
+
+
+def reap_speculative() -> int:
+    """Drop speculative jobs nobody adopted within SPECULATIVE_TTL_MINUTES and delete their output.
+
+    A queued one counts from creation, a finished one from completion. Running ones are left
+    alone: preemption stops them when real work needs the slot.
+    """
+    cutoff = timezone.now() - timedelta(minutes=speculative.ttl_minutes())
+    n = speculative.cancel(Job.objects.filter(speculative=True, status=Job.STATUS_QUEUED, created_at__lt=cutoff), "expired")
+    stale = Job.objects.filter(speculative=True, status=Job.STATUS_DONE, updated_at__lt=cutoff)
+    for j in stale.only("id", "output_key", "side_outputs"):
+        # Conditional, so a create_job adopting it right now keeps the output.
+        if Job.objects.filter(id=j.id, speculative=True, status=Job.STATUS_DONE).update(
+            status=Job.STATUS_CANCELED, error="expired", updated_at=timezone.now()
+        ):
+            remove_outputs(j.id, j.output_key, j.side_outputs or {})
+            metrics.incr("speculative_discarded")
+            n += 1
+    if n:
+        logger.info("expired %s unadopted speculative jobs", n)
+    return n
+
+
+def remove_outputs(job_id, out_key: str, side_outputs: dict):
+    """Best-effort removal of whatever a canceled encode left behind."""
+    paths = [output_path(out_key)] + [output_path(m["key"]) for m in side_outputs.values()]
+    for fp in paths:
+        try:
+            if os.path.isfile(fp):
+                os.remove(fp)
+        except OSError:
+            pass
+    shutil.rmtree(output_path(stream_key_prefix(str(job_id))), ignore_errors=True)
+
+
+class JobCanceled(Exception):
+    pass
+
+
+class ScratchFull(Exception):
+    """The scratch disk filled up mid-encode; the job is re-run writing directly."""
+
+
+def merge_stats(job_id, **entries):
+    stats = dict(Job.objects.filter(id=job_id).values_list("stats", flat=True).first() or {})
+    stats.update(entries)
+    Job.objects.filter(id=job_id).update(stats=stats)
 
 
 class Command(BaseCommand):
     help = "Run the conversion worker (polls DB for queued jobs)."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="Sample each job's claim, probe and ffmpeg supervision; see /admin/profiles/",
+        )
+
     def handle(self, *args, **opts):
         ensure_dirs()
 
@@ -73,97 +399,349 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f"ffmpeg not found (FFMPEG_BIN={ffmpeg_bin()})"))
             self.stderr.write("Install ffmpeg in the worker environment or use a docker image that includes it.")
 
-        self.stdout.write(self.style.SUCCESS("Worker started"))
+        node = worker_registry.register(ffmpeg_bin())
+        # encode() keeps heartbeating through long jobs (see should_stop).
+        self.node = node
+        presets = supported_presets(node.encoders)
+        queue = job_queue.get_queue()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Worker started ({node.name}, cores={node.cores}, presets={','.join(presets)}, queue={queue.name})"
+            )
+        )
 
-        while True:
-            job = None
-            with transaction.atomic():
-                job = (
-                    Job.objects.select_for_update(skip_locked=True)
-                    .filter(status=Job.STATUS_QUEUED)
-                    .order_by("created_at")
-                    .first()
-                )
-                if job:
-                    job.status = Job.STATUS_PROCESSING
-                    job.progress = 0
-                    job.error = ""
-                    job.save(update_fields=["status", "progress", "error", "updated_at"])
+        if scratch.scratch_dir():
+            scratch.sweep()
+            logger.info("scratch tier %s", scratch.usage())
 
-            if not job:
+        shedding = False
+        last_reap = 0.0
+        while True:
+            worker_registry.heartbeat(node)
+
+            if time.monotonic() - last_reap > 60:
+                last_reap = time.monotonic()
+                reap_abandoned()
+                reap_speculative()
+                try:
+                    job_archive.archive_finished()
+                except Exception:
+                    logger.exception("job archive failed")
+                try:
+                    queue.maintain(node)
+                except Exception:
+                    logger.exception("queue maintenance failed (queue=%s)", queue.name)
+
+            # Co-located web tier is struggling: finish what we have, but don't start more.
+            limit = shed_latency_ms()
+            if limit > 0:
+                p95 = web_latency_p95_ms()
+                if (p95 > limit) != shedding:
+                    shedding = p95 > limit
+                    logger.info("load shedding %s (web p95=%.0fms limit=%.0fms)", "on" if shedding else "off", p95, limit)
+                if shedding:
+                    time.sleep(poll_seconds())
+                    continue
+
+            # Started before the claim so a slow claim shows up; dropped when nothing was claimed.
+            # It keeps sampling across ffmpeg spawns: those carry no preexec_fn (isolation is
+            # applied from the parent), so no Python runs in a forked child.
+            sampler = profiling.Sampler().start() if opts["profile"] else None
+            try:
+                job = queue.claim(node, presets, poll_seconds())
+            except Exception:
+                logger.exception("claim failed (queue=%s)", queue.name)
+                job = None
                 time.sleep(poll_seconds())
+            if not job:
+                if sampler:
+                    sampler.stop()
                 continue
-
+            claim_ms = sampler.duration_ms if sampler else 0.0
+
+            worker_registry.heartbeat(node, force=True, current_job=job.id)
+            trace_id = tracing.trace_id_for(job.id)
+            # mark_processing stamped updated_at with the claim time.
+            tracing.record("queue_wait", trace_id=trace_id, start=job.created_at, end=job.updated_at,
+                           job_id=str(job.id), queue=queue.name)
+            t0 = time.monotonic()
+            status = Job.STATUS_FAILED
             try:
-                self.process_job(job)
+                with tracing.span("process_job", trace_id=trace_id, job_id=str(job.id), worker=node.name,
+                                  preset=job.preset, packaging=job.packaging):
+                    self.process_job(job)
+                status = Job.STATUS_DONE
+            except JobCanceled:
+                status = Job.STATUS_CANCELED
+                metrics.incr("jobs_canceled_running")
             except Exception as e:
-                Job.objects.filter(id=job.id).update(
+                Job.objects.filter(id=job.id, status=Job.STATUS_PROCESSING).update(
                     status=Job.STATUS_FAILED,
                     error=f"exception:{type(e).__name__}:{e}",
                     updated_at=timezone.now(),
                 )
+            webhooks.record_job(job.id)
+            try:
+                queue.ack(job)
+            except Exception:
+                # Left pending; reclaim() sorts it out from the job's DB state.
+                logger.exception("ack failed job=%s", job.id)
+            worker_registry.record_result(
+                node,
+                status=status,
+                busy_seconds=time.monotonic() - t0,
+                output_bytes=self.output_bytes(job.id) if status == Job.STATUS_DONE else 0,
+            )
+            if sampler:
+                sampler.stop()
+                try:
+                    profiling.save("worker", f"job {job.id}", sampler, job_id=str(job.id), status=status,
+                                   preset=job.preset, packaging=job.packaging, claim_ms=round(claim_ms, 1))
+                except Exception:
+                    logger.exception("profile save failed job=%s", job.id)
+
+    def heartbeat(self, job: Job):
+        # Throttled to WORKER_HEARTBEAT_SECONDS. Without it a long encode makes this worker look
+        # dead to routing, speculative capacity checks and the redis queue's reclaim.
+        node = getattr(self, "node", None)
+        if node:
+            worker_registry.heartbeat(node, current_job=job.id)
 
     def process_job(self, job: Job):
+        # Single-file outputs are encoded (and faststart-rewritten) on the scratch tier and only
+        # the finished files are moved to MEDIA_ROOT. Segmented outputs stay direct: they are
+        # served while the encode is still running.
+        ws = None
+        if scratch.scratch_dir() and job.packaging == Job.PACKAGING_MP4:
+            in_path = input_path(job.input_key)
+            local = not read_url_pointer(in_path) and os.path.isfile(in_path)
+            size = os.path.getsize(in_path) if local else job.input_size_bytes
+            ws = scratch.Workspace.acquire(job.id, size, stage=local and scratch.stage_inputs())
+            metrics.incr("scratch_encodes" if ws else "scratch_fallback_full")
+        try:
+            self.encode(job, ws)
+        except ScratchFull:
+            metrics.incr("scratch_fallback_enospc")
+            logger.warning("scratch ran out of space job=%s; re-running with direct writes", job.id)
+            ws.release()
+            ws = None
+            self.encode(job, None)
+        finally:
+            if ws:
+                ws.release()
+
+    def encode(self, job: Job, ws: "scratch.Workspace | None"):
         in_key = job.input_key
-        out_key = f"outputs/{job.id}.mp4"
-
         in_path = input_path(in_key)
-        out_path = output_path(out_key)
-
-        Path(os.path.dirname(out_path)).mkdir(parents=True, exist_ok=True)
+        path_for = ws.path if ws else output_path
+
+        if job.packaging == Job.PACKAGING_MP4:
+            out_key = f"outputs/{job.id}{job.output_ext}"
+            out_path = path_for(out_key)
+            Path(os.path.dirname(out_path)).mkdir(parents=True, exist_ok=True)
+            out_args = [out_path]
+        else:
+            out_args, out_key = packaging_args(job.packaging, job.id)
+            # Publish the manifest key right away so job_status can hand out a stream URL mid-encode.
+            Job.objects.filter(id=job.id).update(output_key=out_key, updated_at=timezone.now())
 
         # ffmpeg progress
         # Allow URL pointer files: first line is URL:<media_url>
         # ffmpeg can ingest http(s) MP4, HLS (.m3u8), and some DASH (.mpd) depending on build.
         ffmpeg_input = in_path
-        try:
-            if os.path.isfile(in_path) and os.path.getsize(in_path) < 4096:
-                with open(in_path, "r", encoding="utf-8", errors="ignore") as f:
-                    head = (f.readline() or "").strip()
-                if head.startswith("URL:"):
-                    ffmpeg_input = head.split(":", 1)[1].strip()
-        except Exception:
-            ffmpeg_input = in_path
+        probe_src = in_path
+        pointer = read_url_pointer(in_path)
+        if pointer.get("url"):
+            ffmpeg_input = probe_src = pointer["url"]
+        elif ws:
+            ffmpeg_input = probe_src = ws.stage_input(in_path)
+
+        # HLS: fetch segments ourselves (parallel, keep-alive) and pipe them in, instead of
+        # ffmpeg's one-segment-at-a-time reads. Anything we can't replay verbatim stays with ffmpeg.
+        prefetcher = None
+        if pointer.get("url") and prefetch_enabled() and is_hls_pointer(pointer):
+            prefetcher = HlsPrefetcher(pointer["url"])
+            with tracing.span("prefetch_plan") as sp:
+                planned = prefetcher.plan()
+                sp.set(planned=planned, reason=prefetcher.reason or "")
+            if planned:
+                ffmpeg_input = "pipe:0"
+            else:
+                logger.info("hls prefetch skipped job=%s reason=%s", job.id, prefetcher.reason)
+                prefetcher = None
+
+        with tracing.span("probe") as sp:
+            # Speculative mode probes uploads as they land; reuse that instead of probing again.
+            info = None if pointer.get("url") else speculative.probed(in_path)
+            sp.set(cached=info is not None)
+            if info is None:
+                info = probe_input(probe_src)
+            sp.set(duration=float(info.get("duration") or 0), has_video=bool(info.get("has_video")))
+
+        # Per-title CRF / x264 preset / tune from a quick low-res pass (cached by input hash).
+        with tracing.span("analyze") as sp:
+            tuning = encode_analysis.settings_for(
+                job, probe_src, info, ffmpeg=ffmpeg_bin(), in_path=in_path, url=pointer.get("url") or ""
+            )
+            sp.set(source=tuning["source"], crf=tuning["crf"], x264_preset=tuning["preset"])
+        if tuning["source"] != "default" or tuning.get("error"):
+            merge_stats(job.id, encode_settings=tuning)
 
         cmd = [
             ffmpeg_bin(),
+            "-hide_banner",
             "-y",
+        ] + clip_args(job.clip_start, job.clip_end) + [
             "-i",
             ffmpeg_input,
             "-progress",
             "pipe:1",
             "-nostats",
-        ] + preset_args(job.preset) + [out_path]
+        ] + preset_args(job.preset, job.packaging, tuning) + out_args
+        duration = float(info.get("duration") or 0)
+        if duration > 0 and (job.clip_start or job.clip_end is not None):
+            # Progress and sprite spacing follow the clip, not the source.
+            end = min(duration, job.clip_end) if job.clip_end is not None else duration
+            duration = max(0.0, end - (job.clip_start or 0))
+
+        # Poster/sprite/preview ride on the same decode as extra outputs.
+        # Only when we know there is a video stream: an output without streams fails the whole run.
+        side_outputs = {}
+        if side_outputs_enabled() and info.get("has_video") and job.preset not in Job.AUDIO_PRESETS:
+            extra, side_outputs = side_output_args(job.id, duration, path_for)
+            cmd += extra
+
+        # Probe and analysis can take a while on slow inputs.
+        self.heartbeat(job)
+        iso = EncodeIsolation(job.id)
+        if job.speculative:
+            # Low-priority slot: a guess must not slow down work someone is waiting for.
+            iso.nice = max(iso.nice, speculative.speculative_nice())
+        sup = FfmpegSupervisor(cmd, stdin_pipe=bool(prefetcher), on_spawn=iso.apply if iso.active() else None)
+        encode_start = time.time()
+        try:
+            p = sup.start()
+        except Exception:
+            iso.cleanup()
+            raise
 
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        feeder = None
+        if prefetcher:
+            feeder = threading.Thread(target=prefetcher.feed, args=(p.stdin,), name=f"hls-feed-{job.id}", daemon=True)
+            feeder.start()
 
-        # We can't always know duration reliably for arbitrary inputs without probing.
-        # We'll approximate progress by counting 'out_time_ms' up to a cap once we see it.
         last_pct = 0
-        while True:
-            line = p.stdout.readline() if p.stdout else ""
-            if not line:
-                if p.poll() is not None:
-                    break
-                continue
 
-            k, v = parse_progress_line(line)
-            if k == "progress" and v == "end":
-                break
-
-            # Lightweight progress: bump slowly when we see activity.
-            if k == "out_time_ms":
-                # Without duration, just bump up to 95% while running.
-                last_pct = min(95, last_pct + 1)
-                Job.objects.filter(id=job.id).update(progress=last_pct, updated_at=timezone.now())
-
-        rc = p.wait()
-        if rc != 0:
-            raise RuntimeError(f"ffmpeg_failed rc={rc}")
-
-        Job.objects.filter(id=job.id).update(
-            status=Job.STATUS_DONE,
-            progress=100,
-            output_key=out_key,
-            updated_at=timezone.now(),
+        def on_progress(block: dict):
+            nonlocal last_pct
+            try:
+                secs = int(block.get("out_time_us") or 0) / 1e6
+            except ValueError:
+                secs = 0.0
+            if duration > 0 and secs > 0:
+                pct = min(99, int(secs / duration * 100))
+            else:
+                # Unknown duration: bump slowly up to 95% while running.
+                pct = min(95, last_pct + 1)
+            if pct > last_pct:
+                last_pct = pct
+                Job.objects.filter(id=job.id).update(progress=pct, updated_at=timezone.now())
+
+        next_cancel_check = 0.0
+        node = getattr(self, "node", None)
+        presets = supported_presets(node.encoders if node else [])
+
+        def should_stop() -> bool:
+            # Polled by the supervisor every tick; one indexed lookup per WORKER_CANCEL_CHECK_SECONDS.
+            nonlocal next_cancel_check
+            self.heartbeat(job)
+            now = time.monotonic()
+            if now < next_cancel_check:
+                return False
+            next_cancel_check = now + cancel_check_seconds()
+            if job.speculative and Job.objects.filter(
+                status=Job.STATUS_QUEUED, speculative=False, preset__in=presets
+            ).exists():
+                # Real work this node could take is waiting for the slot. No-op if adopted meanwhile.
+                speculative.cancel(Job.objects.filter(id=job.id), "preempted")
+            return Job.objects.filter(id=job.id, status=Job.STATUS_CANCELED).exists()
+
+        try:
+            res = sup.wait(on_progress=on_progress, should_stop=should_stop)
+        finally:
+            iso.cleanup()
+        if feeder:
+            feeder.join()
+            self.record_prefetch(job, prefetcher)
+        tracing.record("encode", trace_id=tracing.trace_id_for(job.id), start=encode_start, **res.stats())
+        merge_stats(job.id, ffmpeg=res.stats(), **({"isolation": iso.describe()} if iso.active() else {}))
+
+        if res.stopped:
+            remove_outputs(job.id, out_key, side_outputs)
+            raise JobCanceled()
+
+        if res.stalled:
+            raise RuntimeError(f"ffmpeg_stalled no progress for {sup.stall:.0f}s\n{stderr_excerpt(res.stderr_tail)}")
+        if res.rc != 0 and ws and "No space left on device" in res.stderr_tail:
+            raise ScratchFull()
+        if res.rc != 0:
+            raise RuntimeError(f"ffmpeg_failed rc={res.rc}\n{stderr_excerpt(res.stderr_tail)}")
+        if prefetcher and prefetcher.error:
+            # ffmpeg saw a clean EOF, but the stream was cut short.
+            raise RuntimeError(f"hls_prefetch_failed:{prefetcher.error}")
+
+        with tracing.span("finalize"):
+            self.heartbeat(job)
+            if ws:
+                # Side outputs first, the main output last, each an atomic move into MEDIA_ROOT.
+                for meta in side_outputs.values():
+                    if os.path.exists(ws.path(meta["key"])) and os.path.getsize(ws.path(meta["key"])) > 0:
+                        ws.promote(meta["key"])
+                if not ws.promote(out_key):
+                    # ffmpeg exited 0 without writing it; DONE would point at a missing file.
+                    remove_outputs(job.id, out_key, side_outputs)
+                    raise RuntimeError(f"output_missing {out_key} not produced on scratch")
+                merge_stats(job.id, scratch=ws.stats())
+                metrics.incr("scratch_promoted_bytes", ws.promoted_bytes)
+            side_outputs = {
+                kind: meta
+                for kind, meta in side_outputs.items()
+                if os.path.exists(output_path(meta["key"])) and os.path.getsize(output_path(meta["key"])) > 0
+            }
+
+            # A cancel that lands after ffmpeg finished still wins, and takes the outputs with it.
+            n = Job.objects.filter(id=job.id, status=Job.STATUS_PROCESSING).update(
+                status=Job.STATUS_DONE,
+                progress=100,
+                output_key=out_key,
+                side_outputs=side_outputs,
+                updated_at=timezone.now(),
+            )
+            if not n:
+                remove_outputs(job.id, out_key, side_outputs)
+                raise JobCanceled()
+
+    def record_prefetch(self, job: Job, prefetcher: HlsPrefetcher):
+        st = prefetcher.stats()
+        merge_stats(job.id, hls_prefetch=st)
+
+        metrics.incr("hls_prefetch_segments", st["segments"])
+        metrics.incr("hls_prefetch_bytes", st["bytes"])
+        metrics.incr("hls_prefetch_seconds", st["seconds"])
+        metrics.incr("hls_prefetch_retries", st["retries"])
+        logger.info(
+            "hls prefetch job=%s segments=%s bytes=%s secs=%s mbps=%s seg/s=%s retries=%s",
+            job.id, st["segments"], st["bytes"], st["seconds"], st["mbps"], st["segments_per_sec"], st["retries"],
         )
+
+    def output_bytes(self, job_id) -> int:
+        key = Job.objects.filter(id=job_id).values_list("output_key", flat=True).first() or ""
+        if not key:
+            return 0
+        try:
+            if key.startswith(stream_key_prefix(str(job_id))):
+                d = output_path(stream_key_prefix(str(job_id)))
+                return sum(e.stat().st_size for e in os.scandir(d) if e.is_file())
+            return os.path.getsize(output_path(key))
+        except OSError:
+            return 0
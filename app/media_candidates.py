@@ -0,0 +1,307 @@
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from . import http_pool
+from .hls_prefetch import parse_master, parse_media
+from .upload_handler import sniff_container
+
+
+logger = logging.getLogger("app.media_candidates")
+
+_EXTINF_RE = re.compile(r"#EXTINF:\s*([0-9.]+)")
+_MPD_REP_RE = re.compile(r"<Representation\b[^>]*>", re.IGNORECASE)
+_XML_ATTR_RE = re.compile(r'(\w+)="([^"]*)"')
+_KIND_RE = re.compile(r"\.(mp4|m3u8|mpd)(\?|$)", re.IGNORECASE)
+
+# First bytes of an MP4 we read: enough for the container magic, and for moov when it's up front.
+HEAD_BYTES = 256 * 1024
+PLAYLIST_BYTES = 2 * 1024 * 1024
+
+
+def check_enabled() -> bool:
+    return os.environ.get("CANDIDATE_CHECK", "1") == "1"
+
+
+def check_workers() -> int:
+    try:
+        return max(1, int(os.environ.get("CANDIDATE_CHECK_WORKERS", "6")))
+    except Exception:
+        return 6
+
+
+def check_budget_seconds() -> float:
+    try:
+        return max(1.0, float(os.environ.get("CANDIDATE_CHECK_BUDGET_SECONDS", "10")))
+    except Exception:
+        return 10.0
+
+
+def max_candidates() -> int:
+    try:
+        return max(1, int(os.environ.get("CANDIDATE_CHECK_MAX", "12")))
+    except Exception:
+        return 12
+
+
+def choose(candidates: list[dict], *, budget: float | None = None) -> tuple[dict | None, list[dict]]:
+    """Validate candidates concurrently and pick the best playable one.
+
+    `candidates` are {kind, media_url, reason} dicts (app.extractors / app.browser_sniffer).
+    Returns (best or None, every checked candidate best-first, rejected ones last with a reason).
+    With CANDIDATE_CHECK=0 the first candidate is returned unchecked, as before.
+    """
+    candidates = _dedupe(candidates)[: max_candidates()]
+    if not candidates:
+        return None, []
+    if not check_enabled():
+        first = dict(candidates[0], ok=True, checked=False)
+        return first, [first]
+
+    deadline = time.monotonic() + (budget if budget is not None else check_budget_seconds())
+    # Each check thread keeps its keep-alive connections across candidates (variants and
+    # segments of one CDN share a host); they are closed once every thread is done.
+    pools = []
+    pool = ThreadPoolExecutor(
+        max_workers=min(check_workers(), len(candidates)),
+        thread_name_prefix="cand",
+        initializer=lambda: pools.append(http_pool.thread_conns()),
+    )
+    try:
+        futures = [pool.submit(_check_one, c, i, deadline) for i, c in enumerate(candidates)]
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+    finally:
+        # Stragglers finish on their own (their requests are bounded by the deadline too), so
+        # their connections are closed in the background rather than while still in use.
+        pool.shutdown(wait=False, cancel_futures=True)
+        threading.Thread(target=_close_when_done, args=(pool, pools), name="cand-close", daemon=True).start()
+
+    results = []
+    for i, (c, fut) in enumerate(zip(candidates, futures)):
+        if fut in done and fut.exception() is None:
+            results.append(fut.result())
+        else:
+            results.append(_result(c, i, reason="timeout" if fut not in done else f"error:{fut.exception()}"))
+
+    ranked = rank(results)
+    best = ranked[0] if ranked and ranked[0]["ok"] else None
+    logger.info(
+        "candidates checked=%s playable=%s best=%s",
+        len(results), sum(r["ok"] for r in results), best["media_url"] if best else None,
+    )
+    return best, ranked
+
+
+def _close_when_done(pool: ThreadPoolExecutor, pools: list):
+    pool.shutdown(wait=True)
+    for conns in pools:
+        http_pool.close_conns(conns)
+
+
+def rank(results: list[dict]) -> list[dict]:
+    """Playable first; among those resolution, then bitrate, then length. Short clips next to a
+    much longer one (pre-rolls, teasers) drop below it."""
+    durations = [r["duration"] for r in results if r["ok"] and r["duration"]]
+    longest = max(durations, default=0)
+    for r in results:
+        r["short"] = bool(r["ok"] and r["duration"] and longest >= 60 and r["duration"] < longest * 0.25)
+    return sorted(
+        results,
+        key=lambda r: (
+            not r["ok"],
+            r["short"],
+            -(r["width"] * r["height"]),
+            -r["bandwidth"],
+            -(r["duration"] or 0),
+            -(r["size"] or 0),
+            r["order"],
+        ),
+    )
+
+
+def summary(r: dict) -> dict:
+    """What the API reports about a checked candidate."""
+    keys = ("media_url", "kind", "ok", "reason", "width", "height", "bandwidth", "duration", "size")
+    return {k: r.get(k) for k in keys}
+
+
+# --- checks --------------------------------------------------------------------------------
+
+def _dedupe(candidates: list[dict]) -> list[dict]:
+    seen = set()
+    out = []
+    for c in candidates or []:
+        url = str(c.get("media_url") or "").strip()
+        if url and url not in seen:
+            seen.add(url)
+            out.append(dict(c, media_url=url))
+    return out
+
+
+def _result(c: dict, order: int, *, ok: bool = False, reason: str = "", **info) -> dict:
+    r = {
+        "media_url": c["media_url"],
+        "kind": c.get("kind") or _guess_kind(c["media_url"]),
+        "source": c.get("reason") or "",
+        "order": order,
+        "ok": ok,
+        "reason": reason,
+        "width": 0,
+        "height": 0,
+        "bandwidth": 0,
+        "duration": 0.0,
+        "size": 0,
+    }
+    r.update(info)
+    return r
+
+
+def _guess_kind(url: str) -> str:
+    m = _KIND_RE.search(url)
+    return m.group(1).lower() if m else ""
+
+
+def _timeout(deadline: float) -> float:
+    left = deadline - time.monotonic()
+    if left <= 0.2:
+        raise TimeoutError("budget_exhausted")
+    return min(10.0, left)
+
+
+def _check_one(c: dict, order: int, deadline: float) -> dict:
+    kind = c.get("kind") or _guess_kind(c["media_url"])
+    try:
+        if kind == "m3u8":
+            return _check_hls(c, order, deadline)
+        if kind == "mpd":
+            return _check_dash(c, order, deadline)
+        return _check_file(c, order, deadline)
+    except http_pool.HttpError as e:
+        return _result(c, order, reason=f"http_{e.status}")
+    except Exception as e:
+        return _result(c, order, reason=f"{type(e).__name__}:{e}"[:200])
+
+
+def _check_file(c: dict, order: int, deadline: float) -> dict:
+    status, headers, head, _ = http_pool.request(
+        c["media_url"], headers={"Range": f"bytes=0-{HEAD_BYTES - 1}"}, timeout=_timeout(deadline), max_bytes=HEAD_BYTES
+    )
+    if "text/html" in (headers.get("content-type") or ""):
+        return _result(c, order, reason="html_not_media")
+    if head.lstrip()[:7] == b"#EXTM3U":
+        return _check_hls(dict(c, kind="m3u8"), order, deadline, text=head.decode("utf-8", errors="ignore"))
+    container = sniff_container(head)
+    if not container:
+        return _result(c, order, reason="not_media")
+
+    size = 0
+    total = (headers.get("content-range") or "").rpartition("/")[2]
+    if status == 206 and total.isdigit():
+        size = int(total)
+    elif status == 200 and (headers.get("content-length") or "").isdigit():
+        size = int(headers["content-length"])
+    info = _mp4_info(head) if container in ("mp4", "mov") else {}
+    duration = info.get("duration") or 0.0
+    return _result(
+        c,
+        order,
+        ok=True,
+        reason=container,
+        width=info.get("width", 0),
+        height=info.get("height", 0),
+        bandwidth=int(size * 8 / duration) if size and duration else 0,
+        duration=duration,
+        size=size,
+    )
+
+
+def _check_hls(c: dict, order: int, deadline: float, text: str | None = None) -> dict:
+    url = c["media_url"]
+    if text is None:
+        _, _, body, url = http_pool.request(url, timeout=_timeout(deadline), max_bytes=PLAYLIST_BYTES)
+        text = body.decode("utf-8", errors="ignore")
+    if not text.lstrip().startswith("#EXTM3U"):
+        return _result(c, order, reason="not_a_playlist")
+    if "#EXT-X-STREAM-INF" not in text:
+        return _check_media_playlist(c, order, deadline, text, url)
+
+    variants = sorted(parse_master(text, url), key=lambda v: (v["width"] * v["height"], v["bandwidth"]), reverse=True)
+    if not variants:
+        return _result(c, order, reason="no_variants")
+    # Best variant that actually plays. The worker's prefetcher (and ffmpeg) pick the top one
+    # from the master themselves, so only point past the master when the top one is dead.
+    last = None
+    for i, v in enumerate(variants):
+        try:
+            _, _, body, vurl = http_pool.request(v["uri"], timeout=_timeout(deadline), max_bytes=PLAYLIST_BYTES)
+            last = _check_media_playlist(c, order, deadline, body.decode("utf-8", errors="ignore"), vurl)
+        except http_pool.HttpError as e:
+            last = _result(c, order, reason=f"variant_http_{e.status}")
+            continue
+        if last["ok"]:
+            use_variant = i > 0 and not v["separate_audio"]
+            last.update(
+                media_url=v["uri"] if use_variant else c["media_url"],
+                width=v["width"],
+                height=v["height"],
+                bandwidth=v["bandwidth"] or last["bandwidth"],
+                reason="hls_variant" if use_variant else "hls_master",
+            )
+            return last
+    return last
+
+
+def _check_media_playlist(c: dict, order: int, deadline: float, text: str, url: str) -> dict:
+    media = parse_media(text, url)
+    if not media["segments"]:
+        return _result(c, order, reason="no_segments")
+    # The first segment (or init section) must be reachable; a playlist of dead links is common.
+    probe = media["init"] or media["segments"][0]
+    http_pool.request(probe, headers={"Range": "bytes=0-1023"}, timeout=_timeout(deadline), max_bytes=1024)
+    duration = sum(float(x) for x in _EXTINF_RE.findall(text))
+    return _result(
+        c, order, ok=True, reason="hls_media" if media["endlist"] else "hls_live",
+        duration=round(duration, 3) if media["endlist"] else 0.0,
+    )
+
+
+def _check_dash(c: dict, order: int, deadline: float) -> dict:
+    _, _, body, _ = http_pool.request(c["media_url"], timeout=_timeout(deadline), max_bytes=PLAYLIST_BYTES)
+    text = body.decode("utf-8", errors="ignore")
+    if "<MPD" not in text:
+        return _result(c, order, reason="not_a_manifest")
+    best = {"width": 0, "height": 0, "bandwidth": 0}
+    for tag in _MPD_REP_RE.findall(text):
+        a = dict(_XML_ATTR_RE.findall(tag))
+        rep = {k: int(a[k]) if str(a.get(k, "")).isdigit() else 0 for k in ("width", "height", "bandwidth")}
+        if (rep["width"] * rep["height"], rep["bandwidth"]) > (best["width"] * best["height"], best["bandwidth"]):
+            best = rep
+    return _result(c, order, ok=True, reason="dash_manifest", **best)
+
+
+def _mp4_info(head: bytes) -> dict:
+    """Duration (mvhd) and the largest track size (tkhd) from an MP4 prefix; {} if moov isn't in it."""
+    info = {}
+    i = head.find(b"mvhd")
+    if i >= 4 and len(head) >= i + 28:
+        version = head[i + 4]
+        if version == 1 and len(head) >= i + 36:
+            timescale, duration = struct.unpack(">IQ", head[i + 24 : i + 36])
+        else:
+            timescale, duration = struct.unpack(">II", head[i + 16 : i + 24])
+        if timescale:
+            info["duration"] = round(duration / timescale, 3)
+    i = head.find(b"tkhd")
+    while i >= 4 and len(head) > i + 4:
+        # Width/height are 16.16 fixed point after the matrix; v1 has 12 more bytes of 64-bit times/duration.
+        off = i + (80 if head[i + 4] == 0 else 92)
+        if len(head) >= off + 8:
+            w, h = struct.unpack(">II", head[off : off + 8])
+            if (w >> 16) * (h >> 16) > info.get("width", 0) * info.get("height", 0):
+                info["width"], info["height"] = w >> 16, h >> 16
+        i = head.find(b"tkhd", i + 4)
+    return info
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+
+
+def ffprobe_bin() -> str:
+    return os.environ.get("FFPROBE_BIN", "ffprobe")
+
+
+def probe_input(src: str) -> dict:
+    """Best-effort ffprobe of the input.
+
+    Returns {} when ffprobe is missing or fails; callers must treat every key as optional.
+    """
+    cmd = [
+        ffprobe_bin(),
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration:stream=codec_type,width,height",
+        "-of",
+        "json",
+        src,
+    ]
+    try:
+        r = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if r.returncode != 0:
+            return {}
+        data = json.loads(r.stdout or "{}")
+    except Exception:
+        return {}
+
+    info = {"has_video": False, "has_audio": False}
+    for st in data.get("streams") or []:
+        kind = st.get("codec_type")
+        if kind == "video" and not info["has_video"]:
+            info["has_video"] = True
+            info["width"] = int(st.get("width") or 0)
+            info["height"] = int(st.get("height") or 0)
+        elif kind == "audio":
+            info["has_audio"] = True
+    try:
+        info["duration"] = float((data.get("format") or {}).get("duration") or 0)
+    except Exception:
+        info["duration"] = 0.0
+    return info
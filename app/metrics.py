@@ -0,0 +1,31 @@
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Metric
+
+
+logger = logging.getLogger("app.metrics")
+
+
+def incr(name: str, by: float = 1.0):
+    """Add to a named counter shared by every web/worker process (best effort)."""
+    try:
+        n = Metric.objects.filter(name=name).update(value=F("value") + by, updated_at=timezone.now())
+        if n:
+            return
+        try:
+            with transaction.atomic():
+                Metric.objects.create(name=name, value=by)
+        except IntegrityError:
+            # Another process created it first.
+            Metric.objects.filter(name=name).update(value=F("value") + by, updated_at=timezone.now())
+    except Exception:
+        logger.exception("metric incr failed name=%s", name)
+
+
+def get(name: str) -> float:
+    m = Metric.objects.filter(name=name).first()
+    return float(m.value) if m else 0.0
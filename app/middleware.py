@@ -1,7 +1,12 @@
 import base64
+import time
 from django.conf import settings
 from django.http import HttpResponse
 
+from . import profiling, rate_limit
+from .disk_storage import verify_profile
+from .isolation import LatencyRecorder
+
 
 class BasicAuthMiddleware:
     """Simple private gate.
@@ -35,3 +40,94 @@ class BasicAuthMiddleware:
         resp = HttpResponse("Authentication required", status=401)
         resp["WWW-Authenticate"] = 'Basic realm="Convert God"'
         return resp
+
+
+class LatencyMiddleware:
+    """Publishes this process's rolling p95 request latency for worker load shedding.
+
+    See WORKER_SHED_LATENCY_MS; only the endpoints in URL_NAMES are counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.recorder = LatencyRecorder()
+
+    # Short requests whose latency reflects CPU contention. Uploads, URL fetches/sniffs and
+    # downloads are slow by nature and would trip shedding under normal traffic.
+    URL_NAMES = {"index", "create_job", "create_batch", "job_status", "batch_status"}
+
+    def __call__(self, request):
+        t0 = time.monotonic()
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        if match and match.url_name in self.URL_NAMES:
+            self.recorder.observe((time.monotonic() - t0) * 1000)
+        return response
+
+
+class ProfilingMiddleware:
+    """Samples the stack of a fraction of requests (PROFILE_SAMPLE_RATE) and of any request
+    carrying a valid signed X-Profile header; profiles are listed at /admin/profiles/.
+
+    Only the view runs under the sampler: streamed bodies are sent after it returns.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.META.get("HTTP_X_PROFILE")
+        forced = bool(token) and verify_profile(token)
+        if not forced and not profiling.should_sample():
+            return self.get_response(request)
+        if request.path.startswith("/static/") or request.path.startswith("/admin/profiles"):
+            return self.get_response(request)
+
+        meta = {"method": request.method, "path": request.path, "forced": forced}
+        with profiling.profile("web", f"{request.method} {request.path}", keep_ms=0 if forced else profiling.min_ms(),
+                               **meta) as prof:
+            response = self.get_response(request)
+            prof["status"] = response.status_code
+        if prof.get("id"):
+            response["X-Profile-Id"] = prof["id"]
+        return response
+
+
+class RateLimitMiddleware:
+    """Per-client token buckets and in-flight caps for the expensive API endpoints.
+
+    Limits are keyed by URL name (see app.rate_limit.RULES / CONCURRENCY); everything else
+    passes untouched. Over the limit -> 429 with Retry-After.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiter = rate_limit.get_limiter()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        slot = getattr(request, "rate_slot", None)
+        if slot:
+            self.limiter.release(*slot)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = request.resolver_match.url_name if request.resolver_match else None
+        if not rate_limit.enabled() or (name not in rate_limit.RULES and name not in rate_limit.CONCURRENCY):
+            return None
+        client = rate_limit.client_id(request)
+
+        rule = rate_limit.rule_for(name) if name in rate_limit.RULES else None
+        if rule:
+            wait = self.limiter.allow(f"{name}:{client}", *rule)
+            if wait > 0:
+                return rate_limit.too_many(wait, "Rate limit exceeded")
+
+        cap = rate_limit.concurrency_for(name) if name in rate_limit.CONCURRENCY else 0
+        if cap:
+            key = f"{name}:{client}"
+            token = self.limiter.acquire(key, cap)
+            if token is None:
+                return rate_limit.too_many(5, f"Too many requests in flight (max {cap})")
+            request.rate_slot = (key, token)
+        return None
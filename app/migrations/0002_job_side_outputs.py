@@ -0,0 +1,18 @@
+# Generated by BudE for Convert God
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="side_outputs",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by BudE for Convert God
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0002_job_side_outputs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="packaging",
+            field=models.CharField(choices=[("mp4", "MP4 (faststart)"), ("hls", "HLS (fMP4 segments)"), ("dash", "DASH + HLS (CMAF segments)")], default="mp4", max_length=8),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by BudE for Convert God
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0005_job_stats_metric"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WorkerNode",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=128, unique=True)),
+                ("hostname", models.CharField(blank=True, default="", max_length=128)),
+                ("cores", models.PositiveIntegerField(default=1)),
+                ("ram_bytes", models.BigIntegerField(default=0)),
+                ("encoders", models.JSONField(blank=True, default=list)),
+                ("has_browser", models.BooleanField(default=False)),
+                ("free_disk_bytes", models.BigIntegerField(default=0)),
+                ("load", models.FloatField(default=0)),
+                ("current_job", models.UUIDField(blank=True, null=True)),
+                ("jobs_done", models.PositiveIntegerField(default=0)),
+                ("jobs_failed", models.PositiveIntegerField(default=0)),
+                ("busy_seconds", models.FloatField(default=0)),
+                ("output_bytes", models.BigIntegerField(default=0)),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("heartbeat_at", models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="worker_name",
+            field=models.CharField(blank=True, default="", max_length=128),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by BudE for Convert God
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0006_workernode"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="last_polled_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="job",
+            name="status",
+            field=models.CharField(choices=[("queued", "Queued"), ("processing", "Processing"), ("done", "Done"), ("failed", "Failed"), ("canceled", "Canceled")], db_index=True, default="queued", max_length=16),
+        ),
+    ]
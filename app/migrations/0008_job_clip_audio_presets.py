@@ -0,0 +1,28 @@
+# Generated by BudE for Convert God
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0007_job_canceled_last_polled"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="clip_end",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="clip_start",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="job",
+            name="preset",
+            field=models.CharField(choices=[("original", "Original"), ("1080p", "1080p"), ("720p", "720p"), ("480p", "480p"), ("m4a", "Audio (AAC/M4A)"), ("mp3", "Audio (MP3)"), ("opus", "Audio (Opus)")], default="720p", max_length=16),
+        ),
+    ]
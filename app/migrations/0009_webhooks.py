@@ -0,0 +1,40 @@
+# Generated by BudE for Convert God
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0008_job_clip_audio_presets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="callback_url",
+            field=models.CharField(blank=True, default="", max_length=1024),
+        ),
+        migrations.CreateModel(
+            name="WebhookDelivery",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("job_id", models.UUIDField(db_index=True)),
+                ("event", models.CharField(max_length=32)),
+                ("url", models.CharField(max_length=1024)),
+                ("payload", models.JSONField(default=dict)),
+                ("status", models.CharField(choices=[("pending", "Pending"), ("delivered", "Delivered"), ("failed", "Failed")], default="pending", max_length=16)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("next_attempt_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("last_status_code", models.IntegerField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("delivered_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["status", "next_attempt_at"], name="webhook_due_idx")],
+                "constraints": [models.UniqueConstraint(fields=("job_id", "event"), name="webhook_once_per_job_event")],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by BudE for Convert God
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0009_webhooks"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedJob",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("status", models.CharField(choices=[("queued", "Queued"), ("processing", "Processing"), ("done", "Done"), ("failed", "Failed"), ("canceled", "Canceled")], db_index=True, default="queued", max_length=16)),
+                ("progress", models.PositiveIntegerField(default=0)),
+                ("preset", models.CharField(choices=[("original", "Original"), ("1080p", "1080p"), ("720p", "720p"), ("480p", "480p"), ("m4a", "Audio (AAC/M4A)"), ("mp3", "Audio (MP3)"), ("opus", "Audio (Opus)")], default="720p", max_length=16)),
+                ("packaging", models.CharField(choices=[("mp4", "MP4 (faststart)"), ("hls", "HLS (fMP4 segments)"), ("dash", "DASH + HLS (CMAF segments)")], default="mp4", max_length=8)),
+                ("input_key", models.CharField(max_length=512)),
+                ("clip_start", models.FloatField(blank=True, null=True)),
+                ("clip_end", models.FloatField(blank=True, null=True)),
+                ("callback_url", models.CharField(blank=True, default="", max_length=1024)),
+                ("input_size_bytes", models.BigIntegerField(default=0)),
+                ("output_key", models.CharField(blank=True, default="", max_length=512)),
+                ("side_outputs", models.JSONField(blank=True, default=dict)),
+                ("last_polled_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("error", models.TextField(blank=True, default="")),
+                ("worker_name", models.CharField(blank=True, default="", max_length=128)),
+                ("stats", models.JSONField(blank=True, default=dict)),
+                ("created_at", models.DateTimeField(db_index=True)),
+                ("updated_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("batch", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="archived_jobs", to="app.batch")),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by BudE for Convert God
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0010_archived_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedjob",
+            name="speculative",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="speculative",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
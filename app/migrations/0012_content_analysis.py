@@ -0,0 +1,24 @@
+# Generated by BudE for Convert God
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0011_job_speculative"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentAnalysis",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(max_length=160, unique=True)),
+                ("version", models.PositiveIntegerField(default=1)),
+                ("measurements", models.JSONField(blank=True, default=dict)),
+                ("analysis_seconds", models.FloatField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
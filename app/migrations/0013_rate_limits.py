@@ -0,0 +1,40 @@
+# Generated by BudE for Convert God
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0012_content_analysis"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateBucket",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(max_length=200, unique=True)),
+                ("tokens", models.FloatField(default=0)),
+                ("updated_at", models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RateSlot",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.CharField(db_index=True, max_length=200)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="archivedjob",
+            name="client",
+            field=models.CharField(blank=True, db_index=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="client",
+            field=models.CharField(blank=True, db_index=True, default="", max_length=64),
+        ),
+    ]
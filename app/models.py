@@ -1,30 +1,69 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 
 
-class Job(models.Model):
+class Batch(models.Model):
+    """A group of jobs submitted in one /api/batches request."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.id}"
+
+
+class JobBase(models.Model):
+    """Columns shared by the hot Job table and the cold ArchivedJob table."""
+
     STATUS_QUEUED = "queued"
     STATUS_PROCESSING = "processing"
     STATUS_DONE = "done"
     STATUS_FAILED = "failed"
+    STATUS_CANCELED = "canceled"
 
     STATUS_CHOICES = [
         (STATUS_QUEUED, "Queued"),
         (STATUS_PROCESSING, "Processing"),
         (STATUS_DONE, "Done"),
         (STATUS_FAILED, "Failed"),
+        (STATUS_CANCELED, "Canceled"),
     ]
 
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_PROCESSING)
+
     PRESET_ORIGINAL = "original"
     PRESET_1080 = "1080p"
     PRESET_720 = "720p"
     PRESET_480 = "480p"
+    PRESET_AUDIO_M4A = "m4a"
+    PRESET_AUDIO_MP3 = "mp3"
+    PRESET_AUDIO_OPUS = "opus"
 
     PRESET_CHOICES = [
         (PRESET_ORIGINAL, "Original"),
         (PRESET_1080, "1080p"),
         (PRESET_720, "720p"),
         (PRESET_480, "480p"),
+        (PRESET_AUDIO_M4A, "Audio (AAC/M4A)"),
+        (PRESET_AUDIO_MP3, "Audio (MP3)"),
+        (PRESET_AUDIO_OPUS, "Audio (Opus)"),
+    ]
+
+    AUDIO_PRESETS = (PRESET_AUDIO_M4A, PRESET_AUDIO_MP3, PRESET_AUDIO_OPUS)
+
+    # Output file extension -> content type; video presets produce .mp4
+    PRESET_EXTENSIONS = {PRESET_AUDIO_M4A: ".m4a", PRESET_AUDIO_MP3: ".mp3", PRESET_AUDIO_OPUS: ".opus"}
+    CONTENT_TYPES = {".mp4": "video/mp4", ".m4a": "audio/mp4", ".mp3": "audio/mpeg", ".opus": "audio/ogg"}
+
+    PACKAGING_MP4 = "mp4"
+    PACKAGING_HLS = "hls"
+    PACKAGING_DASH = "dash"
+
+    PACKAGING_CHOICES = [
+        (PACKAGING_MP4, "MP4 (faststart)"),
+        (PACKAGING_HLS, "HLS (fMP4 segments)"),
+        (PACKAGING_DASH, "DASH + HLS (CMAF segments)"),
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -33,16 +72,168 @@ class Job(models.Model):
     progress = models.PositiveIntegerField(default=0)  # 0..100
 
     preset = models.CharField(max_length=16, choices=PRESET_CHOICES, default=PRESET_720)
+    packaging = models.CharField(max_length=8, choices=PACKAGING_CHOICES, default=PACKAGING_MP4)
 
     input_key = models.CharField(max_length=512)
+    # Optional trim window in seconds (None = from the start / to the end)
+    clip_start = models.FloatField(null=True, blank=True)
+    clip_end = models.FloatField(null=True, blank=True)
+    # POSTed a signed completion/failure event (see app.webhooks)
+    callback_url = models.CharField(max_length=1024, blank=True, default="")
     input_size_bytes = models.BigIntegerField(default=0)
 
     output_key = models.CharField(max_length=512, blank=True, default="")
+    # kind (poster|sprite|preview) -> {"key": ..., "content_type": ..., ...}
+    side_outputs = models.JSONField(default=dict, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Last time a client asked about this job (job_status / batch_status); drives abandonment.
+    last_polled_at = models.DateTimeField(default=timezone.now)
 
     error = models.TextField(blank=True, default="")
+    # WorkerNode.name of the worker that claimed the job.
+    worker_name = models.CharField(max_length=128, blank=True, default="")
+    # Per-job worker measurements (e.g. hls_prefetch throughput).
+    stats = models.JSONField(default=dict, blank=True)
+    # Started by app.speculative right after upload; no client knows the id until create_job adopts it.
+    speculative = models.BooleanField(default=False, db_index=True)
+    # Who asked for it (app.rate_limit.client_id); per-client in-flight quotas count on this.
+    client = models.CharField(max_length=64, blank=True, default="", db_index=True)
+
+    class Meta:
+        abstract = True
 
     def __str__(self):
         return f"{self.id} {self.status} {self.preset}"
+
+    @property
+    def output_ext(self) -> str:
+        return self.PRESET_EXTENSIONS.get(self.preset, ".mp4")
+
+
+class Job(JobBase):
+    """Hot table: active jobs plus recently finished ones until app.job_archive moves them out."""
+
+    batch = models.ForeignKey(Batch, null=True, blank=True, on_delete=models.SET_NULL, related_name="jobs")
+
+
+class ArchivedJob(JobBase):
+    """Cold table: finished jobs, written in bulk by app.job_archive and never updated."""
+
+    batch = models.ForeignKey(Batch, null=True, blank=True, on_delete=models.SET_NULL, related_name="archived_jobs")
+
+    # Copied verbatim from the hot row, so no auto_now/auto_now_add here.
+    created_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+
+class Metric(models.Model):
+    """Process-wide counters shared through the DB (see app.metrics)."""
+
+    name = models.CharField(max_length=128, unique=True)
+    value = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+
+class ContentAnalysis(models.Model):
+    """Cached complexity measurements of one input (see app.encode_analysis)."""
+
+    # sha256 of the input (or of its URL), plus the clip window when the job is trimmed.
+    key = models.CharField(max_length=160, unique=True)
+    version = models.PositiveIntegerField(default=1)
+    measurements = models.JSONField(default=dict, blank=True)
+    analysis_seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class RateBucket(models.Model):
+    """Shared token bucket for one client and endpoint (see app.rate_limit, DB backend)."""
+
+    key = models.CharField(max_length=200, unique=True)
+    tokens = models.FloatField(default=0)
+    # Unix time of the last refill; plain float so the refill math needs no conversions.
+    updated_at = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.key}={self.tokens:.1f}"
+
+
+class RateSlot(models.Model):
+    """One in-flight request holding a per-client concurrency slot; expired rows are ignored."""
+
+    key = models.CharField(max_length=200, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class WorkerNode(models.Model):
+    """One running worker process and what its host can do (see app.worker_registry)."""
+
+    name = models.CharField(max_length=128, unique=True)  # hostname:pid or WORKER_NAME
+    hostname = models.CharField(max_length=128, blank=True, default="")
+
+    cores = models.PositiveIntegerField(default=1)
+    ram_bytes = models.BigIntegerField(default=0)
+    encoders = models.JSONField(default=list, blank=True)
+    has_browser = models.BooleanField(default=False)
+
+    free_disk_bytes = models.BigIntegerField(default=0)
+    load = models.FloatField(default=0)
+    current_job = models.UUIDField(null=True, blank=True)
+
+    jobs_done = models.PositiveIntegerField(default=0)
+    jobs_failed = models.PositiveIntegerField(default=0)
+    busy_seconds = models.FloatField(default=0)
+    output_bytes = models.BigIntegerField(default=0)
+
+    started_at = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+
+class WebhookDelivery(models.Model):
+    """Outbox row for one job event POSTed to the job's callback_url (see app.webhooks)."""
+
+    STATUS_PENDING = "pending"
+    STATUS_DELIVERED = "delivered"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_DELIVERED, "Delivered"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    # Plain UUID, not a FK: deliveries outlive (and must not cascade with) the job row.
+    job_id = models.UUIDField(db_index=True)
+    event = models.CharField(max_length=32)
+    url = models.CharField(max_length=1024)
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_status_code = models.IntegerField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["job_id", "event"], name="webhook_once_per_job_event")]
+        indexes = [models.Index(fields=["status", "next_attempt_at"], name="webhook_due_idx")]
+
+    def __str__(self):
+        return f"{self.event} {self.job_id} {self.status}"
@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import random
+import re
+import socket
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+logger = logging.getLogger("app.profiling")
+
+_NAME_RE = re.compile(r"^(\d+)-(web|worker)-(\d+)-([0-9a-f]{8})\.json$")
+_prune_lock = threading.Lock()
+
+
+def sample_rate() -> float:
+    # Fraction of web requests to profile (0 = only requests with a signed X-Profile header).
+    try:
+        return min(1.0, max(0.0, float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))))
+    except Exception:
+        return 0.0
+
+
+def interval_seconds() -> float:
+    try:
+        return max(0.001, float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000)
+    except Exception:
+        return 0.005
+
+
+def min_ms() -> float:
+    # Sampled requests faster than this aren't kept; explicitly requested ones always are.
+    try:
+        return float(os.environ.get("PROFILE_MIN_MS", "50"))
+    except Exception:
+        return 50.0
+
+
+def max_files() -> int:
+    try:
+        return max(1, int(os.environ.get("PROFILE_MAX_FILES", "200")))
+    except Exception:
+        return 200
+
+
+def profile_dir() -> str:
+    return os.environ.get("PROFILE_DIR") or os.path.join(str(settings.MEDIA_ROOT), "profiles")
+
+
+# --- sampler -------------------------------------------------------------------------------
+
+_PREFIXES = sorted(
+    {p for p in (sysconfig.get_paths().get("purelib"), sysconfig.get_paths().get("stdlib"), str(settings.BASE_DIR)) if p},
+    key=len,
+    reverse=True,
+)
+
+
+def _short(filename: str) -> str:
+    for p in _PREFIXES:
+        if filename.startswith(p):
+            return filename[len(p):].lstrip(os.sep)
+    return filename
+
+
+class Sampler:
+    """Samples one thread's Python stack every `interval` seconds from a helper thread.
+
+    Wall-clock sampling: time blocked in I/O or waiting on ffmpeg shows up too, which is
+    what a slow request or job needs. Stacks are kept as collapsed strings ("a;b;c") -> count.
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float | None = None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or interval_seconds()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.ended = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.ended = time.time()
+        return self.stacks
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.ended or time.time()) - self.started) * 1000
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({_short(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            del frame
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+
+# --- store ---------------------------------------------------------------------------------
+
+def save(kind: str, name: str, sampler: Sampler, **meta) -> str:
+    """Write a profile and prune the store to PROFILE_MAX_FILES. Returns the profile id."""
+    d = profile_dir()
+    os.makedirs(d, exist_ok=True)
+    duration = int(sampler.duration_ms)
+    pid = f"{int(sampler.started * 1000)}-{kind}-{duration}-{uuid.uuid4().hex[:8]}"
+    doc = {
+        "id": pid,
+        "kind": kind,
+        "name": name,
+        "started_at": sampler.started,
+        "duration_ms": duration,
+        "interval_ms": round(sampler.interval * 1000, 3),
+        "samples": sampler.samples,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "meta": meta,
+        "stacks": dict(sampler.stacks),
+    }
+    tmp = os.path.join(d, f".{pid}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, separators=(",", ":"))
+    os.replace(tmp, os.path.join(d, f"{pid}.json"))
+    prune()
+    return pid
+
+
+def prune():
+    d = profile_dir()
+    with _prune_lock:
+        try:
+            names = sorted(n for n in os.listdir(d) if _NAME_RE.match(n))
+        except OSError:
+            return
+        for n in names[: max(0, len(names) - max_files())]:
+            try:
+                os.remove(os.path.join(d, n))
+            except OSError:
+                pass
+
+
+def list_profiles(kind: str | None = None) -> list[dict]:
+    """Stored profiles (from file names alone), slowest first."""
+    try:
+        names = os.listdir(profile_dir())
+    except OSError:
+        return []
+    out = []
+    for n in names:
+        m = _NAME_RE.match(n)
+        if not m or (kind and m.group(2) != kind):
+            continue
+        out.append(
+            {"id": n[: -len(".json")], "started_at": int(m.group(1)) / 1000, "kind": m.group(2), "duration_ms": int(m.group(3))}
+        )
+    return sorted(out, key=lambda p: -p["duration_ms"])
+
+
+def load(profile_id: str) -> dict | None:
+    if not _NAME_RE.match(f"{profile_id}.json"):
+        return None
+    try:
+        with open(os.path.join(profile_dir(), f"{profile_id}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def to_collapsed(doc: dict) -> str:
+    """Brendan Gregg's folded format (flamegraph.pl, speedscope, inferno)."""
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(doc["stacks"].items()))
+
+
+def to_speedscope(doc: dict) -> dict:
+    """speedscope.app file format: one sampled profile, weights in milliseconds."""
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, n in doc["stacks"].items():
+        ids = []
+        for label in stack.split(";"):
+            if label not in index:
+                name, _, where = label.partition(" (")
+                file, _, line = where.rstrip(")").rpartition(":")
+                index[label] = len(frames)
+                frames.append({"name": name, "file": file, "line": int(line) if line.isdigit() else None})
+            ids.append(index[label])
+        samples.append(ids)
+        weights.append(n * doc["interval_ms"])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": f"{doc['kind']}: {doc['name']}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+        "name": doc["id"],
+        "exporter": "convert-god",
+    }
+
+
+def top_frames(doc: dict, limit: int = 10) -> list[tuple[str, float]]:
+    """Leaf frames by share of samples ("self" time)."""
+    leaves = Counter()
+    for stack, n in doc["stacks"].items():
+        leaves[stack.rpartition(";")[2]] += n
+    total = sum(leaves.values()) or 1
+    return [(name, round(n / total * 100, 1)) for name, n in leaves.most_common(limit)]
+
+
+@contextmanager
+def profile(kind: str, name: str, *, keep_ms: float = 0.0, **meta):
+    """Sample the current thread for the duration of the block; saved if it took >= keep_ms.
+
+    Yields a dict; set "discard" to drop the profile, or add keys to its metadata.
+    """
+    sampler = Sampler().start()
+    extra = {}
+    try:
+        yield extra
+    finally:
+        sampler.stop()
+        if not extra.pop("discard", False) and sampler.duration_ms >= keep_ms:
+            try:
+                extra["id"] = save(kind, name, sampler, **meta, **extra)
+            except Exception:
+                logger.exception("profile save failed kind=%s name=%s", kind, name)
+
+
+def should_sample() -> bool:
+    rate = sample_rate()
+    return rate > 0 and random.random() < rate
@@ -0,0 +1,255 @@
+import logging
+import os
+import re
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+logger = logging.getLogger("app.ranged_download")
+
+USER_AGENT = "ConvertGod/1.0"
+READ_BYTES = 1024 * 1024
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+def download_connections() -> int:
+    try:
+        return max(1, int(os.environ.get("URL_DOWNLOAD_CONNECTIONS", "4")))
+    except Exception:
+        return 4
+
+
+def min_split_bytes() -> int:
+    try:
+        return max(1, int(os.environ.get("URL_DOWNLOAD_MIN_SPLIT_BYTES", str(8 * 1024**2))))
+    except Exception:
+        return 8 * 1024**2
+
+
+def range_retries() -> int:
+    try:
+        return max(0, int(os.environ.get("URL_DOWNLOAD_RETRIES", "3")))
+    except Exception:
+        return 3
+
+
+class RangesUnsupported(Exception):
+    """The server ignored a Range request (or the resource changed under us)."""
+
+
+class TooLarge(Exception):
+    pass
+
+
+@dataclass
+class DownloadResult:
+    size: int
+    ranged: bool
+    connections: int = 1
+    parts: int = 1
+    retries: int = 0
+    seconds: float = 0.0
+    fallback: str = ""
+
+    def stats(self) -> dict:
+        secs = max(self.seconds, 1e-6)
+        return {
+            "bytes": self.size,
+            "ranged": self.ranged,
+            "connections": self.connections,
+            "parts": self.parts,
+            "retries": self.retries,
+            "seconds": round(self.seconds, 3),
+            "mbps": round(self.size * 8 / secs / 1e6, 2),
+            "fallback": self.fallback,
+        }
+
+
+def can_split(headers, size: int | None = None) -> bool:
+    """Worth (and safe) to fetch in parallel ranges, judged from a plain GET/HEAD response."""
+    if (headers.get("Accept-Ranges") or "").strip().lower() != "bytes":
+        return False
+    if (headers.get("Content-Encoding") or "identity").strip().lower() != "identity":
+        return False
+    try:
+        size = int(headers.get("Content-Length")) if size is None else size
+    except (TypeError, ValueError):
+        return False
+    return size >= min_split_bytes() * 2
+
+
+def split_ranges(size: int, connections: int) -> list[tuple[int, int]]:
+    """Inclusive (start, end) byte ranges; ~4 parts per connection so fast connections pick up slack."""
+    parts = max(1, min(connections * 4, size // min_split_bytes() or 1))
+    step = -(-size // parts)
+    return [(s, min(size, s + step) - 1) for s in range(0, size, step)]
+
+
+def _preallocate(fd: int, size: int):
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        # Not supported by the filesystem (or platform): a sparse file is fine for pwrite.
+        os.ftruncate(fd, size)
+
+
+class RangedDownloader:
+    """Fetch one URL as N parallel byte ranges written in place with os.pwrite.
+
+    Parts that fail are retried on their own, resuming from the last byte written.
+    `If-Range` pins every part to the validator of the first response, so a resource
+    that changes mid-download is detected instead of stitched together.
+    """
+
+    def __init__(self, url: str, dst: str, size: int, *, validator: str = "", connections: int | None = None,
+                 retries: int | None = None, timeout: float = 30):
+        self.url = url
+        self.dst = dst
+        self.size = size
+        self.validator = validator
+        self.connections = connections or download_connections()
+        self.retries = range_retries() if retries is None else retries
+        self.timeout = timeout
+        self.retried = 0
+        self.error: Exception | None = None
+        self._lock = threading.Lock()
+        self._abort = threading.Event()
+
+    def _fail(self, e: Exception):
+        with self._lock:
+            if self.error is None:
+                self.error = e
+        self._abort.set()
+
+    def _fetch_part(self, fd: int, start: int, end: int):
+        pos = [start]
+        attempt = 0
+        while True:
+            try:
+                self._fetch_from(fd, pos, end)
+                return
+            except RangesUnsupported as e:
+                self._fail(e)
+                raise
+            except Exception as e:
+                attempt += 1
+                if self._abort.is_set():
+                    raise
+                if attempt > self.retries:
+                    self._fail(e)
+                    raise
+                with self._lock:
+                    self.retried += 1
+                time.sleep(min(5.0, 0.5 * (2 ** (attempt - 1))))
+
+    def _fetch_from(self, fd: int, pos: list[int], end: int):
+        # pos[0] advances as bytes land, so a retry resumes where this attempt stopped.
+        headers = {"User-Agent": USER_AGENT, "Range": f"bytes={pos[0]}-{end}", "Accept-Encoding": "identity"}
+        if self.validator:
+            headers["If-Range"] = self.validator
+        req = urllib.request.Request(self.url, headers=headers)
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            if resp.status != 206:
+                raise RangesUnsupported(f"status {resp.status}")
+            m = _CONTENT_RANGE_RE.match(resp.headers.get("Content-Range") or "")
+            if not m or int(m.group(1)) != pos[0] or (m.group(3) != "*" and int(m.group(3)) != self.size):
+                raise RangesUnsupported(f"content-range {resp.headers.get('Content-Range')!r}")
+            while pos[0] <= end:
+                if self._abort.is_set():
+                    raise RuntimeError("aborted")
+                chunk = resp.read(min(READ_BYTES, end - pos[0] + 1))
+                if not chunk:
+                    raise IOError(f"short read at {pos[0]}")
+                os.pwrite(fd, chunk, pos[0])
+                pos[0] += len(chunk)
+
+    def run(self) -> DownloadResult:
+        ranges = split_ranges(self.size, self.connections)
+        workers = min(self.connections, len(ranges))
+        t0 = time.monotonic()
+        fd = os.open(self.dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            _preallocate(fd, self.size)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="range-fetch") as ex:
+                futures = [ex.submit(self._fetch_part, fd, s, e) for s, e in ranges]
+                for f in futures:
+                    # _abort stops the other parts early once one has given up.
+                    f.exception()
+        finally:
+            os.close(fd)
+        if self.error is not None:
+            raise self.error
+        return DownloadResult(
+            size=self.size,
+            ranged=True,
+            connections=workers,
+            parts=len(ranges),
+            retries=self.retried,
+            seconds=time.monotonic() - t0,
+        )
+
+
+def stream_to_file(resp, dst: str, cap: int) -> int:
+    """Single-connection copy of an open response; raises TooLarge past `cap`."""
+    try:
+        expected = int(resp.headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        expected = None
+    size = 0
+    with open(dst, "wb") as out:
+        while True:
+            chunk = resp.read(READ_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > cap:
+                raise TooLarge()
+            out.write(chunk)
+    # read(n) just returns short when the peer closes early; don't keep a truncated input.
+    if expected is not None and size != expected:
+        raise IOError(f"short body: {size} of {expected} bytes")
+    return size
+
+
+def download(resp, dst: str, cap: int, *, connections: int | None = None) -> DownloadResult:
+    """Save the body of an already-open GET response to `dst`.
+
+    When the server advertises byte ranges and the file is big enough, the response is
+    dropped after its headers and the body is fetched in parallel ranges from the final
+    (post-redirect) URL. Otherwise - or if the server turns out not to honour ranges - a
+    single stream is used. A part that still fails after its retries fails the download.
+    Raises TooLarge past `cap`; the caller removes `dst` on any error.
+    """
+    connections = connections or download_connections()
+    t0 = time.monotonic()
+    fallback = ""
+    try:
+        size = int(resp.headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        size = None
+    if size is not None and size > cap:
+        raise TooLarge()
+
+    if connections > 1 and can_split(resp.headers, size):
+        url = resp.geturl()
+        validator = resp.headers.get("ETag") or resp.headers.get("Last-Modified") or ""
+        if validator.startswith("W/"):
+            # Weak ETags can't be used with If-Range.
+            validator = resp.headers.get("Last-Modified") or ""
+        resp.close()
+        try:
+            return RangedDownloader(url, dst, size, validator=validator, connections=connections).run()
+        except RangesUnsupported as e:
+            # Advertised but not honoured (or the file changed): start over on one connection.
+            fallback = str(e)
+            logger.warning("ranged download refused url=%s err=%s; using a single stream", url, fallback)
+        req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        resp = urllib.request.urlopen(req, timeout=30)
+
+    with resp:
+        n = stream_to_file(resp, dst, cap)
+    return DownloadResult(size=n, ranged=False, seconds=time.monotonic() - t0, fallback=fallback)
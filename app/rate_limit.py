@@ -0,0 +1,350 @@
+import logging
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import Job, RateBucket, RateSlot
+
+
+logger = logging.getLogger("app.rate_limit")
+
+# URL name -> (env var, default "<count>/<s|m|h>"). The count is also the burst size.
+RULES = {
+    "upload_file": ("RATE_LIMIT_UPLOADS", "30/m"),
+    "input_from_url": ("RATE_LIMIT_FROM_URL", "10/m"),
+    "create_job": ("RATE_LIMIT_JOBS", "120/m"),
+    "create_batch": ("RATE_LIMIT_BATCHES", "20/m"),
+}
+
+# URL name -> (env var, default cap) for requests that hold a slot while they run.
+# input_from_url may launch Chromium (app.browser_sniffer), so few at once per client.
+CONCURRENCY = {
+    "input_from_url": ("RATE_LIMIT_SNIFFS_IN_FLIGHT", 2),
+}
+
+_UNITS = {
+    "s": 1, "sec": 1, "secs": 1, "second": 1, "seconds": 1,
+    "m": 60, "min": 60, "mins": 60, "minute": 60, "minutes": 60,
+    "h": 3600, "hr": 3600, "hour": 3600, "hours": 3600,
+}
+_UNIT_RE = re.compile(r"^(\d+(?:\.\d+)?)?\s*([a-z]+)$")
+_warned = set()
+
+
+def enabled() -> bool:
+    # Off by default: behind a proxy every client shares REMOTE_ADDR until RATE_LIMIT_CLIENT_HEADER is set.
+    return os.environ.get("RATE_LIMIT", "0") == "1"
+
+
+def backend() -> str:
+    # db (default) | redis (REDIS_URL, shared with JOB_QUEUE_BACKEND=redis)
+    return (os.environ.get("RATE_LIMIT_BACKEND") or "db").strip().lower()
+
+
+def lease_seconds() -> float:
+    # How long a process may spend tokens it took from the shared bucket without asking again.
+    try:
+        return max(0.05, float(os.environ.get("RATE_LIMIT_LEASE_SECONDS", "1")))
+    except Exception:
+        return 1.0
+
+
+def slot_ttl_seconds() -> float:
+    # A slot left behind by a crashed process frees itself after this long.
+    try:
+        return max(1.0, float(os.environ.get("RATE_LIMIT_SLOT_TTL_SECONDS", "300")))
+    except Exception:
+        return 300.0
+
+
+def trusted_hops() -> int:
+    # Proxies in front of the app that append to RATE_LIMIT_CLIENT_HEADER (Render: 1).
+    try:
+        return max(1, int(os.environ.get("RATE_LIMIT_TRUSTED_HOPS", "1")))
+    except Exception:
+        return 1
+
+
+def jobs_in_flight() -> int:
+    # Queued + processing jobs per client; 0 = no cap.
+    try:
+        return max(0, int(os.environ.get("RATE_LIMIT_JOBS_IN_FLIGHT", "50")))
+    except Exception:
+        return 50
+
+
+def parse_rate(value: str) -> tuple[int, float] | None:
+    """"30/m", "30/min", "100/5m" -> (count, seconds); None for "0", "off" or garbage (= unlimited)."""
+    count, _, unit = str(value or "").strip().partition("/")
+    if count.strip().lower() in ("", "off"):
+        return None
+    try:
+        n = int(count)
+    except ValueError:
+        n = None
+    if n is not None and n <= 0:
+        return None
+    m = _UNIT_RE.match(unit.strip().lower() or "m")
+    period = _UNITS.get(m.group(2), 0) * float(m.group(1) or 1) if m else 0
+    if n is None or period <= 0:
+        if value not in _warned:
+            _warned.add(value)
+            logger.warning("ignoring unparseable rate limit %r (= unlimited)", value)
+        return None
+    return n, period
+
+
+def rule_for(name: str) -> tuple[int, float] | None:
+    env, default = RULES[name]
+    return parse_rate(os.environ.get(env, default))
+
+
+def concurrency_for(name: str) -> int:
+    env, default = CONCURRENCY[name]
+    try:
+        return max(0, int(os.environ.get(env, str(default))))
+    except Exception:
+        return default
+
+
+def client_id(request) -> str:
+    """Remote address, or the entry RATE_LIMIT_TRUSTED_HOPS from the right of RATE_LIMIT_CLIENT_HEADER.
+
+    Entries left of that were sent by the client itself and can be anything.
+    """
+    cached = getattr(request, "rate_client", None)
+    if cached:
+        return cached
+    header = (os.environ.get("RATE_LIMIT_CLIENT_HEADER") or "").strip()
+    value = ""
+    if header:
+        raw = request.META.get("HTTP_" + header.upper().replace("-", "_")) or ""
+        parts = [p.strip() for p in raw.split(",") if p.strip()]
+        if parts:
+            value = parts[-min(trusted_hops(), len(parts))]
+    request.rate_client = (value or request.META.get("REMOTE_ADDR") or "unknown")[:64]
+    return request.rate_client
+
+
+def too_many(retry_after: float, error: str, **extra) -> JsonResponse:
+    secs = max(1, math.ceil(retry_after))
+    resp = JsonResponse(
+        {"ok": False, "error": error, "error_code": "rate_limited", "retry_after": secs, **extra}, status=429
+    )
+    resp["Retry-After"] = str(secs)
+    return resp
+
+
+def job_quota_response(client: str, adding: int = 1) -> JsonResponse | None:
+    """429 if `adding` more jobs would take `client` past RATE_LIMIT_JOBS_IN_FLIGHT."""
+    cap = jobs_in_flight()
+    if not cap or not client:
+        return None
+    active = Job.objects.filter(client=client, status__in=Job.ACTIVE_STATUSES, speculative=False).count()
+    if active + adding <= cap:
+        return None
+    # No clock to wait for: a slot frees when a job finishes, so suggest a poll interval.
+    return too_many(30, f"Too many jobs in flight (max {cap})", in_flight=active, limit=cap)
+
+
+# --- shared state ------------------------------------------------------------------------
+
+class DbStore:
+    """Buckets and slots in the app DB, for a few processes.
+
+    No row locks: select_for_update is a no-op on SQLite, so every write is a single
+    conditional statement that is atomic on SQLite and Postgres alike.
+    """
+
+    name = "db"
+
+    def take(self, key: str, want: int, refund: float, rate: float, burst: int) -> tuple[int, float]:
+        """Refill, return unused tokens, then take up to `want`. Returns (granted, seconds to next token)."""
+        for _ in range(5):
+            row = RateBucket.objects.filter(key=key).values_list("tokens", "updated_at").first()
+            now = time.time()
+            if row is None:
+                tokens = float(burst)
+            else:
+                tokens = min(burst, row[0] + refund + max(0.0, now - row[1]) * rate)
+            granted = min(want, int(tokens))
+            tokens -= granted
+            if row is None:
+                try:
+                    RateBucket.objects.create(key=key, tokens=tokens, updated_at=now)
+                except IntegrityError:
+                    continue  # another process created the bucket first
+            # Compare-and-set on what was read: a concurrent take makes this match nothing, so retry.
+            elif not RateBucket.objects.filter(key=key, tokens=row[0], updated_at=row[1]).update(
+                tokens=tokens, updated_at=now
+            ):
+                continue
+            return granted, 0.0 if granted else (1 - tokens) / rate
+        return 0, 1.0
+
+    def acquire(self, key: str, cap: int, ttl: float) -> str | None:
+        # Insert first, then keep the slot only if it is among the `cap` oldest live ones, so
+        # two processes racing for the last slot can't both see room and both take it.
+        now = timezone.now()
+        RateSlot.objects.filter(key=key, expires_at__lt=now).delete()
+        slot = RateSlot.objects.create(key=key, expires_at=now + timedelta(seconds=ttl))
+        first = RateSlot.objects.filter(key=key, expires_at__gte=now).order_by("pk").values_list("pk", flat=True)[:cap]
+        if slot.pk in set(first):
+            return str(slot.pk)
+        slot.delete()
+        return None
+
+    def release(self, key: str, token: str):
+        RateSlot.objects.filter(pk=token, key=key).delete()
+
+
+_TAKE_LUA = """
+local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+local want, refund, rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local tokens = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+tokens = math.min(burst, tokens + refund + math.max(0, now - ts) * rate)
+local granted = math.min(want, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+return {granted, tostring(tokens)}
+"""
+
+_ACQUIRE_LUA = """
+local now, cap, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= cap then return 0 end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[4])
+redis.call('EXPIRE', KEYS[1], math.ceil(ttl) + 60)
+return 1
+"""
+
+
+class RedisStore:
+    """Buckets as hashes and slots as sorted sets (member -> expiry), updated by Lua scripts."""
+
+    name = "redis"
+
+    def __init__(self, client=None, *, url: str | None = None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the 'redis' package") from e
+            from .job_queue import redis_url
+
+            client = redis.Redis.from_url(url or redis_url())
+        self.r = client
+        self._take = self.r.register_script(_TAKE_LUA)
+        self._acquire = self.r.register_script(_ACQUIRE_LUA)
+
+    def take(self, key: str, want: int, refund: float, rate: float, burst: int) -> tuple[int, float]:
+        granted, tokens = self._take(keys=[f"rl:{key}"], args=[want, refund, rate, burst, time.time()])
+        granted, tokens = int(granted), float(tokens)
+        return granted, 0.0 if granted else (1 - tokens) / rate
+
+    def acquire(self, key: str, cap: int, ttl: float) -> str | None:
+        token = uuid.uuid4().hex
+        ok = self._acquire(keys=[f"rl:slots:{key}"], args=[time.time(), cap, ttl, token])
+        return token if int(ok) else None
+
+    def release(self, key: str, token: str):
+        self.r.zrem(f"rl:slots:{key}", token)
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires", "blocked_until")
+
+    def __init__(self, tokens: int = 0, expires: float = 0.0, blocked_until: float = 0.0):
+        self.tokens = tokens
+        self.expires = expires
+        self.blocked_until = blocked_until
+
+
+class Limiter:
+    """Token buckets shared through a store, with a per-process lease cache in front.
+
+    A process takes a few tokens at a time and spends them locally until they run out or the
+    lease expires; leftovers go back to the bucket with the next take. A refusal is remembered
+    until the bucket's next token is due, so a client hammering a full bucket costs no I/O.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _store(self):
+        if self.store is None:
+            self.store = RedisStore() if backend() == "redis" else DbStore()
+        return self.store
+
+    def allow(self, key: str, count: int, period: float) -> float:
+        """0 if the request may proceed, else seconds until it could."""
+        rate = count / period
+        now = time.monotonic()
+        with self._lock:
+            lease = self._local.get(key)
+            if lease and lease.blocked_until > now:
+                return lease.blocked_until - now
+            if lease and lease.tokens >= 1 and lease.expires > now:
+                lease.tokens -= 1
+                return 0.0
+            refund = lease.tokens if lease else 0
+            if lease:
+                lease.tokens = 0
+            if len(self._local) > 10000:
+                self._prune(now)
+
+        # Bigger buckets lease more at once; small ones (a few per minute) go to the store each time.
+        want = max(1, min(10, count // 10))
+        try:
+            granted, retry = self._store().take(key, want, refund, rate, count)
+        except Exception:
+            # Fail open: a limiter outage must not take the API down with it.
+            logger.exception("rate limit store failed key=%s", key)
+            return 0.0
+        with self._lock:
+            if granted:
+                self._local[key] = _Lease(granted - 1, now + lease_seconds())
+                return 0.0
+            self._local[key] = _Lease(blocked_until=now + retry)
+            return retry
+
+    def _prune(self, now: float):
+        for k in [k for k, v in self._local.items() if v.expires <= now and v.blocked_until <= now]:
+            del self._local[k]
+
+    def acquire(self, key: str, cap: int) -> str | None:
+        try:
+            return self._store().acquire(key, cap, slot_ttl_seconds())
+        except Exception:
+            logger.exception("rate limit slot acquire failed key=%s", key)
+            return ""  # fail open; "" = nothing to release
+
+    def release(self, key: str, token: str):
+        if not token:
+            return
+        try:
+            self._store().release(key, token)
+        except Exception:
+            logger.exception("rate limit slot release failed key=%s", key)
+
+
+_limiter = None
+
+
+def get_limiter() -> Limiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = Limiter()
+    return _limiter
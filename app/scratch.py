@@ -0,0 +1,296 @@
+import errno
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from .disk_storage import output_path
+
+
+logger = logging.getLogger("app.scratch")
+
+_RESERVATIONS = ".reservations"
+
+
+def scratch_dir() -> str:
+    # Local SSD or tmpfs for in-progress encodes; empty = write straight to MEDIA_ROOT.
+    return (os.environ.get("SCRATCH_DIR") or "").strip()
+
+
+def scratch_max_bytes() -> int:
+    # Budget for all jobs on this host together; 0 = limited only by free space.
+    try:
+        return max(0, int(os.environ.get("SCRATCH_MAX_BYTES", "0")))
+    except Exception:
+        return 0
+
+
+def scratch_min_free_bytes() -> int:
+    try:
+        return max(0, int(os.environ.get("SCRATCH_MIN_FREE_BYTES", str(512 * 1024**2))))
+    except Exception:
+        return 512 * 1024**2
+
+
+def default_estimate_bytes() -> int:
+    # Reservation when the input size is unknown (URL inputs).
+    try:
+        return max(1, int(os.environ.get("SCRATCH_DEFAULT_ESTIMATE_BYTES", str(2 * 1024**3))))
+    except Exception:
+        return 2 * 1024**3
+
+
+def stage_inputs() -> bool:
+    return os.environ.get("SCRATCH_STAGE_INPUTS", "0") == "1"
+
+
+def estimate_bytes(input_size: int) -> int:
+    """What to reserve for one encode: about the input's size (outputs rarely exceed it) plus previews."""
+    if input_size <= 0:
+        return default_estimate_bytes()
+    return int(input_size * 1.1) + 64 * 1024**2
+
+
+@contextmanager
+def _ledger(root: str):
+    d = os.path.join(root, _RESERVATIONS)
+    os.makedirs(d, exist_ok=True)
+    # One lock per host: worker processes sharing the scratch disk see each other's reservations.
+    with open(os.path.join(d, ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield d
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _start_token(pid: int) -> str:
+    """Boot id + process start time: unlike the pid alone, never reused by a later process."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot = f.read().strip()
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesised command name; start time is field 22 overall.
+            starttime = f.read().rpartition(")")[2].split()[19]
+    except (OSError, IndexError):
+        return ""
+    return f"{boot}:{starttime}"
+
+
+def _alive(pid: int, token: str = "") -> bool:
+    if pid <= 0:
+        return False
+    if token:
+        # A container restart hands out the same low pids again; the start time tells them apart.
+        return _start_token(pid) == token
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _reservations(d: str) -> dict:
+    out = {}
+    for name in os.listdir(d):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(d, name)) as f:
+                out[name[: -len(".json")]] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def usage() -> dict:
+    """Reserved and used bytes on this host's scratch disk (for logs/admin)."""
+    root = scratch_dir()
+    if not root:
+        return {"enabled": False}
+    os.makedirs(root, exist_ok=True)
+    with _ledger(root) as d:
+        res = _reservations(d)
+    st = os.statvfs(root)
+    return {
+        "enabled": True,
+        "dir": root,
+        "jobs": len(res),
+        "reserved_bytes": sum(int(r.get("bytes") or 0) for r in res.values()),
+        "used_bytes": sum(_dir_bytes(os.path.join(root, job_id)) for job_id in res),
+        "free_bytes": st.f_bavail * st.f_frsize,
+        "max_bytes": scratch_max_bytes(),
+    }
+
+
+def sweep() -> int:
+    """Drop workspaces and reservations of worker processes that died mid-encode."""
+    root = scratch_dir()
+    if not root or not os.path.isdir(root):
+        return 0
+    n = 0
+    with _ledger(root) as d:
+        res = _reservations(d)
+        for job_id, r in res.items():
+            if not _alive(int(r.get("pid") or 0), r.get("start") or ""):
+                shutil.rmtree(os.path.join(root, job_id), ignore_errors=True)
+                _remove(os.path.join(d, f"{job_id}.json"))
+                n += 1
+        for name in os.listdir(root):
+            # Only our own job directories: SCRATCH_DIR may be shared (e.g. /tmp).
+            if name not in res and _is_uuid(name) and os.path.isdir(os.path.join(root, name)):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    if n:
+        logger.info("swept %s stale scratch workspaces", n)
+    return n
+
+
+def _is_uuid(name: str) -> bool:
+    try:
+        return str(uuid.UUID(name)) == name
+    except ValueError:
+        return False
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class Workspace:
+    """One job's directory on the scratch tier, mirroring MEDIA_ROOT keys.
+
+    ffmpeg writes (and faststart rewrites) under path(key); promote(key) then moves each
+    finished file to persistent storage: a rename when both are on one filesystem, otherwise
+    a copy to a temp name next to the destination and a rename, so readers never see a
+    partial file.
+    """
+
+    def __init__(self, root: str, job_id, reserved: int, stage: bool = False):
+        self.root = root
+        self.job_id = str(job_id)
+        self.dir = os.path.join(root, self.job_id)
+        self.reserved = reserved
+        self.stage = stage
+        self.staged_bytes = 0
+        self.promoted_bytes = 0
+        self.promote_seconds = 0.0
+        Path(self.dir).mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def acquire(cls, job_id, input_size: int, *, stage: bool = False) -> "Workspace | None":
+        """Reserve room for an encode (and a staged copy of the input); None when scratch is off or full."""
+        root = scratch_dir()
+        if not root:
+            return None
+        stage = stage and input_size > 0
+        want = estimate_bytes(input_size) + (input_size if stage else 0)
+        try:
+            os.makedirs(root, exist_ok=True)
+            with _ledger(root) as d:
+                reserved = sum(int(r.get("bytes") or 0) for r in _reservations(d).values())
+                st = os.statvfs(root)
+                free = st.f_bavail * st.f_frsize
+                budget = scratch_max_bytes()
+                if (budget and reserved + want > budget) or free - want < scratch_min_free_bytes():
+                    logger.info("scratch full job=%s want=%s reserved=%s free=%s", job_id, want, reserved, free)
+                    return None
+                with open(os.path.join(d, f"{job_id}.json"), "w") as f:
+                    json.dump(
+                        {"pid": os.getpid(), "start": _start_token(os.getpid()), "bytes": want, "at": time.time()}, f
+                    )
+        except OSError:
+            logger.exception("scratch reservation failed job=%s dir=%s", job_id, root)
+            return None
+        return cls(root, job_id, want, stage)
+
+    def path(self, key: str) -> str:
+        p = os.path.join(self.dir, key)
+        Path(os.path.dirname(p)).mkdir(parents=True, exist_ok=True)
+        return p
+
+    def used_bytes(self) -> int:
+        return _dir_bytes(self.dir)
+
+    def stage_input(self, src: str) -> str:
+        """Copy the input onto scratch if room for it was reserved; else read it in place."""
+        if not self.stage:
+            return src
+        try:
+            size = os.path.getsize(src)
+        except OSError:
+            return src
+        dst = self.path(os.path.join("staged", os.path.basename(src)))
+        try:
+            shutil.copyfile(src, dst)
+        except OSError as e:
+            logger.warning("input staging failed job=%s err=%s", self.job_id, e)
+            _remove(dst)
+            return src
+        self.staged_bytes = size
+        return dst
+
+    def promote(self, key: str) -> bool:
+        """Move a finished file to MEDIA_ROOT/key. False if the encode didn't produce it."""
+        src = os.path.join(self.dir, key)
+        if not os.path.isfile(src):
+            return False
+        dst = output_path(key)
+        Path(os.path.dirname(dst)).mkdir(parents=True, exist_ok=True)
+        t0 = time.monotonic()
+        size = os.path.getsize(src)
+        try:
+            os.replace(src, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            tmp = f"{dst}.part-{uuid.uuid4().hex[:8]}"
+            try:
+                shutil.copyfile(src, tmp)
+                with open(tmp, "rb") as f:
+                    os.fsync(f.fileno())
+                os.replace(tmp, dst)
+            except BaseException:
+                _remove(tmp)
+                raise
+            _remove(src)
+        self.promoted_bytes += size
+        self.promote_seconds += time.monotonic() - t0
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "dir": self.root,
+            "reserved_bytes": self.reserved,
+            "staged_input_bytes": self.staged_bytes,
+            "promoted_bytes": self.promoted_bytes,
+            "promote_seconds": round(self.promote_seconds, 3),
+        }
+
+    def release(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        try:
+            with _ledger(self.root) as d:
+                _remove(os.path.join(d, f"{self.job_id}.json"))
+        except OSError:
+            logger.exception("scratch release failed job=%s", self.job_id)
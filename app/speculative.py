@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import metrics, worker_registry
+from .disk_storage import input_path
+from .job_queue import enqueue_on_commit
+from .media_probe import probe_input
+from .models import Job
+
+
+logger = logging.getLogger("app.speculative")
+
+# What a speculative run produces; create_job adopts it only for exactly this.
+DEFAULT_FIELDS = {"preset": Job.PRESET_720, "packaging": Job.PACKAGING_MP4, "clip_start": None, "clip_end": None}
+_LIVE = (Job.STATUS_QUEUED, Job.STATUS_PROCESSING, Job.STATUS_DONE)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return os.environ.get("SPECULATIVE_ENCODE", "0") == "1"
+
+
+def ttl_minutes() -> float:
+    try:
+        return float(os.environ.get("SPECULATIVE_TTL_MINUTES", "15"))
+    except Exception:
+        return 15.0
+
+
+def speculative_nice() -> int:
+    try:
+        return int(os.environ.get("SPECULATIVE_NICE", "10"))
+    except Exception:
+        return 10
+
+
+def capacity_idle() -> bool:
+    """Nothing queued, and at least one live worker without a job."""
+    if Job.objects.filter(status=Job.STATUS_QUEUED).exists():
+        return False
+    return worker_registry.live_nodes().count() > Job.objects.filter(status=Job.STATUS_PROCESSING).count()
+
+
+def _probe_sidecar(path: str) -> str:
+    return path + ".probe.json"
+
+
+def probe(path: str) -> dict:
+    """ffprobe a fresh upload and keep the result next to it for the worker (see probed())."""
+    info = probe_input(path)
+    if info:
+        try:
+            with open(_probe_sidecar(path), "w") as f:
+                json.dump(info, f)
+        except OSError:
+            logger.warning("could not write probe result path=%s", path)
+    return info
+
+
+def probed(path: str) -> dict | None:
+    """The probe() result for an input, if it was probed while workers were busy."""
+    try:
+        with open(_probe_sidecar(path)) as f:
+            return json.load(f) or None
+    except (OSError, ValueError):
+        return None
+
+
+def start(input_key: str, input_size: int = 0):
+    """Hand a fresh upload to the background; the upload response doesn't wait for any of it."""
+    if not enabled():
+        return None
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # One thread: uploads only need a couple of queries each, and at most one ffprobe at a time.
+            _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="speculative")
+    return _pool.submit(_start, input_key, input_size)
+
+
+def _start(input_key: str, input_size: int) -> Job | None:
+    try:
+        return begin(input_key, input_size)
+    except Exception:
+        logger.exception("speculative start failed input=%s", input_key)
+        return None
+    finally:
+        connection.close()  # this thread's own connection; nothing else closes it
+
+
+def begin(input_key: str, input_size: int = 0) -> Job | None:
+    """Queue a low-priority encode of the default preset if workers are idle.
+
+    Its worker probes the input as for any job. When workers are busy, probe here instead so the
+    real job's worker can skip it (see probed()).
+    """
+    if Job.objects.filter(input_key=input_key).exists():
+        return None  # create_job got there first
+    if not capacity_idle():
+        metrics.incr("speculative_skipped_busy")
+        probe(input_path(input_key))
+        metrics.incr("speculative_probed")
+        return None
+    with transaction.atomic():
+        j = Job.objects.create(
+            status=Job.STATUS_QUEUED, progress=0, speculative=True, input_key=input_key,
+            input_size_bytes=max(0, int(input_size or 0)), **DEFAULT_FIELDS,
+        )
+        enqueue_on_commit([j])
+    metrics.incr("speculative_started")
+    return j
+
+
+def matches(fields: dict) -> bool:
+    return all(fields.get(k) == v for k, v in DEFAULT_FIELDS.items())
+
+
+def adopt(fields: dict) -> Job | None:
+    """Hand the speculative job for this input to a real create_job request, whatever its stage.
+
+    The conditional update makes adoption race-free against preemption and TTL cancels, which
+    only touch rows still marked speculative.
+    """
+    spec = Job.objects.filter(input_key=fields["input_key"], speculative=True, status__in=_LIVE).first()
+    if spec is None:
+        return None
+    now = timezone.now()
+    n = Job.objects.filter(id=spec.id, speculative=True, status__in=_LIVE).update(
+        speculative=False,
+        callback_url=fields.get("callback_url") or "",
+        client=fields.get("client") or "",
+        input_size_bytes=fields.get("input_size_bytes") or spec.input_size_bytes,
+        last_polled_at=now,
+        updated_at=now,
+    )
+    if not n:
+        return None
+    spec.refresh_from_db()
+    if spec.status == Job.STATUS_QUEUED:
+        # Out of the low-priority lane: publish again (a duplicate delivery is acked away).
+        enqueue_on_commit([spec])
+    metrics.incr("speculative_adopted")
+    metrics.incr(f"speculative_adopted_{spec.status}")
+    return spec
+
+
+def cancel(qs, reason: str) -> int:
+    """Cancel still-speculative jobs in `qs`; a running encode stops at its next cancel check."""
+    n = qs.filter(speculative=True, status__in=(Job.STATUS_QUEUED, Job.STATUS_PROCESSING)).update(
+        status=Job.STATUS_CANCELED, error=reason, updated_at=timezone.now()
+    )
+    if n:
+        metrics.incr("speculative_canceled", n)
+        metrics.incr(f"speculative_canceled_{reason}", n)
+    return n
+
+
+def cancel_for_input(input_key: str) -> int:
+    """The client asked for something else for this input: drop the guess."""
+    return cancel(Job.objects.filter(input_key=input_key), "unused")
@@ -1,9 +1,11 @@
 import os
-import boto3
 from django.conf import settings
 
 
 def s3_client():
+    # boto3 takes a noticeable share of startup; only the S3 paths pay for it.
+    import boto3
+
     return boto3.client(
         "s3",
         endpoint_url=os.environ.get("S3_ENDPOINT_URL"),
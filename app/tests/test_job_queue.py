@@ -0,0 +1,122 @@
+import os
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.test import TestCase
+from django.utils import timezone
+
+from app.job_queue import RedisStreamsQueue
+from app.models import Job, WorkerNode
+
+try:
+    import fakeredis
+except ImportError:  # pip install fakeredis
+    fakeredis = None
+
+
+@skipUnless(fakeredis, "fakeredis not installed")
+class RedisStreamsQueueTests(TestCase):
+    def setUp(self):
+        self.r = fakeredis.FakeRedis()
+        self.q = RedisStreamsQueue(self.r, prefix="test")
+        self.node = WorkerNode.objects.create(name="live:1", cores=4)
+
+    def job(self, **kw):
+        return Job.objects.create(status=Job.STATUS_QUEUED, input_key="inputs/x.mp4", **kw)
+
+    def claim(self, node=None):
+        return self.q.claim(node or self.node, [Job.PRESET_720, Job.PRESET_1080], 0.01)
+
+    def pending(self, preset=Job.PRESET_720, heavy=False) -> int:
+        return self.r.xpending(self.q.stream_key(preset, heavy), self.q.group)["pending"]
+
+    def test_enqueue_claim_ack(self):
+        j = self.job(preset=Job.PRESET_720)
+        self.q.enqueue([j])
+        got = self.claim()
+        self.assertEqual(got.id, j.id)
+        self.assertEqual(got.status, Job.STATUS_PROCESSING)
+        self.assertEqual(got.worker_name, self.node.name)
+        self.assertEqual(self.pending(), 1)
+
+        self.q.ack(got)
+        self.assertEqual(self.pending(), 0)
+        self.assertEqual(self.r.xlen(self.q.stream_key(Job.PRESET_720, False)), 0)
+        self.assertFalse(self.r.exists(f"test:enqueued:{j.id}"))
+        self.assertIsNone(self.claim())
+
+    def test_claim_takes_one_entry_in_priority_order(self):
+        light = self.job(preset=Job.PRESET_720)
+        heavy = self.job(preset=Job.PRESET_1080)
+        self.q.enqueue([light, heavy])
+        # Nothing bigger alive, so this node reads heavy streams first.
+        self.assertEqual(self.claim().id, heavy.id)
+        # The other entry stays undelivered for whoever claims next, not pending on this consumer.
+        self.assertEqual(self.pending(), 0)
+        self.assertEqual(self.claim().id, light.id)
+
+    def test_entries_arriving_while_blocked_are_not_held(self):
+        light = self.job(preset=Job.PRESET_720)
+        heavy = self.job(preset=Job.PRESET_1080)
+        for name in ("xread", "xreadgroup"):
+            real = getattr(self.r, name)
+
+            def arrive_then_read(*args, _real=real, **kw):
+                # Both entries land while the worker waits on an empty queue.
+                if kw.get("block") and not self.r.exists(f"test:enqueued:{light.id}"):
+                    self.q.enqueue([light, heavy])
+                return _real(*args, **kw)
+
+            setattr(self.r, name, arrive_then_read)
+
+        self.assertEqual(self.claim().id, heavy.id)
+        self.assertEqual(self.pending(), 0)
+        self.assertEqual(self.claim().id, light.id)
+
+    def test_duplicate_and_canceled_entries_are_acked_away(self):
+        j = self.job(preset=Job.PRESET_720)
+        self.q.enqueue([j])
+        self.q.enqueue([j])
+        self.assertEqual(self.claim().id, j.id)
+        self.assertIsNone(self.claim())
+        self.assertEqual(self.r.xlen(self.q.stream_key(Job.PRESET_720, False)), 1)  # only the claimed one
+
+        c = self.job(preset=Job.PRESET_720)
+        self.q.enqueue([c])
+        Job.objects.filter(id=c.id).update(status=Job.STATUS_CANCELED)
+        self.assertIsNone(self.claim())
+        self.assertEqual(Job.objects.get(id=c.id).status, Job.STATUS_CANCELED)
+        self.assertFalse(self.r.exists(f"test:enqueued:{c.id}"))
+
+    def test_reclaim_requeues_dead_consumers_entry(self):
+        dead = WorkerNode.objects.create(name="dead:1", cores=4)
+        j = self.job(preset=Job.PRESET_720)
+        self.q.enqueue([j])
+        self.assertEqual(self.claim(dead).id, j.id)
+        WorkerNode.objects.filter(pk=dead.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+        with mock.patch.dict(os.environ, {"JOB_QUEUE_RECLAIM_SECONDS": "0"}):
+            self.assertEqual(self.q.reclaim(self.node), 1)
+        self.assertEqual(Job.objects.get(id=j.id).status, Job.STATUS_QUEUED)
+        got = self.claim()
+        self.assertEqual(got.id, j.id)
+        self.assertEqual(got.worker_name, self.node.name)
+
+    def test_reclaim_leaves_live_workers_entries(self):
+        other = WorkerNode.objects.create(name="other:1", cores=4)
+        j = self.job(preset=Job.PRESET_720)
+        self.q.enqueue([j])
+        self.claim(other)
+        with mock.patch.dict(os.environ, {"JOB_QUEUE_RECLAIM_SECONDS": "0"}):
+            self.assertEqual(self.q.reclaim(self.node), 0)
+        self.assertEqual(Job.objects.get(id=j.id).status, Job.STATUS_PROCESSING)
+        self.assertEqual(self.pending(), 1)
+
+    def test_resync_readds_queued_job_without_marker(self):
+        j = self.job(preset=Job.PRESET_720)
+        Job.objects.filter(id=j.id).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.claim()  # creates the consumer groups
+        self.assertEqual(self.q.resync(), 1)
+        self.assertTrue(self.r.exists(f"test:enqueued:{j.id}"))
+        self.assertEqual(self.q.resync(), 0)
+        self.assertEqual(self.claim().id, j.id)
@@ -0,0 +1,299 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.conf import settings
+
+
+logger = logging.getLogger("app.tracing")
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_lock = threading.Lock()
+_exporters = {}
+
+
+def trace_exporter() -> str:
+    # off (default) | jsonl | otlp
+    return (os.environ.get("TRACE_EXPORTER") or "off").strip().lower()
+
+
+def trace_path() -> str:
+    return os.environ.get("TRACE_JSONL_PATH") or os.path.join(str(settings.MEDIA_ROOT), "traces", "spans.jsonl")
+
+
+def trace_max_bytes() -> int:
+    try:
+        return int(os.environ.get("TRACE_MAX_BYTES", str(100 * 1024**2)))
+    except Exception:
+        return 100 * 1024**2
+
+
+def otlp_endpoint() -> str:
+    return os.environ.get("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+
+
+def trace_id_for(key_or_id) -> str:
+    """32-hex trace id: a job's UUID, or the UUID inside an input key (inputs/<hex><ext>)."""
+    s = str(key_or_id or "")
+    s = os.path.splitext(os.path.basename(s))[0].replace("-", "")
+    return s if len(s) == 32 else secrets.token_hex(16)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = "", attrs: dict | None = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attrs = dict(attrs or {})
+        self.status = "ok"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attrs": self.attrs,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+        }
+
+
+@contextmanager
+def span(name: str, *, trace_id: str | None = None, **attrs):
+    """Time a block as a span. Nested spans inherit the trace and parent from the enclosing one."""
+    parent = _current.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+    sp = Span(name, trace_id, parent.span_id if parent and parent.trace_id == trace_id else "", attrs)
+    token = _current.set(sp)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.status = "error"
+        sp.attrs.setdefault("error", f"{type(e).__name__}: {e}"[:300])
+        raise
+    finally:
+        _current.reset(token)
+        sp.end_ns = time.time_ns()
+        export(sp)
+
+
+def record(name: str, *, trace_id: str, start: datetime | float, end: datetime | float | None = None, **attrs):
+    """Emit a span for an interval that wasn't timed in-process (e.g. time spent queued)."""
+    parent = _current.get()
+    sp = Span(name, trace_id, parent.span_id if parent and parent.trace_id == trace_id else "", attrs)
+    sp.start_ns = _to_ns(start)
+    sp.end_ns = _to_ns(end) if end is not None else time.time_ns()
+    export(sp)
+    return sp
+
+
+def _to_ns(t) -> int:
+    if isinstance(t, datetime):
+        return int(t.timestamp() * 1e9)
+    return int(float(t) * 1e9)
+
+
+# --- exporters ---------------------------------------------------------------------------
+
+def export(sp: Span):
+    kind = trace_exporter()
+    try:
+        if kind in ("jsonl", "otlp"):
+            # Never on the caller's thread: a span costs a queue put, not a file write or a POST.
+            _exporter(kind).submit(sp)
+    except Exception:
+        # Tracing must never break the request or the encode.
+        logger.exception("span export failed name=%s", sp.name)
+
+
+def write_jsonl(spans: list[dict], path: str | None = None):
+    path = path or trace_path()
+    data = "".join(json.dumps(s, separators=(",", ":")) + "\n" for s in spans).encode("utf-8")
+    with _lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            if os.path.getsize(path) > trace_max_bytes():
+                os.replace(path, path + ".1")
+        except OSError:
+            pass
+        # O_APPEND + a single write keeps lines from web and worker processes whole.
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+def read_jsonl(path: str | None = None):
+    path = path or trace_path()
+    for p in (path + ".1", path):
+        try:
+            with open(p, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+
+
+def _attr_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def _attr_from(value: dict):
+    if "intValue" in value:
+        return int(value["intValue"])
+    return next(iter(value.values()), None)
+
+
+def to_otlp(spans: list[dict]) -> dict:
+    """OTLP/HTTP JSON (ExportTraceServiceRequest) for a list of span dicts."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "convert-god"}}]},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "app.tracing"},
+                        "spans": [
+                            {
+                                "traceId": s["trace_id"],
+                                "spanId": s["span_id"],
+                                "parentSpanId": s["parent_id"],
+                                "name": s["name"],
+                                "startTimeUnixNano": str(s["start_ns"]),
+                                "endTimeUnixNano": str(s["end_ns"]),
+                                "status": {"code": 2 if s["status"] == "error" else 1},
+                                "attributes": [{"key": k, "value": _attr_value(v)} for k, v in s["attrs"].items()]
+                                + [{"key": "host.name", "value": {"stringValue": s["host"]}},
+                                   {"key": "process.pid", "value": {"intValue": str(s["pid"])}}],
+                            }
+                            for s in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def from_otlp(body: dict) -> list[dict]:
+    """Inverse of to_otlp, for the collector stand-in."""
+    out = []
+    for rs in body.get("resourceSpans") or []:
+        for ss in rs.get("scopeSpans") or []:
+            for s in ss.get("spans") or []:
+                attrs = {a["key"]: _attr_from(a["value"]) for a in s.get("attributes") or []}
+                start, end = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+                out.append(
+                    {
+                        "trace_id": s["traceId"],
+                        "span_id": s["spanId"],
+                        "parent_id": s.get("parentSpanId") or "",
+                        "name": s["name"],
+                        "start_ns": start,
+                        "end_ns": end,
+                        "duration_ms": round((end - start) / 1e6, 3),
+                        "status": "error" if (s.get("status") or {}).get("code") == 2 else "ok",
+                        "host": attrs.pop("host.name", ""),
+                        "pid": int(attrs.pop("process.pid", 0) or 0),
+                        "attrs": attrs,
+                    }
+                )
+    return out
+
+
+def post_otlp(spans: list[dict]):
+    from . import http_pool
+
+    body = json.dumps(to_otlp(spans)).encode("utf-8")
+    http_pool.request(otlp_endpoint(), method="POST", headers={"Content-Type": "application/json"},
+                      body=body, timeout=5, max_redirects=0, max_bytes=64 * 1024)
+
+
+class BatchExporter:
+    """Batches spans on a daemon thread and hands them to `send`; drops when backed up.
+
+    Whatever is still queued at interpreter exit is sent then, so a worker's last job keeps
+    its final spans.
+    """
+
+    def __init__(self, send, name: str, max_queue: int = 2048, flush_seconds: float = 1.0):
+        self.send = send
+        self.name = name
+        self.q = queue.Queue(maxsize=max_queue)
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        threading.Thread(target=self._run, name=f"{name}-export", daemon=True).start()
+        atexit.register(self.flush)
+
+    def submit(self, sp: Span):
+        try:
+            self.q.put_nowait(sp.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self.q.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < 512 and time.monotonic() < deadline:
+                try:
+                    batch.append(self.q.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._send(batch)
+
+    def _send(self, batch: list[dict]):
+        try:
+            self.send(batch)
+        except Exception as e:
+            logger.warning("%s export failed spans=%s err=%s", self.name, len(batch), e)
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.q.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._send(batch)
+
+
+def _exporter(kind: str) -> BatchExporter:
+    with _lock:
+        if kind not in _exporters:
+            _exporters[kind] = BatchExporter(write_jsonl if kind == "jsonl" else post_otlp, kind)
+        return _exporters[kind]
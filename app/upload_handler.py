@@ -0,0 +1,161 @@
+import os
+import hashlib
+import uuid
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopFutureHandlers, StopUpload
+
+from .disk_storage import input_path
+
+
+SNIFF_BYTES = 512
+
+
+def sniff_enabled() -> bool:
+    return os.environ.get("UPLOAD_SNIFF", "1") == "1"
+
+
+def sniff_container(head: bytes) -> str:
+    """Container name from the first bytes of a file, or "" if it doesn't look like media."""
+    h = head or b""
+    if h[4:8] == b"ftyp":
+        return "mp4"
+    if h[4:8] in (b"moov", b"mdat", b"wide", b"free", b"skip"):
+        return "mov"
+    if h[:4] == b"\x1a\x45\xdf\xa3":
+        return "matroska"
+    if h[:4] == b"RIFF" and h[8:12] in (b"AVI ", b"WAVE"):
+        return "avi" if h[8:12] == b"AVI " else "wav"
+    if h[:4] == b"FORM" and h[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if h[:4] == b"OggS":
+        return "ogg"
+    if h[:4] == b"fLaC":
+        return "flac"
+    if h[:4] == b"caff":
+        return "caf"
+    if h[:5] == b"#!AMR":
+        return "amr"
+    if h[:3] == b"FLV":
+        return "flv"
+    if h[:8] == b"\x30\x26\xb2\x75\x8e\x66\xcf\x11":
+        return "asf"
+    if h[:4] == b"GIF8":
+        return "gif"
+    if h[:4] in (b"\x00\x00\x01\xba", b"\x00\x00\x01\xb3"):
+        return "mpeg"
+    # MPEG-TS: sync byte every 188 bytes (M2TS: 4-byte timestamp + 188).
+    if len(h) > 188 and h[0] == 0x47 and h[188] == 0x47:
+        return "mpegts"
+    if len(h) > 196 and h[4] == 0x47 and h[196] == 0x47:
+        return "mpegts"
+    if h[:3] == b"ID3":
+        return "mp3"
+    if len(h) > 1 and h[0] == 0xFF and (h[1] & 0xE0) == 0xE0:
+        # Frame sync: layer bits 00 is ADTS AAC, anything else an MPEG audio frame.
+        return "aac" if (h[1] & 0xF6) == 0xF0 else "mp3"
+    return ""
+
+
+class DirectInputUploadHandler(FileUploadHandler):
+    """Stream the multipart "file" field straight into inputs/<uuid><ext>.
+
+    No temp file and no second copy: bytes go to their final path as they arrive, hashed
+    (sha256) on the way. The upload is stopped - without reading the rest of the body -
+    as soon as it passes `max_bytes`, or once the first bytes don't look like a media
+    container. The view reads the outcome from `error` / `result`.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, request=None, *, max_bytes: int):
+        super().__init__(request)
+        self.max_bytes = max_bytes
+        self.key = ""
+        self.path = ""
+        self._out = None
+        self.size = 0
+        self.head = b""
+        self.container = ""
+        self.sha256 = hashlib.sha256()
+        self.error = ""
+        self.status = 0
+        self.result = None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        # One input per request; anything else in the body is skipped.
+        if field_name != "file" or self._out is not None or self.result is not None:
+            raise SkipFile()
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if content_length and content_length > self.max_bytes:
+            self._fail(413, "File too large")
+        ext = os.path.splitext((file_name or "")[:180])[1].lower()
+        self.key = f"inputs/{uuid.uuid4().hex}{ext}"
+        self.path = input_path(self.key)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._out = open(self.path, "wb")
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_bytes:
+            self._fail(413, "File too large")
+        if not self.container and len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[: SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self._sniff()
+        self.sha256.update(raw_data)
+        self._out.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self._out is None:
+            return None
+        if not self.container:
+            # Shorter than SNIFF_BYTES; the body is already read, so just reject.
+            try:
+                self._sniff()
+            except StopUpload:
+                return None
+        self._out.close()
+        self.result = UploadedFile(
+            file=self._out, name=self.file_name, content_type=self.content_type, size=self.size, charset=self.charset
+        )
+        self.result.key = self.key
+        self.result.sha256 = self.sha256.hexdigest()
+        self.result.container = self.container
+        self._out = None
+        return self.result
+
+    def upload_interrupted(self):
+        self.abort()
+
+    def abort(self):
+        """Close and delete whatever was written (failed, rejected or disconnected upload)."""
+        if self._out is not None:
+            try:
+                self._out.close()
+            except OSError:
+                pass
+            self._out = None
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self.result = None
+
+    def _sniff(self):
+        if not sniff_enabled():
+            self.container = "unchecked"
+            return
+        self.container = sniff_container(self.head)
+        if not self.container:
+            self._fail(415, "Not a recognised audio/video file")
+
+    def _fail(self, status: int, error: str):
+        self.status = status
+        self.error = error
+        self.abort()
+        # Don't drain the rest of the body; the server drops the connection after responding.
+        raise StopUpload(connection_reset=True)
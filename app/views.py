@@ -1,22 +1,31 @@
 import json
+import math
 import os
 import time
 import uuid
+import zipfile
+from datetime import timedelta
 from pathlib import Path
 from urllib.parse import urlparse
 import urllib.request
 import urllib.parse
 
 from django.conf import settings
-from django.http import JsonResponse, FileResponse
+from django.db import transaction
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 
-from .models import Job
-from .disk_storage import ensure_dirs, input_path, output_path, sign_download, verify_download
-from .extractors import extract_best_effort, extract_src_from_embed
-from .browser_sniffer import sniff_media_url
+from .models import Batch, Job
+from .disk_storage import ensure_dirs, input_path, output_path, sign_download, stream_key_prefix, verify_download
+from .extractors import extract_candidates, extract_src_from_embed
+from .upload_handler import DirectInputUploadHandler
+from . import encode_analysis, media_candidates, ranged_download, rate_limit, speculative, tracing
+from .job_archive import batch_page, batch_querysets, batch_summary, find_job
+from .job_queue import enqueue_on_commit
+from .webhooks import record_job as record_webhook, valid_callback_url
 
 
 def _is_youtube_url(u: str) -> bool:
@@ -49,6 +58,14 @@ def _safe_ext_from_url(u: str) -> str:
     return ""
 
 
+def _remove_quietly(path: str):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
+
 def healthz(request):
     return JsonResponse({"ok": True})
 
@@ -87,6 +104,21 @@ def _signed_url_expires() -> int:
         return 3600
 
 
+def _poll_touch_seconds() -> float:
+    # Minimum gap between last_polled_at writes for one job (see job_status).
+    try:
+        return max(0.0, float(os.environ.get("JOB_POLL_TOUCH_SECONDS", "30")))
+    except Exception:
+        return 30.0
+
+
+def _batch_max_jobs() -> int:
+    try:
+        return int(os.environ.get("BATCH_MAX_JOBS", "1000"))
+    except Exception:
+        return 1000
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def upload_file(request):
@@ -96,24 +128,40 @@ def upload_file(request):
     """
     ensure_dirs()
 
-    f = request.FILES.get("file")
+    cap = _max_upload_bytes()
+    try:
+        body_len = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        body_len = 0
+    # Multipart framing adds a little; anything well past the cap is refused unread.
+    if body_len > cap + 64 * 1024:
+        return JsonResponse({"ok": False, "error": "File too large"}, status=413)
+
+    # Must be swapped in before request.FILES is first touched.
+    handler = DirectInputUploadHandler(request, max_bytes=cap)
+    request.upload_handlers = [handler]
+    with tracing.span("upload") as sp:
+        try:
+            f = request.FILES.get("file")
+        except Exception:
+            # Client went away or sent a broken body mid-upload.
+            handler.abort()
+            raise
+        sp.trace_id = tracing.trace_id_for(handler.key)
+        sp.set(input_key=handler.key, bytes=handler.size, error=handler.error, container=handler.container)
+
+    if handler.error:
+        return JsonResponse({"ok": False, "error": handler.error}, status=handler.status)
     if not f:
         return JsonResponse({"ok": False, "error": "Missing file"}, status=400)
 
-    if f.size and int(f.size) > _max_upload_bytes():
-        return JsonResponse({"ok": False, "error": "File too large"}, status=413)
+    # Reused by the worker to look up cached encode analysis for identical content.
+    encode_analysis.remember_hash(handler.path, f.sha256)
 
-    filename = (getattr(f, "name", "upload") or "upload")[:180]
-    ext = os.path.splitext(filename)[1].lower()
-    key = f"inputs/{uuid.uuid4().hex}{ext or ''}"
-    dst = input_path(key)
+    # Opt-in: use the time until the user clicks Convert (see app.speculative); runs in the background.
+    speculative.start(f.key, int(f.size or 0))
 
-    Path(os.path.dirname(dst)).mkdir(parents=True, exist_ok=True)
-    with open(dst, "wb") as out:
-        for chunk in f.chunks():
-            out.write(chunk)
-
-    return JsonResponse({"ok": True, "key": key, "size": int(f.size or 0)})
+    return JsonResponse({"ok": True, "key": f.key, "size": int(f.size or 0), "sha256": f.sha256, "container": f.container})
 
 
 @csrf_exempt
@@ -161,10 +209,11 @@ def input_from_url(request):
 
     req = urllib.request.Request(url, headers={"User-Agent": "ConvertGod/1.0"})
 
-    size = 0
     try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
+        with tracing.span("url_fetch", trace_id=tracing.trace_id_for(key), url=url[:300]) as fetch_span, \
+                urllib.request.urlopen(req, timeout=30) as resp:
             ct = (resp.headers.get("Content-Type") or "").lower()
+            fetch_span.set(content_type=ct)
             if ct.startswith("text/html"):
                 # Best-effort webpage extraction: try to find a direct MP4/M3U8 in the HTML.
                 try:
@@ -172,39 +221,62 @@ def input_from_url(request):
                 except Exception:
                     html = ""
 
-                ex = extract_best_effort(html, url)
-                if not ex.get("ok"):
+                with tracing.span("extract", html_bytes=len(html)) as ex_span:
+                    found = extract_candidates(html, url)
+                    ex_span.set(candidates=len(found))
+                # Every candidate is checked (concurrently, within a time budget) and ranked, so a
+                # dead link, pre-roll or low rendition is caught here rather than inside ffmpeg.
+                with tracing.span("validate_candidates", candidates=len(found)) as v_span:
+                    best, checked = media_candidates.choose(found)
+                    v_span.set(playable=sum(r["ok"] for r in checked))
+
+                sn = None
+                if best is None:
                     # Stage 3: headless browser sniff (optional)
-                    try:
-                        if os.environ.get("ENABLE_BROWSER_MODE", "1") == "1":
-                            sn = sniff_media_url(url)
-                        else:
-                            sn = None
-                    except Exception:
-                        sn = None
+                    with tracing.span("sniff") as sn_span:
+                        try:
+                            if os.environ.get("ENABLE_BROWSER_MODE", "1") == "1":
+                                from .browser_sniffer import sniff_media_url
 
-                    if sn and getattr(sn, "ok", False) and getattr(sn, "media_url", None):
-                        media_url = str(sn.media_url).strip()
-                        kind = str(sn.kind or "").strip()
+                                sn = sniff_media_url(url)
+                            else:
+                                sn = None
+                        except Exception:
+                            sn = None
+                        sn_span.set(ok=bool(sn and getattr(sn, "ok", False)))
+                    if sn and getattr(sn, "ok", False):
+                        with tracing.span("validate_candidates", candidates=len(sn.candidates)) as v_span:
+                            best, sniffed = media_candidates.choose(sn.candidates)
+                            v_span.set(playable=sum(r["ok"] for r in sniffed))
+                        checked += sniffed
+
+                if best is None:
+                    if checked:
+                        error = "Convert God found media links on this page, but none of them could be played (dead, blocked or not media).\n\nNext step: provide a direct media file URL (often ends in .mp4/.m3u8/.mpd) or upload the source file."
+                        code = "webpage_no_playable_media"
                     else:
-                        return JsonResponse(
-                            {
-                                "ok": False,
-                                "error": "This URL appears to be a webpage. Convert God tried: (1) HTML scan and (2) browser network sniff, but still could not find a direct MP4/HLS/DASH stream URL.\n\nCommon reasons: the site requires login/cookies, is geo-blocked, uses DRM, or hides streams behind JS APIs.\n\nNext step: provide a direct media file URL (often ends in .mp4/.m3u8/.mpd) or upload the source file.",
-                                "error_code": "webpage_no_media_found",
-                                "content_type": ct,
-                                "details": {"html_reason": ex.get("reason"), "sniff_reason": getattr(sn, "reason", None) if sn else None},
+                        error = "This URL appears to be a webpage. Convert God tried: (1) HTML scan and (2) browser network sniff, but still could not find a direct MP4/HLS/DASH stream URL.\n\nCommon reasons: the site requires login/cookies, is geo-blocked, uses DRM, or hides streams behind JS APIs.\n\nNext step: provide a direct media file URL (often ends in .mp4/.m3u8/.mpd) or upload the source file."
+                        code = "webpage_no_media_found"
+                    return JsonResponse(
+                        {
+                            "ok": False,
+                            "error": error,
+                            "error_code": code,
+                            "content_type": ct,
+                            "details": {
+                                "html_candidates": len(found),
+                                "sniff_reason": getattr(sn, "reason", None) if sn else None,
+                                "rejected": [media_candidates.summary(r) for r in checked[:10]],
                             },
-                            status=400,
-                        )
-                else:
-                    media_url = str(ex.get("media_url") or "").strip()
-                    kind = str(ex.get("kind") or "").strip()
-                if not media_url:
-                    return JsonResponse({"ok": False, "error": "Extraction failed"}, status=400)
+                        },
+                        status=400,
+                    )
+                media_url = best["media_url"]
+                kind = best["kind"]
 
                 # Write a small URL pointer file. Worker will let ffmpeg ingest the URL directly.
-                url_key = f"inputs/{uuid.uuid4().hex}.url"
+                # Same id as `key`, so the fetch/extract spans trace to this input.
+                url_key = f"{os.path.splitext(key)[0]}.url"
                 url_dst = input_path(url_key)
                 Path(os.path.dirname(url_dst)).mkdir(parents=True, exist_ok=True)
                 with open(url_dst, "w", encoding="utf-8") as f:
@@ -212,42 +284,31 @@ def input_from_url(request):
                     f.write(f"KIND:{kind}\n")
                     f.write(f"SRC:{url}\n")
 
-                return JsonResponse({"ok": True, "key": url_key, "size": 0, "note": "extracted_media_url"})
-
-            # Optional early reject if content-length is present
-            cl = resp.headers.get("Content-Length")
-            if cl:
-                try:
-                    if int(cl) > cap:
-                        return JsonResponse({"ok": False, "error": "File too large"}, status=413)
-                except Exception:
-                    pass
-
-            with open(dst, "wb") as out:
-                while True:
-                    chunk = resp.read(1024 * 1024)
-                    if not chunk:
-                        break
-                    size += len(chunk)
-                    if size > cap:
-                        try:
-                            out.close()
-                        finally:
-                            try:
-                                os.remove(dst)
-                            except Exception:
-                                pass
-                        return JsonResponse({"ok": False, "error": "File too large"}, status=413)
-                    out.write(chunk)
+                return JsonResponse(
+                    {
+                        "ok": True,
+                        "key": url_key,
+                        "size": 0,
+                        "note": "extracted_media_url",
+                        "media": media_candidates.summary(best),
+                        "candidates_checked": len(checked),
+                    }
+                )
+
+            # Parallel byte ranges when the server allows it, otherwise this same response.
+            try:
+                with tracing.span("download_body") as dl_span:
+                    result = ranged_download.download(resp, dst, cap)
+                    dl_span.set(**result.stats())
+            except ranged_download.TooLarge:
+                _remove_quietly(dst)
+                return JsonResponse({"ok": False, "error": "File too large"}, status=413)
+            size = result.size
     except Exception:
-        try:
-            if os.path.exists(dst):
-                os.remove(dst)
-        except Exception:
-            pass
+        _remove_quietly(dst)
         return JsonResponse({"ok": False, "error": "Failed to fetch URL"}, status=400)
 
-    return JsonResponse({"ok": True, "key": key, "size": int(size)})
+    return JsonResponse({"ok": True, "key": key, "size": int(size), "download": result.stats()})
 
 
 @require_http_methods(["GET"])
@@ -278,6 +339,76 @@ def youtube_preview(request):
     )
 
 
+def _parse_seconds(value) -> float | None:
+    """Seconds as a number or "[[HH:]MM:]SS[.fff]" string. None/"" -> None; raises ValueError."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        secs = float(value)
+    else:
+        secs = 0.0
+        for part in str(value).strip().split(":"):
+            secs = secs * 60 + float(part)
+    if secs < 0 or not math.isfinite(secs):
+        raise ValueError("negative, NaN or infinite")
+    return secs
+
+
+def _job_fields(spec: dict, defaults: dict | None = None, checked_urls: dict | None = None):
+    """Validate one job spec from a request body. Returns (fields, error).
+
+    `checked_urls` memoizes callback URL checks (each resolves DNS) across a batch's items.
+    """
+    if not isinstance(spec, dict):
+        return None, "Invalid job"
+    defaults = defaults or {}
+
+    preset = str(spec.get("preset") or defaults.get("preset") or Job.PRESET_720).strip()
+    packaging = str(spec.get("packaging") or defaults.get("packaging") or Job.PACKAGING_MP4).strip()
+    input_key = str(spec.get("input_key") or "").strip()
+    try:
+        input_size = int(spec.get("input_size_bytes") or 0)
+    except Exception:
+        input_size = 0
+
+    if preset not in dict(Job.PRESET_CHOICES):
+        return None, "Invalid preset"
+    if packaging not in dict(Job.PACKAGING_CHOICES):
+        return None, "Invalid packaging"
+    if preset in Job.AUDIO_PRESETS and packaging != Job.PACKAGING_MP4:
+        return None, "Audio presets produce a single file"
+    if not input_key.startswith("inputs/"):
+        return None, "Invalid input_key"
+
+    callback_url = str(spec.get("callback_url") or defaults.get("callback_url") or "").strip()
+    if callback_url:
+        checked_urls = {} if checked_urls is None else checked_urls
+        if callback_url not in checked_urls:
+            checked_urls[callback_url] = valid_callback_url(callback_url)
+        if not checked_urls[callback_url]:
+            return None, "Invalid callback_url"
+
+    try:
+        start = _parse_seconds(spec.get("start"))
+        end = _parse_seconds(spec.get("end"))
+    except ValueError:
+        return None, "Invalid start/end"
+    if start is not None and start <= 0:
+        start = None
+    if end is not None and end <= (start or 0):
+        return None, "end must be after start"
+
+    return {
+        "preset": preset,
+        "packaging": packaging,
+        "input_key": input_key,
+        "input_size_bytes": max(0, input_size),
+        "clip_start": start,
+        "clip_end": end,
+        "callback_url": callback_url,
+    }, None
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def create_job(request):
@@ -286,41 +417,115 @@ def create_job(request):
     except json.JSONDecodeError:
         body = {}
 
-    preset = (body.get("preset") or Job.PRESET_720).strip()
-    input_key = (body.get("input_key") or "").strip()
-    input_size = int(body.get("input_size_bytes") or 0)
-
-    if preset not in dict(Job.PRESET_CHOICES):
-        return JsonResponse({"ok": False, "error": "Invalid preset"}, status=400)
-    if not input_key.startswith("inputs/"):
-        return JsonResponse({"ok": False, "error": "Invalid input_key"}, status=400)
+    fields, err = _job_fields(body)
+    if err:
+        return JsonResponse({"ok": False, "error": err}, status=400)
 
     # Validate input exists
-    p = input_path(input_key)
+    p = input_path(fields["input_key"])
     if not os.path.exists(p):
         return JsonResponse({"ok": False, "error": "Input not found"}, status=400)
 
-    j = Job.objects.create(
-        status=Job.STATUS_QUEUED,
-        preset=preset,
-        input_key=input_key,
-        input_size_bytes=max(0, input_size),
-        progress=0,
-    )
+    fields["client"] = rate_limit.client_id(request)
+    if rate_limit.enabled():
+        over = rate_limit.job_quota_response(fields["client"])
+        if over:
+            return over
+
+    with tracing.span("create_job", input_key=fields["input_key"]) as sp:
+        j = None
+        if speculative.enabled():
+            # A speculative encode of this upload may already be running (or done).
+            if speculative.matches(fields):
+                j = speculative.adopt(fields)
+            else:
+                speculative.cancel_for_input(fields["input_key"])
+        adopted = j is not None
+        if j is None:
+            j = Job.objects.create(status=Job.STATUS_QUEUED, progress=0, **fields)
+            enqueue_on_commit([j])
+        elif j.status == Job.STATUS_DONE:
+            record_webhook(j.id)
+        sp.trace_id = tracing.trace_id_for(j.id)
+        sp.set(job_id=str(j.id), preset=j.preset, input_trace_id=tracing.trace_id_for(j.input_key), adopted=adopted)
     return JsonResponse({"ok": True, "id": str(j.id)})
 
 
-@require_http_methods(["GET"])
+def _stream_urls(j: Job) -> dict:
+    """Signed HLS/DASH manifest URLs for segmented jobs, available as soon as the manifest exists."""
+    if j.packaging == Job.PACKAGING_MP4 or not j.output_key:
+        return {}
+    if j.status not in (Job.STATUS_PROCESSING, Job.STATUS_DONE):
+        return {}
+
+    prefix = stream_key_prefix(str(j.id))
+    exp = int(time.time()) + _signed_url_expires()
+    sig = sign_download(str(j.id), prefix, exp)
+    base = f"/api/jobs/{j.id}/stream/{exp}/{sig}/"
+
+    names = {"hls": "index.m3u8"} if j.packaging == Job.PACKAGING_HLS else {"dash": "manifest.mpd", "hls": "master.m3u8"}
+    return {kind: base + name for kind, name in names.items() if os.path.exists(output_path(prefix + name))}
+
+
+def _download_url(j: Job) -> str | None:
+    if j.status != Job.STATUS_DONE or not j.output_key or j.packaging != Job.PACKAGING_MP4:
+        return None
+    exp = int(time.time()) + _signed_url_expires()
+    sig = sign_download(str(j.id), j.output_key, exp)
+    return f"/api/jobs/{j.id}/download?exp={exp}&sig={sig}"
+
+
+@csrf_exempt
+@require_http_methods(["GET", "DELETE"])
+def job_detail(request, job_id):
+    if request.method == "DELETE":
+        return cancel_job(request, job_id)
+    return job_status(request, job_id)
+
+
+def cancel_job(request, job_id):
+    """Cancel a queued or running job. The worker kills a running encode within ~1s."""
+    j = find_job(job_id)
+    if not j:
+        return JsonResponse({"ok": False, "error": "Not found"}, status=404)
+
+    n = Job.objects.filter(id=j.id, status__in=Job.ACTIVE_STATUSES).update(
+        status=Job.STATUS_CANCELED, error="canceled_by_client", updated_at=timezone.now()
+    )
+    if not n:
+        j.refresh_from_db()
+        if j.status != Job.STATUS_CANCELED:
+            return JsonResponse({"ok": False, "error": f"Job already {j.status}", "status": j.status}, status=409)
+    else:
+        record_webhook(j.id)
+    return JsonResponse({"ok": True, "id": str(j.id), "status": Job.STATUS_CANCELED})
+
+
 def job_status(request, job_id):
-    j = Job.objects.filter(id=job_id).first()
+    j = find_job(job_id)
     if not j:
         return JsonResponse({"ok": False, "error": "Not found"}, status=404)
 
-    download_url = None
-    if j.status == Job.STATUS_DONE and j.output_key:
+    # Keeps the job alive for the abandonment reaper; throttled so polling stays read-mostly.
+    now = timezone.now()
+    if j.status in Job.ACTIVE_STATUSES and (now - j.last_polled_at).total_seconds() > _poll_touch_seconds():
+        Job.objects.filter(id=j.id).update(last_polled_at=now)
+
+    previews = {}
+    stream = _stream_urls(j)
+    download_url = _download_url(j)
+
+    if j.status == Job.STATUS_DONE:
         exp = int(time.time()) + _signed_url_expires()
-        sig = sign_download(str(j.id), j.output_key, exp)
-        download_url = f"/api/jobs/{j.id}/download?exp={exp}&sig={sig}"
+
+        for kind, meta in (j.side_outputs or {}).items():
+            key = (meta or {}).get("key")
+            if not key:
+                continue
+            ksig = sign_download(str(j.id), key, exp)
+            entry = {k: v for k, v in meta.items() if k not in ("key", "content_type")}
+            entry["url"] = f"/api/jobs/{j.id}/previews/{kind}?exp={exp}&sig={ksig}"
+            previews[kind] = entry
 
     return JsonResponse(
         {
@@ -330,17 +535,48 @@ def job_status(request, job_id):
                 "status": j.status,
                 "progress": int(j.progress or 0),
                 "preset": j.preset,
+                "start": j.clip_start,
+                "end": j.clip_end,
                 "error": j.error,
                 "download_url": download_url,
+                "previews": previews,
+                "packaging": j.packaging,
+                "stream": stream,
+                # Per-title x264 settings the worker picked (absent until the encode starts).
+                "encode_settings": _encode_settings(j),
             }
         }
     )
 
 
+def _encode_settings(j) -> dict | None:
+    st = (j.stats or {}).get("encode_settings")
+    if not st:
+        return None
+    return {k: st.get(k) for k in ("crf", "preset", "tune", "class", "source", "crf_bounds")}
+
+
+class _ClosingFile:
+    """File proxy that runs a callback once, when the response closes it."""
+
+    def __init__(self, f, on_close):
+        self._f = f
+        self._on_close = on_close
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def close(self):
+        self._f.close()
+        cb, self._on_close = self._on_close, None
+        if cb:
+            cb()
+
+
 @require_http_methods(["GET"])
 def download_output(request, job_id):
-    j = Job.objects.filter(id=job_id).first()
-    if not j or j.status != Job.STATUS_DONE or not j.output_key:
+    j = find_job(job_id)
+    if not j or j.status != Job.STATUS_DONE or not j.output_key or j.packaging != Job.PACKAGING_MP4:
         return JsonResponse({"ok": False, "error": "Not found"}, status=404)
 
     exp = request.GET.get("exp")
@@ -357,4 +593,282 @@ def download_output(request, job_id):
     if not os.path.exists(fp):
         return JsonResponse({"ok": False, "error": "Missing file"}, status=404)
 
-    return FileResponse(open(fp, "rb"), as_attachment=True, filename=f"{j.id}.mp4", content_type="video/mp4")
+    ext = os.path.splitext(j.output_key)[1].lower() or ".mp4"
+    t0 = time.time()
+    size = os.path.getsize(fp)
+    # The body is sent after we return; the span closes with the file.
+    return FileResponse(
+        _ClosingFile(
+            open(fp, "rb"),
+            lambda: tracing.record(
+                "download", trace_id=tracing.trace_id_for(j.id), start=t0, job_id=str(j.id), bytes=size
+            ),
+        ),
+        as_attachment=True,
+        filename=f"{j.id}{ext}",
+        content_type=Job.CONTENT_TYPES.get(ext, "application/octet-stream"),
+    )
+
+
+@require_http_methods(["GET"])
+def download_preview(request, job_id, kind):
+    """Serve a poster/sprite/preview side output generated during the encode."""
+    j = find_job(job_id)
+    meta = ((j.side_outputs or {}).get(kind) or {}) if j and j.status == Job.STATUS_DONE else {}
+    key = meta.get("key")
+    if not key:
+        return JsonResponse({"ok": False, "error": "Not found"}, status=404)
+
+    try:
+        exp_i = int(request.GET.get("exp"))
+    except Exception:
+        return JsonResponse({"ok": False, "error": "Invalid exp"}, status=400)
+
+    if not verify_download(str(j.id), key, exp_i, request.GET.get("sig") or ""):
+        return JsonResponse({"ok": False, "error": "Invalid signature"}, status=403)
+
+    fp = output_path(key)
+    if not os.path.exists(fp):
+        return JsonResponse({"ok": False, "error": "Missing file"}, status=404)
+
+    return FileResponse(open(fp, "rb"), content_type=meta.get("content_type") or "application/octet-stream")
+
+
+_STREAM_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".mpd": "application/dash+xml",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
+
+
+@require_http_methods(["GET"])
+def stream_file(request, job_id, exp, sig, name):
+    """Serve HLS/DASH manifests and segments.
+
+    The signature covers the job's whole output directory and lives in the path, so the
+    relative segment URIs inside the playlists inherit it.
+    """
+    j = find_job(job_id)
+    if not j or j.packaging == Job.PACKAGING_MP4:
+        return JsonResponse({"ok": False, "error": "Not found"}, status=404)
+
+    prefix = stream_key_prefix(str(j.id))
+    if not verify_download(str(j.id), prefix, exp, sig):
+        return JsonResponse({"ok": False, "error": "Invalid signature"}, status=403)
+
+    ext = os.path.splitext(name)[1].lower()
+    if "/" in name or name.startswith(".") or ext not in _STREAM_CONTENT_TYPES:
+        return JsonResponse({"ok": False, "error": "Not found"}, status=404)
+
+    fp = output_path(prefix + name)
+    if not os.path.exists(fp):
+        return JsonResponse({"ok": False, "error": "Missing file"}, status=404)
+
+    resp = FileResponse(open(fp, "rb"), content_type=_STREAM_CONTENT_TYPES[ext])
+    if ext in (".m3u8", ".mpd"):
+        # Manifests grow while the job is processing.
+        resp["Cache-Control"] = "no-cache"
+    else:
+        resp["Cache-Control"] = "private, max-age=3600"
+    return resp
+
+
+def _batch_archive_key(batch_id) -> str:
+    return f"batches/{batch_id}.zip"
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def create_batch(request):
+    """Create many jobs at once.
+
+    Body: {"preset": ..., "packaging": ..., "jobs": [{"input_key": ..., "preset"?: ..., ...}, ...]}
+    Top-level preset/packaging/callback_url are defaults for items that omit them. All-or-nothing: any invalid
+    item rejects the whole batch with per-item errors.
+    """
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except json.JSONDecodeError:
+        body = {}
+
+    items = body.get("jobs") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"ok": False, "error": "Missing jobs"}, status=400)
+    if len(items) > _batch_max_jobs():
+        return JsonResponse({"ok": False, "error": f"Too many jobs (max {_batch_max_jobs()})"}, status=413)
+
+    defaults = {"preset": body.get("preset"), "packaging": body.get("packaging"), "callback_url": body.get("callback_url")}
+    specs = []
+    errors = []
+    checked_urls = {}
+    for i, item in enumerate(items):
+        fields, err = _job_fields(item, defaults, checked_urls)
+        if err:
+            errors.append({"index": i, "error": err})
+        else:
+            specs.append((i, fields))
+
+    # One existence check per distinct input, however many presets reference it.
+    missing = {k for k in {f["input_key"] for _, f in specs} if not os.path.exists(input_path(k))}
+    for i, fields in specs:
+        if fields["input_key"] in missing:
+            errors.append({"index": i, "error": "Input not found"})
+
+    if errors:
+        errors.sort(key=lambda e: e["index"])
+        return JsonResponse({"ok": False, "error": "Invalid jobs", "errors": errors}, status=400)
+
+    client = rate_limit.client_id(request)
+    if rate_limit.enabled():
+        over = rate_limit.job_quota_response(client, len(specs))
+        if over:
+            return over
+
+    with tracing.span("create_batch", jobs=len(specs)) as sp, transaction.atomic():
+        batch = Batch.objects.create()
+        sp.trace_id = tracing.trace_id_for(batch.id)
+        jobs = Job.objects.bulk_create(
+            [Job(status=Job.STATUS_QUEUED, progress=0, batch=batch, client=client, **fields) for _, fields in specs],
+            batch_size=500,
+        )
+        enqueue_on_commit(jobs)
+
+    return JsonResponse({"ok": True, "id": str(batch.id), "job_ids": [str(j.id) for j in jobs]})
+
+
+@require_http_methods(["GET"])
+def batch_status(request, batch_id):
+    """Aggregate progress plus one page of per-job results (?page=1&page_size=100)."""
+    batch = Batch.objects.filter(id=batch_id).first()
+    if not batch:
+        return JsonResponse({"ok": False, "error": "Not found"}, status=404)
+
+    try:
+        page = max(1, int(request.GET.get("page") or 1))
+        page_size = min(500, max(1, int(request.GET.get("page_size") or 100)))
+    except Exception:
+        return JsonResponse({"ok": False, "error": "Invalid page"}, status=400)
+
+    # Only active jobs need the touch, and those are always in the hot table.
+    stale = timezone.now() - timedelta(seconds=_poll_touch_seconds())
+    Job.objects.filter(batch=batch, status__in=Job.ACTIVE_STATUSES, last_polled_at__lt=stale).update(
+        last_polled_at=timezone.now()
+    )
+
+    counts, avg = batch_summary(batch)
+    total = sum(counts.values())
+
+    rows = batch_page(batch, (page - 1) * page_size, page_size)
+    jobs = [
+        {
+            "id": str(j.id),
+            "status": j.status,
+            "progress": int(j.progress or 0),
+            "preset": j.preset,
+            "input_key": j.input_key,
+            "start": j.clip_start,
+            "end": j.clip_end,
+            "error": j.error,
+            "download_url": _download_url(j),
+        }
+        for j in rows
+    ]
+
+    archive_url = None
+    if counts.get(Job.STATUS_DONE):
+        exp = int(time.time()) + _signed_url_expires()
+        sig = sign_download(str(batch.id), _batch_archive_key(batch.id), exp)
+        archive_url = f"/api/batches/{batch.id}/archive?exp={exp}&sig={sig}"
+
+    finished = total - sum(counts.get(st, 0) for st in Job.ACTIVE_STATUSES)
+    return JsonResponse(
+        {
+            "ok": True,
+            "batch": {
+                "id": str(batch.id),
+                "total": total,
+                "counts": counts,
+                "finished": finished == total,
+                "progress": int(round(avg)),
+                "archive_url": archive_url,
+                "page": page,
+                "page_size": page_size,
+                "pages": (total + page_size - 1) // page_size,
+                "jobs": jobs,
+            },
+        }
+    )
+
+
+class _ZipStreamBuffer:
+    """Write-only sink for zipfile that hands out bytes as they are produced."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks = []
+        return out
+
+
+def _iter_zip(entries):
+    # ZIP_STORED: outputs are already compressed video, deflate would only burn CPU.
+    buf = _ZipStreamBuffer()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, fp in entries:
+            with open(fp, "rb") as src, zf.open(arcname, "w", force_zip64=True) as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield buf.pop()
+            yield buf.pop()
+    yield buf.pop()
+
+
+@require_http_methods(["GET"])
+def download_batch_archive(request, batch_id):
+    """Stream a zip of every finished MP4 output in the batch (no temp file)."""
+    batch = Batch.objects.filter(id=batch_id).first()
+    if not batch:
+        return JsonResponse({"ok": False, "error": "Not found"}, status=404)
+
+    try:
+        exp_i = int(request.GET.get("exp"))
+    except Exception:
+        return JsonResponse({"ok": False, "error": "Invalid exp"}, status=400)
+
+    if not verify_download(str(batch.id), _batch_archive_key(batch.id), exp_i, request.GET.get("sig") or ""):
+        return JsonResponse({"ok": False, "error": "Invalid signature"}, status=403)
+
+    entries = []
+    done = []
+    for qs in batch_querysets(batch):
+        qs = qs.filter(status=Job.STATUS_DONE, packaging=Job.PACKAGING_MP4).exclude(output_key="")
+        done += qs.values_list("created_at", "id", "output_key")
+    for _, _, key in sorted(done):
+        fp = output_path(key)
+        if os.path.exists(fp):
+            entries.append((os.path.basename(key), fp))
+
+    if not entries:
+        return JsonResponse({"ok": False, "error": "No outputs"}, status=404)
+
+    resp = StreamingHttpResponse(_iter_zip(entries), content_type="application/zip")
+    resp["Content-Disposition"] = f'attachment; filename="{batch.id}.zip"'
+    return resp
@@ -0,0 +1,286 @@
+import ipaddress
+import json
+import logging
+import os
+import random
+import socket
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from . import http_pool, metrics
+from .disk_storage import sign_download, sign_webhook
+from .models import Job, WebhookDelivery
+
+
+logger = logging.getLogger("app.webhooks")
+
+EVENTS = {
+    Job.STATUS_DONE: "job.done",
+    Job.STATUS_FAILED: "job.failed",
+    Job.STATUS_CANCELED: "job.canceled",
+}
+
+
+def webhook_workers() -> int:
+    try:
+        return max(1, int(os.environ.get("WEBHOOK_WORKERS", "8")))
+    except Exception:
+        return 8
+
+
+def webhook_timeout() -> float:
+    try:
+        return float(os.environ.get("WEBHOOK_TIMEOUT_SECONDS", "10"))
+    except Exception:
+        return 10.0
+
+
+def max_attempts() -> int:
+    try:
+        return max(1, int(os.environ.get("WEBHOOK_MAX_ATTEMPTS", "10")))
+    except Exception:
+        return 10
+
+
+def retry_base_seconds() -> float:
+    try:
+        return float(os.environ.get("WEBHOOK_RETRY_BASE_SECONDS", "10"))
+    except Exception:
+        return 10.0
+
+
+def public_base_url() -> str:
+    return (os.environ.get("PUBLIC_BASE_URL") or "").rstrip("/")
+
+
+def _link_expires() -> int:
+    try:
+        return int(os.environ.get("SIGNED_URL_EXPIRES", "3600"))
+    except Exception:
+        return 3600
+
+
+def allow_private_hosts() -> bool:
+    # Local development only: lets callbacks reach localhost and private networks.
+    return os.environ.get("WEBHOOK_ALLOW_PRIVATE", "0") == "1"
+
+
+def non_public_address(host: str) -> str:
+    """The first address `host` resolves to that isn't publicly routable, or "".
+
+    Keeps callbacks away from loopback, private networks and link-local addresses such as
+    the cloud metadata endpoint (169.254.169.254). Raises OSError when the name doesn't resolve.
+    """
+    if allow_private_hosts():
+        return ""
+    for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP):
+        ip = ipaddress.ip_address(info[4][0].split("%")[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            return str(ip)
+    return ""
+
+
+def valid_callback_url(url: str) -> bool:
+    try:
+        p = urlparse(url)
+        host = p.hostname
+    except Exception:
+        return False
+    if p.scheme not in ("http", "https") or not host or len(url) > 1024:
+        return False
+    try:
+        return not non_public_address(host)
+    except (OSError, UnicodeError):
+        return False
+
+
+# --- outbox ------------------------------------------------------------------------------
+
+def record(jobs) -> int:
+    """Add an outbox row for each finished job that has a callback_url. Idempotent per (job, event)."""
+    rows = []
+    for j in jobs:
+        event = EVENTS.get(j.status)
+        if not event or not j.callback_url:
+            continue
+        rows.append(
+            WebhookDelivery(
+                job_id=j.id,
+                event=event,
+                url=j.callback_url,
+                payload={
+                    "event": event,
+                    "job": {
+                        "id": str(j.id),
+                        "status": j.status,
+                        "preset": j.preset,
+                        "packaging": j.packaging,
+                        "batch_id": str(j.batch_id) if j.batch_id else None,
+                        "error": j.error,
+                        "output_key": j.output_key,
+                    },
+                    "occurred_at": timezone.now().isoformat(),
+                },
+            )
+        )
+    if not rows:
+        return 0
+    try:
+        WebhookDelivery.objects.bulk_create(rows, ignore_conflicts=True)
+    except IntegrityError:
+        logger.exception("webhook outbox insert failed")
+        return 0
+    return len(rows)
+
+
+def record_job(job_id) -> int:
+    j = Job.objects.filter(id=job_id).exclude(callback_url="").first()
+    return record([j]) if j else 0
+
+
+# --- delivery ----------------------------------------------------------------------------
+
+def _body(d: WebhookDelivery) -> bytes:
+    payload = dict(d.payload)
+    job = dict(payload.get("job") or {})
+    # Links are signed at send time, so a delivery retried hours later still carries a live one.
+    key = job.pop("output_key", "")
+    if d.event == EVENTS[Job.STATUS_DONE] and key and job.get("packaging") == Job.PACKAGING_MP4:
+        exp = int(time.time()) + _link_expires()
+        sig = sign_download(job["id"], key, exp)
+        job["download_url"] = f"{public_base_url()}/api/jobs/{job['id']}/download?exp={exp}&sig={sig}"
+    job["status_url"] = f"{public_base_url()}/api/jobs/{job['id']}"
+    payload["job"] = job
+    payload["delivery_id"] = d.id
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def backoff_seconds(attempts: int) -> float:
+    # 10s, 20s, 40s ... capped at 1h, with +-20% jitter so retries don't arrive in lockstep.
+    delay = min(3600.0, retry_base_seconds() * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def deliver(d: WebhookDelivery) -> bool:
+    """One POST attempt; updates the row. True when delivered."""
+    ts = int(time.time())
+    body = _body(d)
+    headers = {
+        "Content-Type": "application/json",
+        "X-ConvertGod-Event": d.event,
+        "X-ConvertGod-Delivery": str(d.id),
+        "X-ConvertGod-Timestamp": str(ts),
+        "X-ConvertGod-Signature": "sha256=" + sign_webhook(body, ts),
+    }
+    code = None
+    permanent = False
+    try:
+        # Checked again here: the name may resolve elsewhere now than when the job was created.
+        blocked = non_public_address(urlparse(d.url).hostname or "")
+        if blocked:
+            permanent = True
+            raise ValueError(f"callback host resolves to non-public address {blocked}")
+        code, _, _, _ = http_pool.request(
+            d.url,
+            method="POST",
+            headers=headers,
+            body=body,
+            timeout=webhook_timeout(),
+            max_redirects=0,
+            max_bytes=64 * 1024,
+        )
+        error = ""
+    except http_pool.HttpError as e:
+        code = e.status
+        error = f"http_{e.status}"
+        # Retry server errors, timeouts and rate limits; other client errors won't get better.
+        permanent = code < 500 and code not in (408, 425, 429)
+    except Exception as e:
+        error = f"{type(e).__name__}:{e}"[:500]
+
+    now = timezone.now()
+    qs = WebhookDelivery.objects.filter(pk=d.pk)
+    if not error:
+        qs.update(status=WebhookDelivery.STATUS_DELIVERED, attempts=F("attempts") + 1, last_status_code=code,
+                  last_error="", delivered_at=now)
+        metrics.incr("webhooks_delivered")
+        return True
+
+    attempts = d.attempts + 1
+    if permanent or attempts >= max_attempts():
+        qs.update(status=WebhookDelivery.STATUS_FAILED, attempts=attempts, last_status_code=code, last_error=error)
+        metrics.incr("webhooks_failed")
+        logger.warning("webhook gave up id=%s url=%s attempts=%s err=%s", d.id, d.url, attempts, error)
+    else:
+        qs.update(attempts=attempts, last_status_code=code, last_error=error,
+                  next_attempt_at=now + timedelta(seconds=backoff_seconds(attempts)))
+    return False
+
+
+def deliver_host_batch(deliveries: list[WebhookDelivery]) -> int:
+    """Deliver several events for one host in order over this thread's keep-alive connection.
+
+    Stops while the claim_due lease still has room for one more attempt; the rest are released
+    for the next claim rather than risk another dispatcher sending them too.
+    """
+    ok = 0
+    try:
+        for i, d in enumerate(deliveries):
+            if i and timezone.now() + timedelta(seconds=webhook_timeout() * 2) > d.next_attempt_at:
+                release(deliveries[i:])
+                break
+            ok += deliver(d)
+    finally:
+        # Reuse is within a batch; an idle socket kept until the next one would likely be stale.
+        http_pool.close_all()
+    return ok
+
+
+def release(deliveries: list[WebhookDelivery]):
+    """Hand rows from one claim_due call back unsent so the next claim picks them up."""
+    if not deliveries:
+        return
+    WebhookDelivery.objects.filter(
+        id__in=[d.id for d in deliveries],
+        status=WebhookDelivery.STATUS_PENDING,
+        next_attempt_at=deliveries[0].next_attempt_at,  # still our lease
+    ).update(next_attempt_at=timezone.now())
+
+
+def claim_due(limit: int = 200, lease_seconds: float | None = None) -> list[WebhookDelivery]:
+    """Lease due pending rows so concurrent dispatchers don't send the same event twice."""
+    now = timezone.now()
+    ids = list(
+        WebhookDelivery.objects.filter(status=WebhookDelivery.STATUS_PENDING, next_attempt_at__lte=now)
+        .order_by("next_attempt_at")
+        .values_list("id", flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    lease = lease_seconds if lease_seconds is not None else webhook_timeout() * 3 + 60
+    # A lease timestamp unique to this call identifies the rows we won.
+    until = now + timedelta(seconds=lease, microseconds=random.randint(0, 999_999))
+    WebhookDelivery.objects.filter(
+        id__in=ids, status=WebhookDelivery.STATUS_PENDING, next_attempt_at__lte=now
+    ).update(next_attempt_at=until)
+    return list(WebhookDelivery.objects.filter(id__in=ids, next_attempt_at=until).order_by("id"))
+
+
+def host_of(d: WebhookDelivery) -> tuple[str, str]:
+    p = urlparse(d.url)
+    return p.scheme, p.netloc
+
+
+def group_by_host(deliveries: list[WebhookDelivery]) -> dict[tuple[str, str], list[WebhookDelivery]]:
+    groups = defaultdict(list)
+    for d in deliveries:
+        groups[host_of(d)].append(d)
+    return dict(groups)
@@ -0,0 +1,186 @@
+import os
+import re
+import shutil
+import socket
+import subprocess
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Max, Q, Value, When
+from django.utils import timezone
+
+from .models import Job, WorkerNode
+
+
+_ENCODER_RE = re.compile(r"^\s*[VAS][A-Z.]{5}\s+(\S+)")
+
+
+def heartbeat_seconds() -> float:
+    try:
+        return float(os.environ.get("WORKER_HEARTBEAT_SECONDS", "15"))
+    except Exception:
+        return 15.0
+
+
+def heavy_job_bytes() -> int:
+    try:
+        return int(os.environ.get("WORKER_HEAVY_JOB_BYTES", str(500 * 1024**2)))
+    except Exception:
+        return 500 * 1024**2
+
+
+def route_grace_seconds() -> float:
+    try:
+        return float(os.environ.get("WORKER_ROUTE_GRACE_SECONDS", "60"))
+    except Exception:
+        return 60.0
+
+
+def node_name() -> str:
+    return os.environ.get("WORKER_NAME") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+def detect_encoders(ffmpeg: str) -> list[str]:
+    try:
+        r = subprocess.run([ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=20)
+    except Exception:
+        return []
+    out = []
+    for line in (r.stdout or "").splitlines():
+        m = _ENCODER_RE.match(line)
+        if m and m.group(1) != "=":
+            out.append(m.group(1))
+    return sorted(set(out))
+
+
+def _cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except Exception:
+        return os.cpu_count() or 1
+
+
+def _ram_bytes() -> int:
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES"))
+    except Exception:
+        return 0
+
+
+def _free_disk_bytes() -> int:
+    try:
+        return int(shutil.disk_usage(settings.MEDIA_ROOT).free)
+    except Exception:
+        return 0
+
+
+def _load() -> float:
+    try:
+        return float(os.getloadavg()[0])
+    except Exception:
+        return 0.0
+
+
+def has_browser() -> bool:
+    """Whether Playwright's Chromium is installed, not just the Python package (browser_sniffer needs both)."""
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        return False
+    try:
+        # Starts the Playwright driver (not a browser) just to resolve the install path.
+        with sync_playwright() as p:
+            path = p.chromium.executable_path
+    except Exception:
+        return False
+    return bool(path) and os.access(path, os.X_OK)
+
+
+def register(ffmpeg: str) -> WorkerNode:
+    """Create/refresh this process's WorkerNode row with detected capabilities."""
+    node, _ = WorkerNode.objects.update_or_create(
+        name=node_name(),
+        defaults={
+            "hostname": socket.gethostname(),
+            "cores": _cores(),
+            "ram_bytes": _ram_bytes(),
+            "encoders": detect_encoders(ffmpeg),
+            "has_browser": has_browser(),
+            "free_disk_bytes": _free_disk_bytes(),
+            "load": _load(),
+            "current_job": None,
+            "started_at": timezone.now(),
+            "heartbeat_at": timezone.now(),
+        },
+    )
+    return node
+
+
+def heartbeat(node: WorkerNode, *, force: bool = False, current_job=None):
+    """Refresh load/disk/heartbeat; throttled to WORKER_HEARTBEAT_SECONDS unless force."""
+    now = timezone.now()
+    if not force and node.heartbeat_at and (now - node.heartbeat_at).total_seconds() < heartbeat_seconds():
+        return
+    node.free_disk_bytes = _free_disk_bytes()
+    node.load = _load()
+    node.heartbeat_at = now
+    node.current_job = current_job
+    WorkerNode.objects.filter(pk=node.pk).update(
+        free_disk_bytes=node.free_disk_bytes, load=node.load, heartbeat_at=now, current_job=current_job
+    )
+
+
+def record_result(node: WorkerNode, *, status: str, busy_seconds: float, output_bytes: int = 0):
+    # Canceled jobs only count towards busy time.
+    WorkerNode.objects.filter(pk=node.pk).update(
+        jobs_done=F("jobs_done") + (1 if status == Job.STATUS_DONE else 0),
+        jobs_failed=F("jobs_failed") + (1 if status == Job.STATUS_FAILED else 0),
+        busy_seconds=F("busy_seconds") + max(0.0, busy_seconds),
+        output_bytes=F("output_bytes") + max(0, int(output_bytes)),
+        current_job=None,
+        heartbeat_at=timezone.now(),
+    )
+
+
+def live_nodes():
+    cutoff = timezone.now() - timedelta(seconds=heartbeat_seconds() * 3)
+    return WorkerNode.objects.filter(heartbeat_at__gte=cutoff)
+
+
+def is_dead(name: str) -> bool:
+    """No heartbeat from this worker for 3 intervals (or no such worker), checked now."""
+    return not live_nodes().filter(name=name).exists()
+
+
+HEAVY_PRESETS = (Job.PRESET_ORIGINAL, Job.PRESET_1080)
+
+
+def heavy_q() -> Q:
+    # High-res presets or large inputs (a stand-in for long ones; duration is unknown before probing).
+    return Q(preset__in=HEAVY_PRESETS) | Q(input_size_bytes__gte=heavy_job_bytes())
+
+
+def is_heavy(preset: str, input_size_bytes: int) -> bool:
+    """Same rule as heavy_q, for a single job."""
+    return preset in HEAVY_PRESETS or (input_size_bytes or 0) >= heavy_job_bytes()
+
+
+def routed_queue(qs, node: WorkerNode, supported_presets: list[str]):
+    """Narrow and order a queued-job queryset for this node.
+
+    - presets whose encoders this node lacks are never claimed here
+    - the biggest live nodes (by cores) take heavy jobs first
+    - smaller nodes leave heavy jobs alone while a bigger node is alive, unless a job has
+      waited longer than WORKER_ROUTE_GRACE_SECONDS (no starvation when big nodes are busy)
+    - speculative jobs (app.speculative) only after every real one
+    """
+    qs = qs.filter(preset__in=supported_presets)
+
+    biggest = live_nodes().exclude(pk=node.pk).aggregate(m=Max("cores"))["m"] or 0
+    if biggest > node.cores:
+        waited = timezone.now() - timedelta(seconds=route_grace_seconds())
+        qs = qs.exclude(heavy_q() & Q(created_at__gt=waited))
+        return qs.order_by("speculative", "created_at")
+
+    rank = Case(When(heavy_q(), then=Value(0)), default=Value(1), output_field=IntegerField())
+    return qs.annotate(route_rank=rank).order_by("speculative", "route_rank", "created_at")
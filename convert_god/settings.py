@@ -36,7 +36,6 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
-    "rest_framework",
     "app",
 ]
 
@@ -45,6 +44,10 @@ BASIC_AUTH_USER = env("BASIC_AUTH_USER", "")
 BASIC_AUTH_PASS = env("BASIC_AUTH_PASS", "")
 
 MIDDLEWARE = [
+    # Outermost so it times the whole request (feeds worker load shedding)
+    "app.middleware.LatencyMiddleware",
+    # Opt-in stack sampling (PROFILE_SAMPLE_RATE or a signed X-Profile header)
+    "app.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -56,6 +59,8 @@ MIDDLEWARE = [
 
     # Basic auth wrapper (private service)
     "app.middleware.BasicAuthMiddleware",
+    # Per-client token buckets / in-flight caps on upload, from-url and job creation (app.rate_limit)
+    "app.middleware.RateLimitMiddleware",
 ]
 
 ROOT_URLCONF = "convert_god.urls"
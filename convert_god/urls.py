@@ -1,9 +1,16 @@
 from django.contrib import admin
 from django.urls import path
 from django.views.generic import RedirectView
-from app import views
+from app import admin_views, views
 
 urlpatterns = [
+    # Staff-only profile browser (admin_view enforces the admin login)
+    path("admin/profiles/", admin.site.admin_view(admin_views.profile_list), name="admin_profiles"),
+    path(
+        "admin/profiles/<str:profile_id>.<str:fmt>",
+        admin.site.admin_view(admin_views.profile_download),
+        name="admin_profile_download",
+    ),
     path("admin/", admin.site.urls),
 
     # Healthcheck (no auth)
@@ -25,6 +32,11 @@ urlpatterns = [
     path("api/youtube/preview", views.youtube_preview, name="youtube_preview"),
 
     path("api/jobs", views.create_job, name="create_job"),
-    path("api/jobs/<uuid:job_id>", views.job_status, name="job_status"),
+    path("api/batches", views.create_batch, name="create_batch"),
+    path("api/batches/<uuid:batch_id>", views.batch_status, name="batch_status"),
+    path("api/batches/<uuid:batch_id>/archive", views.download_batch_archive, name="download_batch_archive"),
+    path("api/jobs/<uuid:job_id>", views.job_detail, name="job_status"),
     path("api/jobs/<uuid:job_id>/download", views.download_output, name="download_output"),
+    path("api/jobs/<uuid:job_id>/previews/<str:kind>", views.download_preview, name="download_preview"),
+    path("api/jobs/<uuid:job_id>/stream/<int:exp>/<str:sig>/<str:name>", views.stream_file, name="stream_file"),
 ]
@@ -3,10 +3,29 @@ set -eu
 
 ROLE="${SERVICE_ROLE:-web}"
 
-# Always run migrations + collectstatic on boot for simplicity.
-# (Render disks are ephemeral except Postgres; this is safe and fast for small apps.)
-python manage.py migrate --noinput
-python manage.py collectstatic --noinput
+if [ "${FAST_START:-1}" = "1" ]; then
+  # Fast boot: migrate only if the DB is missing a migration, and reuse the static
+  # manifest built into the image (collect only if it isn't there).
+  python manage.py migrate_if_needed
+  if [ "$ROLE" != "worker" ] && [ ! -f staticfiles/staticfiles.json ]; then
+    python manage.py collectstatic --noinput
+  fi
+else
+  python manage.py migrate --noinput
+  python manage.py collectstatic --noinput
+fi
+
+if [ "$ROLE" = "webhooks" ]; then
+  exec python manage.py webhooks
+fi
+
+# Webhook dispatcher next to each worker (WEBHOOK_DISPATCHER=0 when it runs as its own service);
+# several dispatchers are safe, they lease outbox rows.
+if [ "$ROLE" = "worker" ] || [ "$ROLE" = "all" ]; then
+  if [ "${WEBHOOK_DISPATCHER:-1}" = "1" ]; then
+    python manage.py webhooks &
+  fi
+fi
 
 if [ "$ROLE" = "worker" ]; then
   exec python manage.py worker